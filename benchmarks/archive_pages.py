@@ -0,0 +1,149 @@
+"""Offline archive benchmark (page_archive.py) against a local fixture shop.
+
+    python benchmarks/archive_pages.py [--pages 500] [--delay 0.01] [--workers 1,8] [--json]
+
+Starts a keep-alive HTTP/1.1 server on 127.0.0.1 whose product pages share
+a stylesheet and a logo and have one image of their own, answer with ETags
+and honour If-None-Match. For each worker count it archives every page into
+a fresh archive, archives them again (all unchanged), then again after a
+tenth of the pages changed. Reports time, connections opened, requests, 304
+answers and bytes fetched against bytes stored, and checks that an archived
+copy opens with its assets stored locally.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import url2pathname
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_archive import PageArchive
+
+STYLE = b"body { font-family: sans-serif; }\n" * 200
+LOGO = bytes(range(256)) * 40
+
+
+class Shop(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body in one write; separate small writes on a kept-alive
+    # connection stall on delayed ACKs.
+    wbufsize = 1 << 16
+    delay = 0
+    # page number -> revision; pages whose revision changed look different
+    revisions = {}
+    counts = {"connections": 0, "requests": 0, "not_modified": 0}
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            self.counts["connections"] += 1
+
+    def body(self):
+        name = self.path.rsplit("/", 1)[-1]
+        if name == "style.css":
+            return STYLE, "text/css"
+        if name == "logo.png":
+            return LOGO, "image/png"
+        if name.endswith(".png"):
+            return name.encode() * 500, "image/png"
+        page = int(name)
+        text = (f'<html><head><title>Product {page}</title><link rel="stylesheet" href="/static/style.css"></head>'
+                f'<body><img src="/static/logo.png"><h1>Product {page}</h1><img src="/img/{page}.png">'
+                + "<p>Description of the product.</p>" * 300
+                + f"<p>Revision {self.revisions.get(page, 0)}</p></body></html>")
+        return text.encode(), "text/html; charset=utf-8"
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body, content_type = self.body()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        with self.lock:
+            self.counts["requests"] += 1
+            if self.headers.get("If-None-Match") == etag:
+                self.counts["not_modified"] += 1
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(archive, urls, workers):
+    for key in Shop.counts:
+        Shop.counts[key] = 0
+    result = archive.archive(urls, workers=workers)
+    return {"workers": workers, "seconds": result["seconds"], "new": result["new"],
+            "unchanged": result["unchanged"] + result["same"], "failed": len(result["failed"]),
+            "connections": Shop.counts["connections"], "requests": Shop.counts["requests"],
+            "not_modified": Shop.counts["not_modified"],
+            "fetched_bytes": result["fetched_bytes"], "stored_bytes": result["stored_bytes"]}
+
+
+def check_view(archive, url):
+    # The archived copy must point at stored assets only.
+    view = archive.view(archive.versions(url)[-1])
+    page = open(url2pathname(view[len("file://"):]), encoding="utf-8").read()
+    local = page.count('src="file://') + page.count('href="file://')
+    return local == 3 and "/static/" not in page.split("<base", 1)[1].split(">", 1)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds the fixture shop takes per request")
+    parser.add_argument("--workers", default="1,8")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    Shop.delay = args.delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Shop)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/p/{page}" for page in range(args.pages)]
+    report = []
+    try:
+        for workers in [int(value) for value in args.workers.split(",")]:
+            Shop.revisions = {}
+            with tempfile.TemporaryDirectory() as directory:
+                archive = PageArchive(directory)
+                rows = [("first", run(archive, urls, workers)), ("again", run(archive, urls, workers))]
+                Shop.revisions = {page: 1 for page in range(0, args.pages, 10)}
+                rows.append(("10% changed", run(archive, urls, workers)))
+                viewable = check_view(PageArchive(directory), urls[0])
+            report.append({"workers": workers, "view_ok": viewable, "runs": [{"run": name, **row} for name, row in rows]})
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.pages} pages, {args.delay * 1000:.0f} ms per request")
+    print(f"  {'run':<13}{'workers':>8}{'seconds':>9}{'new':>6}{'same':>6}{'failed':>7}{'conns':>7}"
+          f"{'requests':>9}{'304s':>6}{'fetched':>10}{'stored':>10}")
+    for row in report:
+        for run_row in row["runs"]:
+            print(f"  {run_row['run']:<13}{run_row['workers']:>8}{run_row['seconds']:>9.2f}{run_row['new']:>6}"
+                  f"{run_row['unchanged']:>6}{run_row['failed']:>7}{run_row['connections']:>7}{run_row['requests']:>9}"
+                  f"{run_row['not_modified']:>6}{run_row['fetched_bytes'] / 1e6:>9.1f}M{run_row['stored_bytes'] / 1e6:>9.2f}M")
+        print(f"  archived copy opens with local assets: {'yes' if row['view_ok'] else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
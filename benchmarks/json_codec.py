@@ -0,0 +1,126 @@
+"""Encode/decode benchmark for the catalog file codec.
+
+    python benchmarks/json_codec.py [--sizes 10000,100000,1000000] [--no-alloc] [--json]
+
+For every catalog size, products.json is written and read back with the old
+json.dump(indent=2) call and with each codec backend and format, both one-shot
+(dumps/loads) and streaming (write/read). Reports time, throughput and
+(unless --no-alloc) peak memory allocated during the operation.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import MODES, JsonCodec, orjson
+
+CATEGORIES = 20
+
+
+def build_catalog(size):
+    # `size` links spread over a two-level tree, with tags on every tenth.
+    data = {}
+    per_category = max(1, size // (CATEGORIES * 5))
+    n = 0
+    for i in range(CATEGORIES):
+        category = data[f"Category {i}"] = {}
+        for j in range(5):
+            links = []
+            for _ in range(per_category):
+                meta = {"added": 1760000000 + n}
+                if n % 10 == 0:
+                    meta["tags"] = ["deal", "gift"]
+                links.append([f"https://shop{n % 50}.example.com/p/{n}", f"Product {n} – größe {n % 7}", meta])
+                n += 1
+            category[f"Sub {j}"] = {"_links": links}
+    return data
+
+
+def old_write(filename, data):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def old_read(filename):
+    with open(filename, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def one_shot_write(codec):
+    def write(filename, data):
+        with open(filename, "wb") as f:
+            f.write(codec.dumps(data))
+    return write
+
+
+def measure(func, *args, alloc=False):
+    if alloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if alloc:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def variants():
+    yield "json.dump indent=2 (old)", old_write, old_read
+    for backend in ["json"] + (["orjson"] if orjson else []):
+        for mode in MODES:
+            codec = JsonCodec(mode, backend)
+            yield f"{backend} {mode} one-shot", one_shot_write(codec), codec.read
+            yield f"{backend} {mode} streaming", codec.write, codec.read
+
+
+def bench_size(size, alloc, directory):
+    data = build_catalog(size)
+    filename = os.path.join(directory, "products.json")
+    results = []
+    for label, write, read in variants():
+        write_s, _ = measure(write, filename, data)
+        mib = os.path.getsize(filename) / (1 << 20)
+        read_s, _ = measure(read, filename)
+        row = {"variant": label, "size_mib": mib, "write_s": write_s, "read_s": read_s,
+               "write_mib_s": mib / write_s, "read_mib_s": mib / read_s}
+        if alloc:
+            row["write_peak_mib"] = measure(write, filename, data, alloc=True)[1] / (1 << 20)
+            row["read_peak_mib"] = measure(read, filename, alloc=True)[1] / (1 << 20)
+        results.append(row)
+    return {"size": size, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in [int(value) for value in args.sizes.split(",")]:
+            result = bench_size(size, not args.no_alloc, directory)
+            report.append(result)
+            if args.json:
+                continue
+            print(f"\n{size:,} links")
+            print(f"  {'variant':<28}{'MiB':>7}{'write s':>9}{'MiB/s':>8}{'read s':>8}{'MiB/s':>8}{'w peak':>8}{'r peak':>8}")
+            for row in result["results"]:
+                peaks = (f"{row['write_peak_mib']:>8.1f}{row['read_peak_mib']:>8.1f}" if "write_peak_mib" in row
+                         else f"{'-':>8}{'-':>8}")
+                print(f"  {row['variant']:<28}{row['size_mib']:>7.1f}{row['write_s']:>9.3f}{row['write_mib_s']:>8.1f}"
+                      f"{row['read_s']:>8.3f}{row['read_mib_s']:>8.1f}{peaks}")
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
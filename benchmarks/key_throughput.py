@@ -0,0 +1,71 @@
+"""Input throughput benchmark for the curses TUI, run without a terminal.
+
+    python benchmarks/key_throughput.py [--size 100000] [--batches 1,16,256] [--json]
+
+Replays held arrow keys, fast typing into the add form and a bracketed paste,
+handing the keys to the TUI `batch` at a time with one redraw per batch
+(batch 1 is one key per frame). Reports keys handled per second, frames
+drawn and total time for each script and batch size.
+"""
+import argparse
+import curses
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from headless import FakeScreen, keys, load_tui, make_app, replay
+from tui_frames import build_catalog
+
+TEXT = "Wireless noise cancelling headphones, black, 2026 model " * 20
+
+
+def scripts(tui):
+    paste = keys("a", *tui.PASTE_START, "https://example.com/" + TEXT.replace(" ", "-"), *tui.PASTE_END, 27)
+    return {
+        "held ↓": keys(*[curses.KEY_DOWN] * 2000),
+        "held ↑↓": keys(*[curses.KEY_DOWN, curses.KEY_DOWN, curses.KEY_UP] * 600),
+        "typing": keys("a", TEXT, 27),
+        "paste": paste,
+    }
+
+
+def run(app, script, batch):
+    app.mode = "browse"
+    app.current_selection = 0
+    start = time.perf_counter()
+    frames = replay(app, script, batch_size=batch)
+    elapsed = time.perf_counter() - start
+    return {"keys": len(script), "frames": len(frames), "seconds": elapsed, "keys_per_s": len(script) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000, help="items in the root view")
+    parser.add_argument("--batches", default="1,16,256")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    tui = load_tui()
+    app = make_app(tui, build_catalog(args.size), FakeScreen())
+    app.clipboard.disable("benchmark")
+    report = []
+    for name, script in scripts(tui).items():
+        for batch in [int(value) for value in args.batches.split(",")]:
+            report.append({"script": name, "batch": batch, **run(app, script, batch)})
+    app.clipboard.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.size:,} items")
+    print(f"  {'script':<10}{'batch':>7}{'keys':>7}{'frames':>8}{'seconds':>9}{'keys/s':>11}")
+    for row in report:
+        print(f"  {row['script']:<10}{row['batch']:>7}{row['keys']:>7}{row['frames']:>8}"
+              f"{row['seconds']:>9.3f}{row['keys_per_s']:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Price tracking benchmark (prices.py) against a local fixture shop.
+
+    python benchmarks/price_sampling.py [--pages 200] [--delay 0.02] [--workers 1,8,32]
+                                        [--links 10000] [--rounds 100] [--json]
+
+Starts a threaded HTTP server on 127.0.0.1 serving product pages (JSON-LD,
+microdata or Open Graph prices, each answer delayed by --delay seconds to
+stand in for a real shop) and samples them with each worker count, checking
+every extracted price against the one served. Then records --rounds rounds
+for --links links and reports the history file size, load time, a `drops`
+query and drawing the sparklines of one screen of links.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prices import PriceHistory, sample_prices
+
+TEMPLATES = [
+    '<script type="application/ld+json">{{"@type": "Product", "offers": {{"price": "{price:.2f}", '
+    '"availability": "https://schema.org/{stock}"}}}}</script>',
+    '<span itemprop="price" content="{price:.2f}">{price:,.2f} €</span>'
+    '<link itemprop="availability" href="http://schema.org/{stock}">',
+    '<meta property="product:price:amount" content="{price:.2f}">',
+]
+
+
+def served_price(page, round_number):
+    return round(10 + (page * 37 % 900) * (1 - 0.05 * (round_number % 4)), 2)
+
+
+class Shop(BaseHTTPRequestHandler):
+    delay = 0
+    round_number = 0
+
+    def do_GET(self):
+        page = int(self.path.rsplit("/", 1)[-1])
+        time.sleep(self.delay)
+        price = served_price(page, self.round_number)
+        stock = "InStock" if page % 5 else "OutOfStock"
+        body = ("<html><head><title>Product</title></head><body>" + "<p>Filler text.</p>" * 200 +
+                TEMPLATES[page % len(TEMPLATES)].format(price=price, stock=stock) + "</body></html>").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_sampling(base, pages, worker_counts):
+    urls = [f"{base}/p/{page}" for page in range(pages)]
+    rows = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        samples, failed = sample_prices(urls, workers=workers)
+        elapsed = time.perf_counter() - start
+        wrong = sum(1 for url, _, price, _ in samples if price != served_price(int(url.rsplit("/", 1)[-1]), 0))
+        rows.append({"workers": workers, "pages": pages, "failed": len(failed), "wrong": wrong,
+                     "seconds": elapsed, "pages_per_s": pages / elapsed})
+    return rows
+
+
+def bench_history(links, rounds, directory):
+    filename = os.path.join(directory, "products.prices")
+    history = PriceHistory(filename)
+    rng = random.Random(1)
+    urls = [f"https://shop.example/p/{i}" for i in range(links)]
+    base = [rng.uniform(5, 500) for _ in urls]
+    start = time.perf_counter()
+    for r in range(rounds):
+        when = 1_700_000_000 + r * 6 * 3600
+        history.record([(url, when, round(price * rng.uniform(0.7, 1.1), 2) if rng.random() > 0.02 else None,
+                         rng.random() > 0.1) for url, price in zip(urls, base)])
+    record_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    history = PriceHistory(filename)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    drops = history.drops(20)
+    drops_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for url in urls[:50]:
+        history.get(url).sparkline(8)
+    spark_seconds = time.perf_counter() - start
+    return {"links": links, "rounds": rounds, "samples": links * rounds, "file_bytes": os.path.getsize(filename),
+            "record_s": record_seconds, "load_s": load_seconds, "drops_s": drops_seconds, "drops": len(drops),
+            "sparklines_s": spark_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds the fixture shop takes per page")
+    parser.add_argument("--workers", default="1,8,32")
+    parser.add_argument("--links", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    Shop.delay = args.delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Shop)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        sampling = bench_sampling(f"http://127.0.0.1:{server.server_port}",
+                                  args.pages, [int(value) for value in args.workers.split(",")])
+    finally:
+        server.shutdown()
+    with tempfile.TemporaryDirectory() as directory:
+        history = bench_history(args.links, args.rounds, directory)
+
+    if args.json:
+        print(json.dumps({"sampling": sampling, "history": history}, indent=2))
+        return
+    print(f"Sampling {args.pages} pages, {args.delay * 1000:.0f} ms each")
+    print(f"  {'workers':>8}{'failed':>8}{'wrong':>7}{'seconds':>9}{'pages/s':>9}")
+    for row in sampling:
+        print(f"  {row['workers']:>8}{row['failed']:>8}{row['wrong']:>7}{row['seconds']:>9.2f}{row['pages_per_s']:>9.1f}")
+    print(f"\nHistory: {history['links']:,} links × {history['rounds']} rounds = {history['samples']:,} samples")
+    print(f"  file     {history['file_bytes'] / history['samples']:.1f} bytes/sample ({history['file_bytes'] / 1e6:.1f} MB)")
+    print(f"  record   {history['record_s']:.2f} s for all rounds")
+    print(f"  load     {history['load_s']:.2f} s")
+    print(f"  drops    {history['drops_s'] * 1000:.1f} ms ({history['drops']} links down more than 20%)")
+    print(f"  sparks   {history['sparklines_s'] * 1000:.1f} ms for 50 rows")
+
+
+if __name__ == "__main__":
+    main()
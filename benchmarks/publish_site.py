@@ -0,0 +1,71 @@
+"""Build-time benchmark for the static site generator (publish.py).
+
+    python benchmarks/publish_site.py [--sizes 10000,100000,1000000] [--workers 1,4] [--json]
+
+For every catalog size: a full build with each worker count, a rebuild with
+nothing changed, and a rebuild after adding one link. Reports seconds and
+pages rendered. Snapshot hashes are computed before timing starts, as they
+are after the first save in the app.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog
+from json_codec import build_catalog
+from publish import SiteBuilder
+from snapshots import SnapshotStore
+from subtree_stats import SubtreeStats
+
+
+def bench_size(size, worker_counts, directory):
+    catalog = Catalog(build_catalog(size))
+    stats = SubtreeStats(catalog)
+    store = SnapshotStore(catalog, os.path.join(directory, f"snapshots-{size}"))
+    store.current_hash()
+    rows = []
+    for workers in worker_counts:
+        out_dir = os.path.join(directory, f"site-{size}-{workers}")
+        result = SiteBuilder(catalog, stats, store, out_dir).build(workers, full=True)
+        rows.append({"build": f"full, {workers} worker{'s' if workers != 1 else ''}", **result})
+    builder = SiteBuilder(catalog, stats, store, out_dir)
+    rows.append({"build": "nothing changed", **builder.build()})
+    catalog.add_link(("Category 3", "Sub 1"), "https://example.com/new", "New product")
+    start = time.perf_counter()
+    store.current_hash()
+    result = builder.build()
+    result["seconds"] = time.perf_counter() - start
+    rows.append({"build": "one link added", **result})
+    return {"size": size, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    worker_counts = [int(value) for value in args.workers.split(",")]
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in [int(value) for value in args.sizes.split(",")]:
+            result = bench_size(size, worker_counts, directory)
+            report.append(result)
+            if args.json:
+                continue
+            print(f"\n{size:,} links")
+            print(f"  {'build':<22}{'pages':>9}{'rendered':>10}{'workers':>9}{'seconds':>10}")
+            for row in result["results"]:
+                print(f"  {row['build']:<22}{row['pages']:>9}{row['rendered']:>10}{row['workers']:>9}{row['seconds']:>10.3f}")
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Replays a recorded session (recording.py) and reports its latencies.
+
+    python benchmarks/replay_session.py session.trace [--catalog products.json]
+                                        [--speed max|original] [--json]
+
+Record a session with `python main.py --record session.trace` or
+`python curses-tui.py --record session.trace`. The replay starts from the
+catalog as it was when recording began (read from the snapshot store, or
+from --catalog) and runs in a scratch directory, so the real files are not
+touched. main.py sessions run through main_loop with the recorded commands;
+TUI sessions run the key batches through a headless TUI, each followed by a
+redraw; its saves go to the scratch directory and finish before the next
+batch is timed. Price checks and page archiving would go out to the shops,
+so they are skipped and counted. --speed original keeps the recorded
+pauses, max replays back to back. Reports latency percentiles per
+operation, next to the recorded ones, and operations per second.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recording import replay
+
+
+def ms(seconds):
+    return f"{seconds * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--catalog", help="start from this products.json instead of the recorded snapshot")
+    parser.add_argument("--speed", choices=("max", "original"), default="max")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    try:
+        report = replay(args.trace, args.catalog, args.speed)
+    except (OSError, ValueError) as e:
+        sys.exit(f"❌ {e}")
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    print(f"{report['operations']} {report['source']} operations in {report['wall_s']:.2f} s "
+          f"({report['busy_s']:.2f} s busy, {report['ops_per_s']:,.0f} ops/s)")
+    skipped = ", ".join(f"{count} {kind}" for kind, count in report["skipped"].items() if count)
+    if skipped:
+        print(f"  skipped (they would go out to the shops): {skipped}")
+    print(f"  {'operation':<22}{'count':>7}{'rec p50':>9}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}{'total':>9}   (ms)")
+    for name, row in report["by_operation"].items():
+        replayed = row["replayed"]
+        print(f"  {name:<22}{row['count']:>7}{ms(row['recorded']['p50']):>9}{ms(replayed['p50']):>8}"
+              f"{ms(replayed['p90']):>8}{ms(replayed['p99']):>8}{ms(replayed['max']):>8}{ms(replayed['total']):>9}")
+
+
+if __name__ == "__main__":
+    main()
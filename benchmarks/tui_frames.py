@@ -0,0 +1,103 @@
+"""Frame-time benchmark for the curses TUI, run without a terminal.
+
+    python benchmarks/tui_frames.py [--sizes 10,1000,100000,1000000] [--no-alloc] [--json]
+
+For every catalog size the same scripted key sequences are replayed in each
+input mode, and per-frame draw time, cells written and (unless --no-alloc)
+peak memory allocated while drawing are reported per mode.
+"""
+import argparse
+import curses
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from headless import FakeScreen, keys, load_tui, make_app, replay
+
+SUBCATEGORIES = 3
+
+SCRIPTS = {
+    "browse": keys(*[curses.KEY_DOWN] * 30, *[curses.KEY_UP] * 10, " ", " "),
+    "adding": keys("a", "https://example.com/item", curses.KEY_DOWN, "Example item", 27),
+    "new_category": keys("n", "New category", 27),
+    "edit_link": keys(*[curses.KEY_DOWN] * SUBCATEGORIES, "e", curses.KEY_DOWN, " edited", 27, *[curses.KEY_UP] * SUBCATEGORIES),
+    "edit_category": keys("e", " renamed", 27),
+}
+
+
+def build_catalog(size):
+    # `size` items in the root view: a few categories, the rest links.
+    data = {f"Category {i}": {"_links": [[f"https://example.com/c{i}/{j}", f"Item {j}"] for j in range(5)]}
+            for i in range(SUBCATEGORIES)}
+    data["_links"] = [[f"https://shop{n % 50}.example.com/p/{n}", f"Product {n}"] for n in range(max(0, size - SUBCATEGORIES))]
+    return data
+
+
+def summarize(frames):
+    times = sorted(frame[1] * 1000 for frame in frames)
+    return {
+        "frames": len(frames),
+        "mean_ms": statistics.fmean(times),
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "max_ms": times[-1],
+        "cells": statistics.fmean(frame[2] for frame in frames),
+    }
+
+
+def run_script(app, mode, script, trace_memory=False):
+    app.current_selection = 0
+    return [frame for frame in replay(app, script, trace_memory) if frame[0] == mode]
+
+
+def bench_size(tui, size, alloc):
+    data = build_catalog(size)
+    start = time.perf_counter()
+    app = make_app(tui, data, FakeScreen())
+    app.clipboard.disable("benchmark")
+    startup = time.perf_counter() - start
+
+    results = {}
+    for mode, script in SCRIPTS.items():
+        results[mode] = summarize(run_script(app, mode, script))
+
+    if alloc:
+        tracemalloc.start()
+        for mode, script in SCRIPTS.items():
+            peaks = [frame[3] for frame in run_script(app, mode, script, trace_memory=True)]
+            results[mode]["peak_kib"] = statistics.fmean(peaks) / 1024
+        tracemalloc.stop()
+    app.clipboard.stop()
+    return {"size": size, "startup_s": startup, "modes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,100000,1000000")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    tui = load_tui()
+    report = []
+    for size in [int(value) for value in args.sizes.split(",")]:
+        result = bench_size(tui, size, not args.no_alloc)
+        report.append(result)
+        if args.json:
+            continue
+        print(f"\n{size:,} items (startup {result['startup_s']:.2f}s)")
+        print(f"  {'mode':<14}{'frames':>7}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}{'cells':>9}{'peak KiB':>10}")
+        for mode, stats in result["modes"].items():
+            peak = f"{stats['peak_kib']:>10.1f}" if "peak_kib" in stats else f"{'-':>10}"
+            print(f"  {mode:<14}{stats['frames']:>7}{stats['mean_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                  f"{stats['max_ms']:>10.3f}{stats['cells']:>9.0f}{peak}")
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
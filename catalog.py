@@ -0,0 +1,510 @@
+import base64
+import json
+import time
+import zlib
+from urllib.parse import urlparse
+
+LINKS_KEY = "_links"
+# A packed category is {ARCHIVE_KEY: [hash, links, subcategories, modified,
+# blob]}: the blob is the subtree as compact JSON, zlib-compressed and
+# base64-encoded, and hash is its snapshot hash (or None). The value is a
+# list, so code walking the tree never mistakes it for a subcategory.
+ARCHIVE_KEY = "_archived"
+# Keys that can never be category names.
+RESERVED_NAMES = (LINKS_KEY, ARCHIVE_KEY)
+
+
+def subcategories(node):
+    return [k for k in node if k != LINKS_KEY]
+
+
+def link_url(item):
+    return item[0] if isinstance(item, list) else item
+
+
+def link_desc(item):
+    return item[1] if isinstance(item, list) and len(item) > 1 else ""
+
+
+def link_meta(item):
+    if isinstance(item, list) and len(item) > 2 and isinstance(item[2], dict):
+        return item[2]
+    return {}
+
+
+def link_display(item):
+    desc = link_desc(item)
+    return desc if desc.strip() else link_url(item)
+
+
+def link_domain(url):
+    host = urlparse(url).hostname or ""
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+
+def new_link(url, desc=""):
+    return [url, desc, {"added": int(time.time())}]
+
+
+def is_packed(node):
+    return isinstance(node, dict) and ARCHIVE_KEY in node
+
+
+def pack_subtree(node, digest=None):
+    links = subcategories = modified = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        for link in current.get(LINKS_KEY, []):
+            links += 1
+            modified = max(modified, link_meta(link).get("added", 0))
+        children = [child for key, child in current.items() if key != LINKS_KEY and isinstance(child, dict)]
+        subcategories += len(children)
+        stack.extend(children)
+    raw = json.dumps(node, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    blob = base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+    return {ARCHIVE_KEY: [digest, links, subcategories, modified, blob]}
+
+
+def unpack_subtree(node):
+    return json.loads(zlib.decompress(base64.b64decode(node[ARCHIVE_KEY][4])).decode("utf-8"))
+
+
+def iter_links(node, path=()):
+    # Yields (path, link) for every link at or below `node`; packed
+    # categories are read from a private unpacked copy and stay packed.
+    stack = [(tuple(path), node)]
+    while stack:
+        path, node = stack.pop()
+        if is_packed(node):
+            node = unpack_subtree(node)
+        for link in node.get(LINKS_KEY, []):
+            yield path, link
+        stack.extend((path + (name,), child) for name, child in reversed(list(node.items()))
+                     if name != LINKS_KEY and isinstance(child, dict))
+
+
+def check_names(name, subtree):
+    # Raises ValueError if `name` or a category below it uses a reserved
+    # name; a packed category ({ARCHIVE_KEY: [...]}) is fine as it is.
+    if name in RESERVED_NAMES:
+        raise ValueError(f"'{name}' is a reserved name")
+    stack = [subtree]
+    while stack:
+        node = stack.pop()
+        if ARCHIVE_KEY in node:
+            if len(node) != 1 or not isinstance(node[ARCHIVE_KEY], list):
+                raise ValueError(f"'{ARCHIVE_KEY}' is a reserved name")
+            continue
+        for key, child in node.items():
+            if isinstance(child, dict):
+                if key == LINKS_KEY:
+                    raise ValueError(f"'{LINKS_KEY}' is a reserved name")
+                stack.append(child)
+
+
+def read_node(data, path, cache=None):
+    # Like Catalog.node, but packed categories on the way are read from a
+    # private unpacked copy and stay packed. `cache` keeps a few of those
+    # copies between calls.
+    node = data
+    for key in path:
+        node = node.get(key, {})
+        if is_packed(node):
+            hit = cache.get(id(node)) if cache is not None else None
+            if hit is None or hit[0] is not node:
+                hit = (node, unpack_subtree(node))
+                if cache is not None:
+                    if len(cache) >= 8:
+                        cache.clear()
+                    cache[id(node)] = hit
+            node = hit[1]
+    return node
+
+
+def match_links(current, links):
+    # The links in `current` equal to `links`, each used once.
+    candidates = {}
+    for item in current:
+        candidates.setdefault(link_url(item), []).append(item)
+    matched = []
+    for link in links:
+        same = candidates.get(link_url(link), [])
+        for i, item in enumerate(same):
+            if item == link:
+                matched.append(same.pop(i))
+                break
+    return matched
+
+
+def link_urls(node):
+    return list(dict.fromkeys(link_url(link) for _, link in iter_links(node)))
+
+
+def copy_link(link):
+    copy = list(link)
+    if len(copy) > 2 and isinstance(copy[2], dict):
+        copy[2] = dict(copy[2])
+    return copy
+
+
+class Catalog:
+    # Every mutation of the tree goes through here so that listeners (sort
+    # indexes and friends) can keep their own state up to date incrementally.
+
+    def __init__(self, data):
+        self.data = data
+        self.version = 0
+        self.listeners = []
+        self._names_key = None
+        self._names = []
+        # id(node) -> [node, reference count] for subtrees reachable from
+        # more than one parent after a copy.
+        self.shared = {}
+        self._normalize(data)
+
+    def _normalize(self, node):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            links = current.get(LINKS_KEY)
+            if links:
+                for i, item in enumerate(links):
+                    if not isinstance(item, list):
+                        links[i] = [item, ""]
+            stack.extend(v for k, v in current.items() if k != LINKS_KEY and isinstance(v, dict))
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def _changed(self, event, path, **info):
+        self.version += 1
+        path = tuple(path)
+        for listener in self.listeners:
+            listener.catalog_changed(event, path, info)
+
+    def node(self, path):
+        ref = self.data
+        for depth, key in enumerate(path):
+            ref = ref.get(key, {})
+            if ARCHIVE_KEY in ref:
+                ref = self.unpack(path[:depth], key)
+        return ref
+
+    def has_category(self, path):
+        node = self.data
+        for depth, key in enumerate(path):
+            node = node.get(key)
+            if not isinstance(node, dict):
+                return False
+            if ARCHIVE_KEY in node:
+                node = self.unpack(path[:depth], key)
+        return True
+
+    def subcategory_names(self, path):
+        # Numbered commands index into this list over and over; rebuild it
+        # only when the tree actually changed.
+        key = (tuple(path), self.version)
+        if self._names_key != key:
+            self._names = subcategories(self.node(path))
+            self._names_key = key
+        return self._names
+
+    def _own(self, path):
+        # Copy-on-write: any shared node on the way down to `path` is cloned
+        # (one level deep) before it is modified. Returns the writable node
+        # and, if the last node had to be cloned, the shared original.
+        node = self.data
+        original = None
+        for depth, key in enumerate(path):
+            child = node[key]
+            original = None
+            if ARCHIVE_KEY in child:
+                child = self.unpack(path[:depth], key)
+            if id(child) in self.shared:
+                original = child
+                child = self._clone(child)
+                node[key] = child
+                self._changed("node_replaced", path[:depth + 1])
+            node = child
+        return node, original
+
+    def _clone(self, node):
+        clone = {}
+        for key, value in node.items():
+            if key == LINKS_KEY:
+                clone[key] = [copy_link(link) for link in value]
+            else:
+                if isinstance(value, dict):
+                    self._share(value)
+                clone[key] = value
+        self._unshare(node)
+        return clone
+
+    def _share(self, node):
+        entry = self.shared.get(id(node))
+        if entry is None:
+            self.shared[id(node)] = [node, 2]
+        else:
+            entry[1] += 1
+
+    def _unshare(self, node):
+        entry = self.shared.get(id(node))
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 1:
+                del self.shared[id(node)]
+
+    def freeze(self):
+        # A stable view of the whole tree, e.g. for writing it out from
+        # another thread. The top-level categories are marked shared, so
+        # changes made meanwhile clone them (see _own) instead of touching
+        # the view. Hand the view back to release() when done.
+        frozen = {}
+        for key, value in self.data.items():
+            if key == LINKS_KEY:
+                frozen[key] = [copy_link(link) for link in value]
+            else:
+                if isinstance(value, dict):
+                    self._share(value)
+                frozen[key] = value
+        return frozen
+
+    def release(self, frozen):
+        # A node that is no longer shared was cloned or removed meanwhile,
+        # so the view was its last owner: dropping it takes one reference
+        # off each of its children, the ones the clone shared included.
+        stack = [value for key, value in frozen.items() if key != LINKS_KEY and isinstance(value, dict)]
+        while stack:
+            node = stack.pop()
+            if id(node) in self.shared:
+                self._unshare(node)
+            else:
+                stack.extend(child for key, child in node.items() if key != LINKS_KEY and isinstance(child, dict))
+
+    def _packed_on(self, path):
+        node = self.data
+        for key in path:
+            node = node.get(key)
+            if not isinstance(node, dict):
+                return False
+            if ARCHIVE_KEY in node:
+                return True
+        return False
+
+    def _owned_links(self, path, links):
+        packed = self._packed_on(path)
+        node, original = self._own(path)
+        if packed:
+            # Links read out of a packed category (PostingIndex.resolve)
+            # are copies; they stand for the equal links once unpacked.
+            return node, match_links(node.get(LINKS_KEY, []), links)
+        if original is None:
+            return node, links
+        positions = {id(link): i for i, link in enumerate(original.get(LINKS_KEY, []))}
+        current = node.get(LINKS_KEY, [])
+        return node, [current[positions[id(link)]] for link in links if id(link) in positions]
+
+    def add_link(self, path, url, desc=""):
+        link = new_link(url, desc)
+        node, _ = self._own(path)
+        node.setdefault(LINKS_KEY, []).append(link)
+        self._changed("link_added", path, link=link)
+        return link
+
+    def edit_link(self, path, link, url, desc):
+        _, owned = self._owned_links(path, [link])
+        if not owned:
+            return None
+        link = owned[0]
+        before = list(link)
+        link[0] = url
+        link[1] = desc
+        self._changed("link_edited", path, link=link, before=before)
+        return link
+
+    def replace_link(self, path, link, value):
+        # Overwrites url, description and metadata at once (used by sync).
+        _, owned = self._owned_links(path, [link])
+        if not owned:
+            return None
+        link = owned[0]
+        before = list(link)
+        link[:] = copy_link(value)
+        self._changed("link_edited", path, link=link, before=before)
+        return link
+
+    def remove_link(self, path, link):
+        return self.remove_links(path, [link]) == 1
+
+    def remove_links(self, path, links):
+        node, links = self._owned_links(path, links)
+        current = node.get(LINKS_KEY, [])
+        doomed = {id(link) for link in links}
+        if len(links) == 1:
+            for i, item in enumerate(current):
+                if item is links[0]:
+                    del current[i]
+                    self._changed("link_removed", path, link=item)
+                    return 1
+            return 0
+        removed = [item for item in current if id(item) in doomed]
+        if removed:
+            current[:] = [item for item in current if id(item) not in doomed]
+            self._changed("links_removed", path, links=removed)
+        return len(removed)
+
+    def mark_opened(self, path, link):
+        _, owned = self._owned_links(path, [link])
+        if not owned:
+            return None
+        link = owned[0]
+        before = list(link)
+        if len(link) < 3 or not isinstance(link[2], dict):
+            del link[2:]
+            link.append({})
+        else:
+            link[2] = dict(link[2])
+        link[2]["opened"] = int(time.time())
+        self._changed("link_opened", path, link=link, before=before)
+        return link
+
+    def set_tags(self, path, link, tags):
+        _, owned = self._owned_links(path, [link])
+        if not owned:
+            return None
+        link = owned[0]
+        before = list(link_meta(link).get("tags", []))
+        if len(link) < 3 or not isinstance(link[2], dict):
+            del link[2:]
+            link.append({})
+        else:
+            link[2] = dict(link[2])
+        tags = sorted(set(tags))
+        if tags:
+            link[2]["tags"] = tags
+        else:
+            link[2].pop("tags", None)
+        self._changed("link_tagged", path, link=link, before=before)
+        return link
+
+    def add_category(self, path, name):
+        node, _ = self._own(path)
+        node[name] = {}
+        self._changed("category_added", path, name=name)
+
+    def delete_category(self, path, name):
+        node, _ = self._own(path)
+        subtree = node.pop(name)
+        self._unshare(subtree)
+        self._changed("category_deleted", path, name=name, subtree=subtree)
+        return subtree
+
+    def replace_category(self, path, name, subtree):
+        # Puts a whole subtree in place of `name` (which may not exist yet),
+        # e.g. when restoring a snapshot. Raises ValueError for reserved
+        # names (see check_names).
+        check_names(name, subtree)
+        node, _ = self._own(path)
+        before = node.get(name)
+        if before is not None:
+            self._unshare(before)
+        self._normalize(subtree)
+        node[name] = subtree
+        self._changed("category_replaced", path, name=name, subtree=subtree, before=before)
+
+    def pack(self, path, name, digest=None):
+        # Swaps a category for a compressed copy of itself (see cold.py).
+        # Reading or changing anything inside unpacks it again. Listeners
+        # get category_swapped: same content, different representation.
+        node, _ = self._own(path)
+        before = node[name]
+        if ARCHIVE_KEY in before:
+            return before
+        packed = pack_subtree(before, digest)
+        self._unshare(before)
+        node[name] = packed
+        self._changed("category_swapped", path, name=name, subtree=packed, before=before)
+        return packed
+
+    def unpack(self, path, name):
+        path = tuple(path)
+        node, _ = self._own(path)
+        before = node[name]
+        if ARCHIVE_KEY not in before:
+            return before
+        subtree = unpack_subtree(before)
+        self._normalize(subtree)
+        self._unshare(before)
+        node[name] = subtree
+        self._changed("category_swapped", path, name=name, subtree=subtree, before=before)
+        return subtree
+
+    def rename_category(self, path, old_name, new_name):
+        node, _ = self._own(path)
+        node[new_name] = node.pop(old_name)
+        self._changed("category_renamed", path, name=old_name, new_name=new_name)
+
+    def free_name(self, path, name):
+        node = self.node(path)
+        if name not in node:
+            return name
+        n = 2
+        while f"{name} ({n})" in node:
+            n += 1
+        return f"{name} ({n})"
+
+    def move_category(self, path, name, dest, new_name=None):
+        # Relocates the subtree by reference: O(depth) no matter how many
+        # links live below it. Returns the name used at the destination.
+        path, dest = tuple(path), tuple(dest)
+        if dest[:len(path) + 1] == path + (name,):
+            raise ValueError("Cannot move a category into itself")
+        new_name = self.free_name(dest, new_name or name)
+        source, _ = self._own(path)
+        subtree = source.pop(name)
+        target, _ = self._own(dest)
+        target[new_name] = subtree
+        self._changed("category_moved", path, name=name, dest=dest, new_name=new_name, subtree=subtree)
+        return new_name
+
+    def copy_category(self, path, name, dest, new_name=None):
+        # The copy shares the subtree with the original until one side is
+        # modified (see _own), so copying is O(depth) as well.
+        path, dest = tuple(path), tuple(dest)
+        if dest[:len(path) + 1] == path + (name,):
+            raise ValueError("Cannot copy a category into itself")
+        new_name = self.free_name(dest, new_name or name)
+        subtree = self.node(path)[name]
+        target, _ = self._own(dest)
+        self._share(subtree)
+        target[new_name] = subtree
+        self._changed("category_copied", path, name=name, dest=dest, new_name=new_name, subtree=subtree)
+        return new_name
+
+    def move_links(self, path, links, dest):
+        path, dest = tuple(path), tuple(dest)
+        if path == dest:
+            return 0
+        source, links = self._owned_links(path, links)
+        moving = {id(link) for link in links}
+        current = source.get(LINKS_KEY, [])
+        moved = [item for item in current if id(item) in moving]
+        if not moved:
+            return 0
+        current[:] = [item for item in current if id(item) not in moving]
+        self._changed("links_removed", path, links=moved)
+        target, _ = self._own(dest)
+        target.setdefault(LINKS_KEY, []).extend(moved)
+        self._changed("links_added", dest, links=moved)
+        return len(moved)
+
+    def copy_links(self, path, links, dest):
+        copies = [copy_link(link) for link in links]
+        if copies:
+            target, _ = self._own(dest)
+            target.setdefault(LINKS_KEY, []).extend(copies)
+            self._changed("links_added", dest, links=copies)
+        return len(copies)
@@ -0,0 +1,105 @@
+import threading
+import time
+
+try:
+    import pyperclip
+except ImportError:
+    pyperclip = None
+
+
+class ClipboardService:
+    # Reads the system clipboard on a daemon thread so a slow or hanging
+    # backend (xclip/xsel over SSH, no X server, ...) never stalls the UI.
+    # Callers get the cached value, waiting at most `timeout` for a fresh one.
+    # The thread only runs on demand: it keeps the value fresh every `ttl`
+    # for `linger` seconds after the last get() and then exits.
+
+    def __init__(self, ttl=1.0, timeout=0.05, paste=None, linger=5.0):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.linger = linger
+        self.paste = paste
+        self.available = True
+        self.reason = ""
+        self.content = None
+        self.stamp = 0.0
+        self.requested = 0.0
+        self.lock = threading.Condition()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.closed = False
+
+        if self.paste is None:
+            if pyperclip is None:
+                self.disable("pyperclip is not installed")
+            else:
+                self.paste = pyperclip.paste
+
+    def disable(self, reason):
+        with self.lock:
+            self.available = False
+            self.reason = reason
+            self.lock.notify_all()
+
+    def start(self):
+        # Fetches the clipboard once in the background, so the first get()
+        # usually finds a value waiting.
+        with self.lock:
+            self._spawn()
+        return self
+
+    def _spawn(self):
+        if self.available and not self.closed and self.thread is None:
+            self.thread = threading.Thread(target=self._watch, name="clipboard-watcher", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.closed = True
+        self.wakeup.set()
+
+    def _watch(self):
+        while not self.closed and self.available:
+            try:
+                text = self.paste()
+            except Exception as e:
+                # pyperclip raises PyperclipException when no backend exists;
+                # there is no point retrying that on every keypress.
+                self.disable(str(e) or type(e).__name__)
+                break
+            with self.lock:
+                self.content = text or ""
+                self.stamp = time.monotonic()
+                self.lock.notify_all()
+                if self.stamp - self.requested >= self.linger:
+                    # Nobody asked lately; the next get() starts a new thread.
+                    self.thread = None
+                    return
+            self.wakeup.wait(self.ttl)
+            self.wakeup.clear()
+        with self.lock:
+            self.thread = None
+
+    def is_fresh(self):
+        return self.content is not None and time.monotonic() - self.stamp < self.ttl
+
+    def get(self, timeout=None):
+        # Returns the clipboard text, or None when the clipboard is
+        # unavailable or no fresh value arrived within the timeout: the
+        # cached one may be long out of date by then.
+        if not self.available:
+            return None
+        timeout = self.timeout if timeout is None else timeout
+        with self.lock:
+            self.requested = time.monotonic()
+            self._spawn()
+            if self.is_fresh():
+                return self.content
+            self.wakeup.set()
+            deadline = time.monotonic() + timeout
+            stamp = self.stamp
+            while self.available and self.stamp == stamp:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.lock.wait(remaining)
+            return self.content if self.available else None
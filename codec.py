@@ -0,0 +1,109 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from catalog import LINKS_KEY
+
+MODES = ("pretty", "compact")
+LINKS_PER_CHUNK = 1000
+BUFFER_SIZE = 1 << 16
+
+
+def detect_mode(raw):
+    # Compact files have nothing between the opening brace and the first key.
+    return "compact" if raw[:2] == b'{"' else "pretty"
+
+
+class JsonCodec:
+    # Reads and writes the catalog file. "pretty" is the same text as
+    # json.dump(..., indent=2), "compact" has no whitespace at all. orjson
+    # is used when it is installed and the json module otherwise; both
+    # write the same text.
+
+    def __init__(self, mode="pretty", backend=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown format '{mode}' (use pretty or compact)")
+        if backend not in (None, "json", "orjson"):
+            raise ValueError(f"Unknown JSON backend '{backend}'")
+        if backend == "orjson" and orjson is None:
+            raise ValueError("orjson is not installed")
+        self.mode = mode
+        self.backend = backend or ("orjson" if orjson else "json")
+
+    def dumps(self, value):
+        if self.backend == "orjson":
+            return orjson.dumps(value, option=orjson.OPT_INDENT_2 if self.mode == "pretty" else 0)
+        if self.mode == "pretty":
+            text = json.dumps(value, indent=2, ensure_ascii=False)
+        else:
+            text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        return text.encode("utf-8")
+
+    def loads(self, raw):
+        if self.backend == "orjson":
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+    def _indent(self, raw, depth):
+        if self.mode != "pretty" or not depth:
+            return raw
+        return raw.replace(b"\n", b"\n" + b"  " * depth)
+
+    def iter_encode(self, node, depth=0):
+        # Yields the encoding of a category piece by piece: subcategories
+        # are walked here and links are encoded LINKS_PER_CHUNK at a time,
+        # so the whole document never exists as one string.
+        if not node:
+            yield b"{}"
+            return
+        pretty = self.mode == "pretty"
+        newline = b"\n" + b"  " * (depth + 1) if pretty else b""
+        colon = b": " if pretty else b":"
+        separator = b"{"
+        for key, value in node.items():
+            yield separator + newline + self.dumps(key) + colon
+            separator = b","
+            if isinstance(value, dict):
+                yield from self.iter_encode(value, depth + 1)
+            elif key == LINKS_KEY and isinstance(value, list) and value:
+                yield from self._iter_list(value, depth + 1)
+            else:
+                yield self._indent(self.dumps(value), depth + 1)
+        yield (b"\n" + b"  " * depth if pretty else b"") + b"}"
+
+    def _iter_list(self, items, depth):
+        pretty = self.mode == "pretty"
+        separator = b"["
+        for start in range(0, len(items), LINKS_PER_CHUNK):
+            # "[a,b]" -> "a,b"; pretty: "[\n  a,\n  b\n]" -> "\n  a,\n  b"
+            chunk = self.dumps(items[start:start + LINKS_PER_CHUNK])
+            chunk = chunk[1:-2] if pretty else chunk[1:-1]
+            yield separator + self._indent(chunk, depth)
+            separator = b","
+        yield (b"\n" + b"  " * depth if pretty else b"") + b"]"
+
+    def write(self, filename, data):
+        # Streams into a temp file next to the target and renames it, so a
+        # crash mid-write never leaves a truncated catalog behind.
+        tmp = filename + ".tmp"
+        with open(tmp, "wb", buffering=BUFFER_SIZE) as f:
+            for chunk in self.iter_encode(data):
+                f.write(chunk)
+        os.replace(tmp, filename)
+
+    def read(self, filename):
+        with open(filename, "rb") as f:
+            return self.loads(f.read())
+
+
+def load_file(filename):
+    # Returns (data, codec); the codec writes the file back in the format
+    # it was found in.
+    with open(filename, "rb") as f:
+        raw = f.read()
+    codec = JsonCodec(detect_mode(raw))
+    return codec.loads(raw), codec
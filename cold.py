@@ -0,0 +1,76 @@
+import time
+
+from catalog import ARCHIVE_KEY
+from memory import measure_tree
+
+# A category nobody has been in for this long is packed by the next sweep.
+COLD_AFTER = 30 * 60
+# Smaller categories are not worth the trouble.
+MIN_LINKS = 200
+SWEEP_EVERY = 60
+
+
+class Archiver:
+    # Keeps rarely used parts of the catalog compressed (Catalog.pack), in
+    # memory and in products.json. Opening a packed category unpacks it;
+    # once it has gone unvisited for `cold_after` seconds a sweep packs it
+    # again. Sweeps only walk categories that are still hot, so their cost
+    # follows the part of the tree in use, not its size.
+
+    def __init__(self, catalog, stats, store=None, cold_after=COLD_AFTER):
+        self.catalog = catalog
+        self.stats = stats
+        self.store = store
+        self.cold_after = cold_after
+        self.started = time.time()
+        self.last_sweep = self.started
+        # path -> when it (or something below it) was last visited
+        self.visits = {}
+
+    def touch(self, path, now=None):
+        now = time.time() if now is None else now
+        path = tuple(path)
+        for depth in range(len(path) + 1):
+            self.visits[path[:depth]] = now
+
+    def last_visit(self, path):
+        return self.visits.get(tuple(path), self.started)
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return bool(self.cold_after) and now - self.last_sweep >= SWEEP_EVERY
+
+    def pack(self, path):
+        # Packs the category at `path`; returns its size in memory before
+        # and after.
+        path = tuple(path)
+        before = measure_tree(self.catalog.node(path)).total
+        # The snapshot store keeps the hash, so snapshots need not unpack.
+        digest = self.store.node_hash(path) if self.store is not None else None
+        packed = self.catalog.pack(path[:-1], path[-1], digest)
+        self.visits.pop(path, None)
+        return before, measure_tree(packed).total
+
+    def sweep(self, current_path=(), now=None):
+        # Packs every cold category of at least MIN_LINKS links that is not
+        # on `current_path`. Returns the paths packed.
+        now = time.time() if now is None else now
+        self.last_sweep = now
+        if not self.cold_after:
+            return []
+        current = tuple(current_path)
+        packed = []
+        stack = [((), self.catalog.data)]
+        while stack:
+            path, node = stack.pop()
+            for name, child in list(node.items()):
+                if not isinstance(child, dict) or ARCHIVE_KEY in child:
+                    continue
+                child_path = path + (name,)
+                if current[:len(child_path)] == child_path or now - self.last_visit(child_path) < self.cold_after:
+                    stack.append((child_path, child))
+                elif self.stats.get(child_path).links >= MIN_LINKS:
+                    self.pack(child_path)
+                    packed.append(child_path)
+                # Cold and small: everything below is smaller still.
+        return packed
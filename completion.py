@@ -0,0 +1,241 @@
+import re
+
+from catalog import LINKS_KEY, read_node
+
+COMMANDS = [
+    "add", "archive", "back", "cd", "compress", "cp", "delcat", "diff", "drops", "edit", "exit", "format", "gc",
+    "goto", "list", "mem", "mv", "new", "open", "prices", "publish", "query", "quit", "recent", "remove",
+    "rename", "restore", "sort", "sub", "sync", "tag", "tagged", "tags", "tree", "untag", "versions",
+]
+# Commands whose n-th argument (1-based) is a category path.
+PATH_ARGS = {"archive": 1, "cd": 1, "compress": 1, "open": 1, "mv": 2, "cp": 2, "restore": 2}
+
+
+class NameTrie:
+    # Character trie over casefolded names; `names` holds the original
+    # spellings that end at a node and `count` how many end below it.
+
+    __slots__ = ("children", "names", "count")
+
+    def __init__(self, names=()):
+        self.children = {}
+        self.names = []
+        self.count = 0
+        for name in names:
+            self.insert(name)
+
+    def insert(self, name):
+        node = self
+        node.count += 1
+        for ch in name.casefold():
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = NameTrie()
+            node = child
+            node.count += 1
+        node.names.append(name)
+
+    def remove(self, name):
+        key = name.casefold()
+        trail = [self]
+        for ch in key:
+            node = trail[-1].children.get(ch)
+            if node is None:
+                return False
+            trail.append(node)
+        if name not in trail[-1].names:
+            return False
+        trail[-1].names.remove(name)
+        for node in trail:
+            node.count -= 1
+        # Prune the branch that no name runs through any more.
+        for depth in range(len(key), 0, -1):
+            if trail[depth].count:
+                break
+            del trail[depth - 1].children[key[depth - 1]]
+        return True
+
+    def find(self, prefix):
+        node = self
+        for ch in prefix.casefold():
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix):
+        # Every name starting with `prefix` (ignoring case), in order;
+        # only the branch below the prefix is visited.
+        node = self.find(prefix)
+        result = []
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            result.extend(sorted(node.names))
+            stack.extend(node.children[ch] for ch in sorted(node.children, reverse=True))
+        return result
+
+
+class CategoryEntry:
+    # One category: a trie of its subcategory names, and the entry of each
+    # subcategory, or None until something looks inside it.
+
+    __slots__ = ("trie", "children")
+
+    def __init__(self, node):
+        names = [name for name, child in node.items() if name != LINKS_KEY and isinstance(child, dict)]
+        self.trie = NameTrie(names)
+        self.children = dict.fromkeys(names)
+
+    def add(self, name, entry=None):
+        if name not in self.children:
+            self.trie.insert(name)
+        self.children[name] = entry
+
+    def pop(self, name):
+        self.trie.remove(name)
+        return self.children.pop(name, None)
+
+
+class PathIndex:
+    # The category tree again, with a NameTrie of subcategory names at
+    # every level, kept up to date from catalog events. Entries are built
+    # the first time a path goes through them, so startup only reads the
+    # top level, and resolving or completing a path costs the length of
+    # the path and the names typed, not the size of the tree.
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.root = CategoryEntry(catalog.data)
+        catalog.subscribe(self)
+
+    def entry(self, path):
+        # Packed categories are read without unpacking them.
+        entry = self.root
+        cache = {}
+        for depth, name in enumerate(path):
+            if name not in entry.children:
+                return None
+            child = entry.children[name]
+            if child is None:
+                child = entry.children[name] = CategoryEntry(read_node(self.catalog.data, path[:depth + 1], cache))
+            entry = child
+        return entry
+
+    def _built(self, path):
+        # The entry at `path` if it has been built, without building it.
+        entry = self.root
+        for name in path:
+            entry = entry.children.get(name)
+            if entry is None:
+                return None
+        return entry
+
+    def catalog_changed(self, event, path, info):
+        if not event.startswith("category_"):
+            return
+        # Categories nobody has looked into yet are read from the catalog
+        # when they are first needed, so only built entries are updated.
+        parent = self._built(path)
+        if event == "category_moved":
+            moved = parent.pop(info["name"]) if parent is not None else None
+            target = self._built(info["dest"])
+            if target is not None:
+                target.add(info["new_name"], moved)
+        elif event == "category_copied":
+            target = self._built(info["dest"])
+            if target is not None:
+                target.add(info["new_name"])
+        elif parent is None:
+            return
+        elif event == "category_added":
+            parent.add(info["name"])
+        elif event == "category_deleted":
+            parent.pop(info["name"])
+        elif event == "category_renamed":
+            parent.add(info["new_name"], parent.pop(info["name"]))
+        elif event == "category_replaced":
+            parent.add(info["name"])
+
+    def resolve(self, path, target):
+        # Like join_path, but every part may be a unique prefix of a name
+        # (any case); an exact name always wins. Raises ValueError.
+        result = [] if target.startswith("/") else list(path)
+        entry = self.entry(result)
+        if entry is None:
+            raise ValueError(f"'/{'/'.join(result)}' does not exist")
+        for part in target.split("/"):
+            if part in ("", "."):
+                continue
+            if part == "..":
+                if result:
+                    result.pop()
+                    entry = self.entry(result)
+                continue
+            if part not in entry.children:
+                matches = entry.trie.complete(part)
+                exact = [name for name in matches if name.casefold() == part.casefold()]
+                if len(exact) == 1 or len(matches) == 1:
+                    part = (exact or matches)[0]
+                elif not matches:
+                    raise ValueError(f"No category matching '{part}' in /{'/'.join(result)}")
+                else:
+                    shown = ", ".join(matches[:5]) + (", ..." if len(matches) > 5 else "")
+                    raise ValueError(f"'{part}' is ambiguous: {shown}")
+            result.append(part)
+            entry = self.entry(result)
+        return result
+
+    def complete(self, path, text):
+        # Completions for a partly typed path: the typed directory part is
+        # kept as is and the last part is completed from the trie.
+        cut = text.rfind("/") + 1
+        directory, last = text[:cut], text[cut:]
+        try:
+            base = self.resolve(path, directory) if directory else list(path)
+        except ValueError:
+            return []
+        entry = self.entry(base)
+        return [directory + name + "/" for name in entry.trie.complete(last)]
+
+
+class Completer:
+    # readline completer for main.py: command names first, then category
+    # paths for the arguments listed in PATH_ARGS. `path` is the current
+    # category and is updated by the main loop.
+
+    def __init__(self, paths, readline):
+        self.paths = paths
+        self.readline = readline
+        self.commands = NameTrie(COMMANDS)
+        self.path = []
+        self.matches = []
+
+    def candidates(self, line, begin, end):
+        # Completions for the word readline replaces (line[begin:end]).
+        # Category names may contain spaces, so the whole path argument is
+        # completed and then cut down to that word.
+        if not line[:begin].strip():
+            return [name + " " for name in self.commands.complete(line[begin:end])]
+        command = line.split()[0]
+        position = PATH_ARGS.get(command)
+        if position is None:
+            return []
+        match = re.match(r"\s*\S+" + r"\s+\S+" * (position - 1) + r"\s+(.*)$", line[:end])
+        if match is None or match.start(1) > begin:
+            return []
+        return [option[begin - match.start(1):] for option in self.paths.complete(self.path, match.group(1))]
+
+    def __call__(self, text, state):
+        if state == 0:
+            line = self.readline.get_line_buffer()
+            try:
+                self.matches = self.candidates(line, self.readline.get_begidx(), self.readline.get_endidx())
+            except Exception:
+                self.matches = []
+        return self.matches[state] if state < len(self.matches) else None
+
+    def install(self):
+        self.readline.set_completer(self)
+        self.readline.set_completer_delims(" \t\n")
+        self.readline.parse_and_bind("tab: complete")
@@ -1,11 +1,27 @@
-import json
 import webbrowser
 import os
 import sys
 import curses
 import time
-import pyperclip
 import re
+import itertools
+import asyncio
+
+from catalog import RESERVED_NAMES, Catalog, is_packed, link_display, link_url, link_urls, unpack_subtree
+from clipboard import ClipboardService
+from line_editor import LineEditor
+from sort_index import SORT_LABELS, SORT_MODES, SortIndex
+from subtree_stats import SubtreeStats, format_stats
+from tags import TagIndex, link_tags, normalize_tag
+from snapshots import SnapshotStore, snapshot_dir
+from query import QueryEngine
+from codec import JsonCodec, load_file
+from frecency import FrecencyStore, frecency_file
+from memory import AllocationProfiler, format_bytes, heaviest, measure_tree, report_lines, size_to_dict
+from cold import Archiver
+from recording import Recorder, record_arg
+from page_archive import PageArchive, archive_dir, format_time
+from prices import PriceHistory, format_price, prices_file, sample_prices
 
 try:
     import curses
@@ -18,22 +34,115 @@ except ImportError:
 
 JSON_FILE = "products.json"
 LINKS_KEY = "_links"
+INVALID_CATEGORY_CHARS = r'[<>:"/\\|?*]'
+SEARCH_VIEW_BLOCKED_KEYS = {ord(c) for c in "aAeEdDnNxXcCpPvViIwWzZ* "}
+SEARCH_LIMIT = 5000
+SEARCH_TITLES = {"tag": "🏷️ tagged", "query": "🔎 query", "top": "⭐ top"}
+TOP_COUNT = 50
+MEMORY_TOP = 10
+REDRAW_INTERVAL = 0.25
+# Keys read together are handled as a batch with one redraw after it; in
+# the item list a run of these becomes one jump.
+NAV_KEYS = {curses.KEY_UP: -1, curses.KEY_DOWN: 1}
+TEXT_MODES = ("adding", "new_category", "edit_link", "edit_category", "tag_filter", "query_filter")
+# With bracketed paste on, the terminal wraps pasted text in these.
+PASTE_START = (27, ord('['), ord('2'), ord('0'), ord('0'), ord('~'))
+PASTE_END = (27, ord('['), ord('2'), ord('0'), ord('1'), ord('~'))
+
+
+class BackgroundJob:
+    # Something running in an executor thread; `done` may be advanced from
+    # that thread to show progress in the status line.
+
+    def __init__(self, label, total=0):
+        self.label = label
+        self.total = total
+        self.done = 0
+
+    def describe(self):
+        if self.total > 1:
+            return f"⏳ {self.label} {self.done}/{self.total}"
+        return f"⏳ {self.label}..."
+
+
+class CategoryItems:
+    # The rows of a category: subcategories, then links in the current
+    # sort order, read straight from the node's link list or its SortIndex
+    # view. Rows are made when asked for, so drawing a screenful costs a
+    # screenful however big the category is, and link events need no work
+    # here because the view is already kept current.
+
+    def __init__(self, categories, links):
+        self.categories = categories
+        self.links = links
+
+    def __len__(self):
+        return len(self.categories) + len(self.links)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < len(self.categories):
+            return ("category", self.categories[index])
+        link = self.links[index - len(self.categories)]
+        return ("link", link_display(link), link)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
 
 class ProductLinkManagerTUI:
-    def __init__(self, stdscr):
+    def __init__(self, stdscr, record_to=None, json_file=JSON_FILE):
         self.stdscr = stdscr
+        # Snapshots, history, prices and archived pages live next to it.
+        self.json_file = json_file
+        self.codec = JsonCodec()
         self.data = self.load_data()
+        self.catalog = Catalog(self.data)
+        self.sort_index = SortIndex(self.catalog)
+        self.subtree_stats = SubtreeStats(self.catalog)
+        self.tag_index = TagIndex(self.catalog)
+        self.snapshots = SnapshotStore(self.catalog, snapshot_dir(self.json_file))
+        self.query_engine = QueryEngine(self.catalog)
+        self.frecency = FrecencyStore(self.catalog, frecency_file(self.json_file))
+        self.archiver = Archiver(self.catalog, self.subtree_stats, self.snapshots)
+        self.prices = PriceHistory(prices_file(self.json_file))
+        self.price_job = None
+        self.pages = PageArchive(archive_dir(self.json_file))
+        self.archive_job = None
+        # ("tag" | "query" | "top", text) while showing search results.
+        self.search = None
+        self.sort_mode = "insertion"
+        self.items_cache_key = None
+        self.items_cache = []
+        self.profiler = AllocationProfiler()
+        self.memory_size = None
+        self.memory_lines = []
+        self.clipboard = ClipboardService().start()
         self.path = []
         self.current_selection = 0
         self.running = True
         self.status_message = ""
+        self.jobs = []
+        self.save_job = None
+        self.save_pending = False
+        self.key_queue = None
+        # Keys of a paste whose end marker has not been read yet, and the
+        # start of a paste marker cut off at the end of the last batch.
+        self.paste_keys = None
+        self.paste_prefix = []
         self.status_time = 0
+        self.take_snapshot()
+        # Opt-in trace of every key batch for benchmarks/replay_session.py.
+        self.recorder = None
+        if record_to:
+            self.recorder = Recorder(record_to, "tui", self.snapshots.current_hash(), self.snapshots.directory, self.json_file)
         self.mode = "browse"
-        self.add_inputs = ["", ""]
-        self.add_input_index = 0
+        self.fields = []
+        self.field_index = 0
         self.scroll_offset = 0
-        self.category_input = ""
-        self.category_cursor_pos = 0
         
         curses.curs_set(0) 
         self.stdscr.clear()
@@ -48,57 +157,238 @@ class ProductLinkManagerTUI:
         curses.init_pair(6, curses.COLOR_MAGENTA, -1)   
         curses.init_pair(7, curses.COLOR_WHITE, curses.COLOR_RED)   
         
-        self.edit_inputs = ["", ""] 
-        self.edit_input_index = 0
-        self.edit_category_input = ""
-        self.edit_category_cursor_pos = 0
         self.edit_original_name = ""
+        self.edit_link_ref = None
+        self.item_clipboard = None
+        self.selected = {}
+        self.select_anchor = None
+        self.confirm_text = ""
+        self.confirm_action = None
         
         self.height, self.width = self.stdscr.getmaxyx()
    
         
     def load_data(self):
-        if not os.path.exists(JSON_FILE):
+        if not os.path.exists(self.json_file):
             return {}
         try:
-            with open(JSON_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            # Saves keep the file's format (see `format` in main.py).
+            data, self.codec = load_file(self.json_file)
+            return data
         except:
             return {}
     
     def save_data(self):
+        # Saves run in the background on a frozen view of the catalog, so
+        # editing can go on meanwhile; requests made during a save are
+        # folded into one follow-up save.
+        self.save_pending = True
+        if self.save_job is None:
+            self.start_save()
+    
+    def start_save(self):
+        self.save_pending = False
+        frozen = self.catalog.freeze()
+        
+        def finished(result, error):
+            self.catalog.release(frozen)
+            self.save_job = None
+            if error:
+                self.show_status(f"❌ Save failed: {error}")
+            else:
+                self.take_snapshot()
+                try:
+                    self.frecency.save()
+                except OSError as e:
+                    self.show_status(f"⚠️ Saving open history failed: {e}")
+            if self.save_pending:
+                self.start_save()
+        
+        self.save_job = self.run_background(BackgroundJob("💾 Saving"), self.codec.write, self.json_file, frozen, done=finished)
+    
+    def run_background(self, job, func, *args, done=None):
+        # Runs func(*args) in the default executor and calls done(result,
+        # error) back on the event loop. Without a running loop (headless
+        # use) it runs right away instead. Returns the job while it runs.
         try:
-            with open(JSON_FILE, "w", encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            self.show_status(f"❌ Save failed: {str(e)}")
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            result = error = None
+            try:
+                result = func(*args)
+            except Exception as e:
+                error = e
+            if done:
+                done(result, error)
+            return None
+        
+        self.jobs.append(job)
+        future = loop.run_in_executor(None, func, *args)
+        
+        def finished(future):
+            self.jobs.remove(job)
+            error = future.exception()
+            if done:
+                done(None if error else future.result(), error)
+        
+        future.add_done_callback(finished)
+        return job
+    
+    def take_snapshot(self):
+        try:
+            self.snapshots.snapshot(self.subtree_stats.root.links)
+        except OSError as e:
+            self.show_status(f"⚠️ Snapshot failed: {e}")
     
     def resolve_path(self, path):
-        ref = self.data
-        for key in path:
-            ref = ref.get(key, {})
-        return ref
+        return self.catalog.node(path)
     
     def get_current_items(self):
+        cache_key = (tuple(self.path), self.sort_mode, self.search, self.catalog.version)
+        if cache_key != self.items_cache_key:
+            # Search results are rebuilt (at most SEARCH_LIMIT rows); a
+            # category only lists its subcategories again. The profiler
+            # counts it apart.
+            self.items_cache = self.profiler.measure("get_current_items", self.build_items)
+            self.items_cache_key = cache_key
+        return self.items_cache
+    
+    def build_items(self):
+        if self.search is not None:
+            # Search view: matching links from the whole tree, each carrying
+            # the path of the category it lives in. Queries stream, so only
+            # the first SEARCH_LIMIT results are ever produced.
+            kind, text = self.search
+            if kind == "top":
+                results = ((path, link) for path, link, _ in self.frecency.top(TOP_COUNT))
+            elif kind == "tag":
+                results = self.tag_index.query(text)
+            else:
+                results = self.query_engine.run(text)
+            return [("link", f"{'/'.join(path) or 'root'}: {link_display(link)}", link, path)
+                    for path, link in itertools.islice(results, SEARCH_LIMIT)]
+        
         node = self.resolve_path(self.path)
         subcategories = [k for k in node if k != LINKS_KEY]
-        links = node.get(LINKS_KEY, [])
+        return CategoryItems(subcategories, self.sort_index.view(self.path, self.sort_mode))
+    
+    def item_key(self, item):
+        return (item[0], item[1]) if item[0] == "category" else ("link", id(item[2]))
+    
+    def selected_items(self):
+        # The selection if there is one, otherwise the highlighted item.
+        if self.selected:
+            return list(self.selected.values())
+        items = self.get_current_items()
+        if items and self.current_selection < len(items):
+            return [items[self.current_selection]]
+        return []
+    
+    def clear_selection(self):
+        self.selected = {}
+        self.select_anchor = None
+    
+    def toggle_selection(self):
+        items = self.get_current_items()
+        if not items or self.current_selection >= len(items):
+            return
+        item = items[self.current_selection]
+        key = self.item_key(item)
+        if key in self.selected:
+            del self.selected[key]
+        else:
+            self.selected[key] = item
+        self.select_anchor = self.current_selection
+        if self.current_selection < len(items) - 1:
+            self.current_selection += 1
+    
+    def select_range(self):
+        items = self.get_current_items()
+        if not items or self.current_selection >= len(items):
+            return
+        anchor = self.select_anchor if self.select_anchor is not None else self.current_selection
+        start, end = sorted((min(anchor, len(items) - 1), self.current_selection))
+        for item in items[start:end + 1]:
+            self.selected[self.item_key(item)] = item
+        self.show_status(f"☑️ {len(self.selected)} selected")
+    
+    def select_all(self):
+        self.selected = {self.item_key(item): item for item in self.get_current_items()}
+        self.show_status(f"☑️ {len(self.selected)} selected")
+    
+    def invert_selection(self):
+        self.selected = {self.item_key(item): item for item in self.get_current_items()
+                         if self.item_key(item) not in self.selected}
+        self.show_status(f"☑️ {len(self.selected)} selected")
+    
+    def clamp_selection(self):
+        items = self.get_current_items()
+        if self.current_selection >= len(items):
+            self.current_selection = max(0, len(items) - 1)
+    
+    def ask_confirm(self, text, action):
+        self.confirm_text = text
+        self.confirm_action = action
+        self.mode = "confirm"
+    
+    def handle_confirm_input(self, key):
+        action = self.confirm_action
+        self.mode = "browse"
+        self.confirm_action = None
+        if key == ord('y') or key == ord('Y'):
+            action()
+        else:
+            self.show_status("❌ Cancelled")
+    
+    def cycle_sort_mode(self):
+        selected = None
+        items = self.get_current_items()
+        if items and self.current_selection < len(items):
+            selected = items[self.current_selection]
         
-        items = []
+        self.sort_mode = SORT_MODES[(SORT_MODES.index(self.sort_mode) + 1) % len(SORT_MODES)]
         
-        for sub in subcategories:
-            items.append(("category", sub))
+        if selected is not None and selected[0] == "link":
+            for i, item in enumerate(self.get_current_items()):
+                if item[0] == "link" and item[2] is selected[2]:
+                    self.current_selection = i
+                    break
+        self.show_status(f"↕️ Sorting links by {SORT_LABELS[self.sort_mode]}")
+    
+    def open_link(self, link, path=None):
+        return self.open_links([(link, path)]) == 1
+    
+    def open_links(self, targets):
+        # Marks the links opened right away; starting the browser can take
+        # a while, so that happens in the background. Returns the count.
+        urls = []
+        for link, path in targets:
+            self.catalog.mark_opened(self.path if path is None else path, link)
+            urls.append(link_url(link))
+        if not urls:
+            return 0
+        job = BackgroundJob("🌐 Opening", len(urls))
         
-
-        for link in links:
-            if isinstance(link, list) and len(link) == 2:
-                url, desc = link
-                display_text = desc if desc.strip() else url
+        def open_all():
+            failed = []
+            for url in urls:
+                try:
+                    webbrowser.open_new_tab(url)
+                except Exception:
+                    failed.append(url)
+                job.done += 1
+            return failed
+        
+        def finished(failed, error):
+            if error or failed:
+                self.show_status(f"❌ Failed to open: {(failed or urls)[0]}")
+            elif len(urls) == 1:
+                self.show_status(f"🌐 Opened: {urls[0]}")
             else:
-                display_text = link
-            items.append(("link", display_text, link))
+                self.show_status(f"🌐 Opened {len(urls)} links")
         
-        return items
+        self.run_background(job, open_all, done=finished)
+        return len(urls)
     
     def show_status(self, message):
         self.status_message = message
@@ -113,37 +403,57 @@ class ProductLinkManagerTUI:
         if not name:
             return None, "Category name cannot be empty"
         
-        if re.search(r'[<>:"/\\|?*]', name):
+        if re.search(INVALID_CATEGORY_CHARS, name):
             return None, "Category name contains invalid characters"
         
         if len(name) > 50:
             return None, "Category name too long (max 50 characters)"
         
-        if name == LINKS_KEY:
-            return None, f"'{LINKS_KEY}' is a reserved name"
+        if name in RESERVED_NAMES:
+            return None, f"'{name}' is a reserved name"
         
         return name, None
     
+    def read_clipboard(self):
+        paste_text = self.clipboard.get()
+        if paste_text is None:
+            if not self.clipboard.available:
+                self.show_status(f"❌ Clipboard unavailable: {self.clipboard.reason}")
+            else:
+                self.show_status("⏳ Clipboard not ready yet, try again")
+        return paste_text
+    
+    def category_field(self, text=""):
+        return LineEditor(text, max_length=50, invalid_chars=INVALID_CATEGORY_CHARS)
+    
+    def start_editing(self, mode, fields):
+        self.mode = mode
+        self.fields = fields
+        self.field_index = 0
+    
     def paste_from_clipboard(self):
         try:
-            paste_text = pyperclip.paste()
+            paste_text = self.read_clipboard()
+            if paste_text is None:
+                return
             if paste_text:
                 paste_text = paste_text.strip().replace('\n', ' ').replace('\r', ' ')
                 while '  ' in paste_text:
                     paste_text = paste_text.replace('  ', ' ')
                 
-                if self.mode == "adding":
-                    if self.add_input_index == 0 and (paste_text.startswith('http://') or paste_text.startswith('https://')):
-                        self.add_inputs[self.add_input_index] = paste_text
+                field = self.fields[self.field_index]
+                if self.mode in ("adding", "edit_link"):
+                    if self.field_index == 0 and (paste_text.startswith('http://') or paste_text.startswith('https://')):
+                        field.set_text(paste_text)
+                        field.end()
                         self.show_status(f"📋 Pasted URL: {paste_text[:50]}{'...' if len(paste_text) > 50 else ''}")
                     else:
-                        self.add_inputs[self.add_input_index] += paste_text
+                        field.insert(paste_text)
                         self.show_status(f"📋 Pasted: {paste_text[:30]}{'...' if len(paste_text) > 30 else ''}")
-                elif self.mode == "new_category":
-                    cleaned_text = re.sub(r'[<>:"/\\|?*]', '', paste_text)
-                    if len(self.category_input + cleaned_text) <= 50:
-                        self.category_input += cleaned_text
-                        self.category_cursor_pos = len(self.category_input)
+                elif self.mode in ("new_category", "edit_category"):
+                    cleaned_text = re.sub(INVALID_CATEGORY_CHARS, '', paste_text)
+                    if len(field) + len(cleaned_text) <= 50:
+                        field.insert(cleaned_text)
                         self.show_status(f"📋 Pasted (cleaned): {cleaned_text[:30]}{'...' if len(cleaned_text) > 30 else ''}")
                     else:
                         self.show_status("❌ Paste would exceed character limit")
@@ -186,6 +496,17 @@ class ProductLinkManagerTUI:
         except curses.error:
             pass
     
+    def draw_field(self, y, x, width, field, active, attr):
+        visible, cursor_col, more_left, more_right = field.view(max(1, width - 3))
+        if active:
+            visible = visible[:cursor_col] + "█" + visible[cursor_col:]
+        else:
+            attr = curses.A_NORMAL
+        
+        left_indicator = "◀" if more_left else " "
+        right_indicator = "▶" if more_right else " "
+        self.safe_addstr(y, x, left_indicator + visible + right_indicator, attr)
+    
     def draw_display(self):
         self.stdscr.clear()
         
@@ -197,8 +518,13 @@ class ProductLinkManagerTUI:
         self.safe_addstr(header_y + 1, (self.width - len(title_text)) // 2, title_text, curses.color_pair(1) | curses.A_BOLD)
         
         path_text = f"📂 {'/'.join(self.path) if self.path else 'root'}"
+        if self.search is not None:
+            path_text = f"{SEARCH_TITLES[self.search[0]]}: {self.search[1]}"
         self.safe_addstr(header_y + 2, 2, path_text, curses.color_pair(1))
         
+        sort_text = f"↕ {SORT_LABELS[self.sort_mode]}"
+        self.safe_addstr(header_y + 2, max(2, self.width - len(sort_text) - 3), sort_text, curses.color_pair(1))
+        
 
         items_y = header_height
         items_height = self.height - 8  
@@ -207,7 +533,9 @@ class ProductLinkManagerTUI:
         elif self.mode == "new_category":
             items_height -= 8  
         elif self.mode == "edit_link":
-            items_height -= 8  
+            items_height -= 10  
+        elif self.mode in ("tag_filter", "query_filter"):
+            items_height -= 6  
         elif self.mode == "edit_category":
             items_height -= 8  
         
@@ -218,7 +546,15 @@ class ProductLinkManagerTUI:
             no_items_text = "📭 No items in this category"
             self.safe_addstr(items_y + items_height // 2, (self.width - len(no_items_text)) // 2, no_items_text, curses.color_pair(3))
         else:
-            self.draw_box(items_y, 0, items_height, self.width, f"Items ({len(items)} total)")
+            node_stats = self.subtree_stats.get(self.path)
+            current = self.resolve_path(self.path)
+            title = f"Items ({len(items)} total, {node_stats.links} links below)"
+            if self.selected:
+                title = f"Items ({len(items)} total, {len(self.selected)} selected)"
+            if self.search is not None:
+                found = f"first {SEARCH_LIMIT}" if len(items) >= SEARCH_LIMIT else f"{len(items)} found"
+                title = f"Matching links ({found})"
+            self.draw_box(items_y, 0, items_height, self.width, title)
             
             visible_height = items_height - 2  
             start_index = max(0, self.current_selection - visible_height // 2)
@@ -228,26 +564,44 @@ class ProductLinkManagerTUI:
                 item = items[i]
                 y_pos = items_y + 1 + (i - start_index)
                 
+                count_text = ""
                 if item[0] == "category":
-                    prefix = "📁"
+                    prefix = "📦" if is_packed(current.get(item[1])) else "📁"
                     text = item[1]
                     color = curses.color_pair(2)
+                    child_stats = node_stats.children.get(item[1])
+                    if child_stats is not None:
+                        count_text = f"({format_stats(child_stats)})"
                 else:
                     prefix = "🔗"
                     text = item[1]
                     color = curses.color_pair(3)
+                    tags = link_tags(item[2])
+                    if tags:
+                        count_text = " ".join(f"#{tag}" for tag in tags)
+                    series = self.prices.get(link_url(item[2]))
+                    if series is not None and series.last is not None:
+                        trend = f"{series.sparkline(8)} {format_price(series.last)}"
+                        count_text = f"{trend}  {count_text}" if count_text else trend
                 
-                max_text_len = self.width - 8
+                max_text_len = self.width - 8 - (len(count_text) + 2 if count_text else 0)
                 if len(text) > max_text_len:
                     text = text[:max_text_len-3] + "..."
                 
                 display_text = f"{prefix} {text}"
+                is_selected = self.selected and self.item_key(item) in self.selected
                 
-                if i == self.current_selection and self.mode == "browse":
-                    self.safe_addstr(y_pos, 1, "►", curses.color_pair(4) | curses.A_BOLD)
+                if i == self.current_selection and self.mode in ("browse", "confirm"):
+                    self.safe_addstr(y_pos, 1, "✓" if is_selected else "►", curses.color_pair(4) | curses.A_BOLD)
                     self.safe_addstr(y_pos, 3, display_text, curses.color_pair(4) | curses.A_BOLD)
+                elif is_selected:
+                    self.safe_addstr(y_pos, 1, "✓", curses.color_pair(6) | curses.A_BOLD)
+                    self.safe_addstr(y_pos, 3, display_text, curses.color_pair(6) | curses.A_BOLD)
                 else:
                     self.safe_addstr(y_pos, 3, display_text, color)
+                
+                if count_text:
+                    self.safe_addstr(y_pos, self.width - len(count_text) - 3, count_text, curses.color_pair(1))
         
         if self.mode == "adding":
             input_y = items_y + items_height
@@ -256,306 +610,200 @@ class ProductLinkManagerTUI:
             self.draw_box(input_y, 0, input_height, self.width, "Add New Link")
             
             labels = ["URL", "Description"]
-            for i, (label, val) in enumerate(zip(labels, self.add_inputs)):
+            for i, (label, field) in enumerate(zip(labels, self.fields)):
                 y_pos = input_y + 1 + i * 2
-                is_active = i == self.add_input_index
-                
                 self.safe_addstr(y_pos, 2, f"{label}:", curses.color_pair(1))
-                
-                input_text = val
-                if is_active:
-                    input_text += "█"
-                    attr = curses.color_pair(4) | curses.A_BOLD
-                else:
-                    attr = curses.A_NORMAL
-                
-                max_input_len = self.width - len(label) - 6
-                if len(input_text) > max_input_len:
-                    input_text = input_text[:max_input_len-3] + "..."
-                
-                self.safe_addstr(y_pos, len(label) + 4, input_text, attr)
+                self.draw_field(y_pos, len(label) + 3, self.width - len(label) - 5, field,
+                                i == self.field_index, curses.color_pair(4) | curses.A_BOLD)
             
-            instructions = "↑↓:switch | Tab:save | Esc:cancel | Ctrl+V/P:paste"
+            instructions = "↑↓:switch | Tab:save | Esc:cancel | ←→:move | Ctrl+V/P:paste"
             self.safe_addstr(input_y + input_height - 2, 2, instructions, curses.color_pair(1))
         
-        elif self.mode == "new_category":
+        elif self.mode in ("new_category", "edit_category"):
             input_y = items_y + items_height
             input_height = 8
+            field = self.fields[0]
+            creating = self.mode == "new_category"
             
-            self.draw_box(input_y, 0, input_height, self.width, "Create New Category")
+            self.draw_box(input_y, 0, input_height, self.width, "Create New Category" if creating else "Edit Category")
             
             self.safe_addstr(input_y + 1, 2, "Category Name:", curses.color_pair(1))
+            self.draw_field(input_y + 2, 3, self.width - 20, field, True, curses.color_pair(4) | curses.A_BOLD)
             
-            display_input = self.category_input
-            if len(display_input) < self.category_cursor_pos:
-                display_input += " " * (self.category_cursor_pos - len(display_input))
-            
-            display_input = display_input[:self.category_cursor_pos] + "█" + display_input[self.category_cursor_pos:]
-            
-            max_input_len = self.width - 20
-            if len(display_input) > max_input_len:
-                display_input = display_input[:max_input_len-3] + "..."
-            
-            self.safe_addstr(input_y + 2, 4, display_input, curses.color_pair(4) | curses.A_BOLD)
-            
-
-            char_count = f"({len(self.category_input)}/50)"
-            color = curses.color_pair(5) if len(self.category_input) > 45 else curses.color_pair(1)
+            char_count = f"({len(field)}/50)"
+            color = curses.color_pair(5) if len(field) > 45 else curses.color_pair(1)
             self.safe_addstr(input_y + 2, self.width - 12, char_count, color)
             
-            if self.category_input:
-                validated_name, error = self.validate_category_name(self.category_input)
+            if len(field):
+                validated_name, error = self.validate_category_name(field.text)
+                node = self.resolve_path(self.path)
                 if error:
                     self.safe_addstr(input_y + 4, 2, f"❌ {error}", curses.color_pair(5))
+                elif not creating and validated_name == self.edit_original_name:
+                    self.safe_addstr(input_y + 4, 2, "ℹ️ No changes made", curses.color_pair(1))
+                elif validated_name in node:
+                    self.safe_addstr(input_y + 4, 2, "⚠️ Category already exists", curses.color_pair(7))
+                elif creating:
+                    self.safe_addstr(input_y + 4, 2, f"✅ Will create: '{validated_name}'", curses.color_pair(2))
                 else:
-                    node = self.resolve_path(self.path)
-                    if validated_name in node:
-                        self.safe_addstr(input_y + 4, 2, "⚠️ Category already exists", curses.color_pair(7))
-                    else:
-                        self.safe_addstr(input_y + 4, 2, f"✅ Will create: '{validated_name}'", curses.color_pair(2))
+                    self.safe_addstr(input_y + 4, 2, f"✅ Will rename to: '{validated_name}'", curses.color_pair(2))
             
-            instructions1 = "Enter:create | Esc:cancel | Ctrl+V/P:paste"
-            instructions2 = "Backspace:delete | ←→:move cursor"
+            instructions1 = f"Enter:{'create' if creating else 'save'} | Esc:cancel | Ctrl+V/P:paste"
+            instructions2 = "Backspace/Del:delete | ←→ Home/End Ctrl+←→:move cursor"
             self.safe_addstr(input_y + 5, 2, instructions1, curses.color_pair(1))
             self.safe_addstr(input_y + 6, 2, instructions2, curses.color_pair(1))
 
         elif self.mode == "edit_link":
             input_y = items_y + items_height
-            input_height = 8  
+            input_height = 10  
             
             self.draw_box(input_y, 0, input_height, self.width, "Edit Link")
             
-            labels = ["URL", "Description"]
-            
-            for i, (label, val) in enumerate(zip(labels, self.edit_inputs)):
+            labels = ["URL", "Description", "Tags (space separated)"]
+            for i, (label, field) in enumerate(zip(labels, self.fields)):
                 y_pos = input_y + 1 + i * 2  
-                is_active = i == self.edit_input_index
-                
                 self.safe_addstr(y_pos, 2, f"{label}:", curses.color_pair(1))
-                
-                max_input_len = self.width - 6  
-                
-                if not hasattr(self, 'edit_input_scroll_offset'):
-                    self.edit_input_scroll_offset = [0, 0]  # One for each field
-                
-                if len(self.edit_input_scroll_offset) <= i:
-                    self.edit_input_scroll_offset.extend([0] * (i + 1 - len(self.edit_input_scroll_offset)))
-                
-                if not hasattr(self, 'edit_input_cursor_pos'):
-                    self.edit_input_cursor_pos = [len(self.edit_inputs[0]), len(self.edit_inputs[1])]
-                
-
-                if len(self.edit_input_cursor_pos) <= i:
-                    self.edit_input_cursor_pos.extend([len(val) for val in self.edit_inputs[i:]])
-                
-
-                self.edit_input_cursor_pos[i] = min(len(val), max(0, self.edit_input_cursor_pos[i]))
-                
-                cursor_pos = self.edit_input_cursor_pos[i]
-                scroll_offset = self.edit_input_scroll_offset[i]
-                
-
-                if cursor_pos < scroll_offset:
-                    self.edit_input_scroll_offset[i] = cursor_pos
-                elif cursor_pos >= scroll_offset + max_input_len - 1:  
-                    self.edit_input_scroll_offset[i] = cursor_pos - max_input_len + 2
-                
-                self.edit_input_scroll_offset[i] = max(0, self.edit_input_scroll_offset[i])
-                
-                scroll_offset = self.edit_input_scroll_offset[i]
-                visible_text = val[scroll_offset:scroll_offset + max_input_len - 1]
-                
-                if is_active:
-                    cursor_in_visible = cursor_pos - scroll_offset
-                    if 0 <= cursor_in_visible < len(visible_text):
-                        visible_text = visible_text[:cursor_in_visible] + "█" + visible_text[cursor_in_visible:]
-                    elif cursor_in_visible == len(visible_text):
-                        visible_text += "█"
-                    attr = curses.color_pair(4) | curses.A_BOLD
-                else:
-                    attr = curses.A_NORMAL
-                
-                left_indicator = "◀" if scroll_offset > 0 else " "
-                right_indicator = "▶" if scroll_offset + max_input_len - 1 < len(val) else " "
-                
-                display_line = left_indicator + visible_text + right_indicator
-                if len(display_line) > max_input_len:
-                    display_line = display_line[:max_input_len]
-                
-                self.safe_addstr(y_pos + 1, 3, display_line, attr)
+                self.draw_field(y_pos + 1, 3, self.width - 6, field,
+                                i == self.field_index, curses.color_pair(4) | curses.A_BOLD)
             
-            instructions = "↑↓:switch | Tab:save | Esc:cancel | ←→:scroll | Ctrl+V/P:paste"
+            instructions = "↑↓:switch | Tab:save | Esc:cancel | ←→:move | Ctrl+V/P:paste"
             self.safe_addstr(input_y + input_height - 2, 2, instructions, curses.color_pair(1))
 
-        elif self.mode == "edit_category":
+        elif self.mode == "tag_filter":
             input_y = items_y + items_height
-            input_height = 8
-            
-            self.draw_box(input_y, 0, input_height, self.width, "Edit Category")
-            
-            self.safe_addstr(input_y + 1, 2, "Category Name:", curses.color_pair(1))
-            
-            max_input_len = self.width - 20
-            
-            if not hasattr(self, 'edit_category_scroll_offset'):
-                self.edit_category_scroll_offset = 0
-            
-            cursor_pos = self.edit_category_cursor_pos
-            scroll_offset = self.edit_category_scroll_offset
-            
-            if cursor_pos < scroll_offset:
-                self.edit_category_scroll_offset = cursor_pos
-            elif cursor_pos >= scroll_offset + max_input_len - 1:
-                self.edit_category_scroll_offset = cursor_pos - max_input_len + 2
-            
-            self.edit_category_scroll_offset = max(0, self.edit_category_scroll_offset)
-            
-            scroll_offset = self.edit_category_scroll_offset
-            visible_text = self.edit_category_input[scroll_offset:scroll_offset + max_input_len - 1]
-            
-            cursor_in_visible = cursor_pos - scroll_offset
-            if 0 <= cursor_in_visible < len(visible_text):
-                visible_text = visible_text[:cursor_in_visible] + "█" + visible_text[cursor_in_visible:]
-            elif cursor_in_visible == len(visible_text):
-                visible_text += "█"
-            
-            left_indicator = "◀" if scroll_offset > 0 else " "
-            right_indicator = "▶" if scroll_offset + max_input_len - 1 < len(self.edit_category_input) else " "
-            
-            display_line = left_indicator + visible_text + right_indicator
-            if len(display_line) > max_input_len:
-                display_line = display_line[:max_input_len]
-            
-            self.safe_addstr(input_y + 2, 3, display_line, curses.color_pair(4) | curses.A_BOLD)
-            
-            char_count = f"({len(self.edit_category_input)}/50)"
-            color = curses.color_pair(5) if len(self.edit_category_input) > 45 else curses.color_pair(1)
-            self.safe_addstr(input_y + 2, self.width - 12, char_count, color)
+            input_height = 6
             
-            if self.edit_category_input:
-                validated_name, error = self.validate_category_name(self.edit_category_input)
-                if error:
-                    self.safe_addstr(input_y + 4, 2, f"❌ {error}", curses.color_pair(5))
-                else:
-                    if validated_name == self.edit_original_name:
-                        self.safe_addstr(input_y + 4, 2, "ℹ️ No changes made", curses.color_pair(1))
-                    else:
-                        node = self.resolve_path(self.path)
-                        if validated_name in node:
-                            self.safe_addstr(input_y + 4, 2, "⚠️ Category already exists", curses.color_pair(7))
-                        else:
-                            self.safe_addstr(input_y + 4, 2, f"✅ Will rename to: '{validated_name}'", curses.color_pair(2))
+            self.draw_box(input_y, 0, input_height, self.width, "Filter by Tag")
+            self.safe_addstr(input_y + 1, 2, "Query:", curses.color_pair(1))
+            self.draw_field(input_y + 1, 9, self.width - 11, self.fields[0], True, curses.color_pair(4) | curses.A_BOLD)
+            self.safe_addstr(input_y + 3, 2, "gifts tech = both | gifts or tech = either | -cheap / not cheap = exclude", curses.color_pair(1))
+            self.safe_addstr(input_y + 4, 2, "Enter:apply (empty clears) | Esc:cancel", curses.color_pair(1))
+
+        elif self.mode == "query_filter":
+            input_y = items_y + items_height
+            input_height = 6
             
-            instructions1 = "Enter:save | Esc:cancel | ←→:scroll | Ctrl+V/P:paste"
-            instructions2 = "Backspace:delete | Home/End:move cursor"
-            self.safe_addstr(input_y + 5, 2, instructions1, curses.color_pair(1))
-            self.safe_addstr(input_y + 6, 2, instructions2, curses.color_pair(1))
+            self.draw_box(input_y, 0, input_height, self.width, "Query")
+            self.safe_addstr(input_y + 1, 2, "Query:", curses.color_pair(1))
+            self.draw_field(input_y + 1, 9, self.width - 11, self.fields[0], True, curses.color_pair(4) | curses.A_BOLD)
+            self.safe_addstr(input_y + 3, 2, "domain:x under:a/b desc~word url~text tag:x added>2026-10 | and / or / not / ( )", curses.color_pair(1))
+            self.safe_addstr(input_y + 4, 2, "Enter:run (empty clears) | Tab:explain plan | Esc:cancel", curses.color_pair(1))
 
         if self.mode == "browse":
             footer_y = self.height - 4
             footer_height = 3
             self.draw_box(footer_y, 0, footer_height, self.width, "Controls")
             
-            controls = "↑↓:Navigate | Enter:Select| O:Open All | B:Back | A:Add | E:Edit | D:Delete | N:New Category | Q:Quit"
+            controls = "↑↓:Navigate | Enter:Select| O:Open All | B:Back | A:Add | E:Edit | D:Delete | N:New Category | S:Sort | X/C/P:Cut/Copy/Paste | Space/V/*/I:Mark | T:Tag filter | /:Query | R:Top | M:Memory | Z:Compress | $:Prices | K/L:Keep/Open offline copy | W:Export | Q:Quit"
             if len(controls) > self.width - 4:
-                controls1 = "↑↓:Navigate | Enter:Select | B:Back | A:Add | E:Edit"
-                controls2 = "D:Delete | N:New Category | Q:Quit"
+                controls = "↑↓ Enter B | A:Add E:Edit D:Del N:New | O:Open S:Sort T:Tags /:Query R:Top M:Mem Z:Pack $:Prices K/L:Offline W:Export | X/C/P | Space/V/*/I:Mark | Q:Quit"
+            if self.search is not None:
+                controls = "↑↓:Navigate | Enter:Open | O:Open All | G:Go to category | T:Tags | /:Query | R:Top | B/Esc:Leave results | Q:Quit"
+            if len(controls) > self.width - 4:
+                controls1 = "↑↓:Navigate | Enter:Select | B:Back | A:Add | E:Edit | D:Delete"
+                controls2 = "N:New Category | S:Sort | X/C/P:Cut/Copy/Paste | Q:Quit"
                 self.safe_addstr(footer_y + 1, 2, controls1, curses.color_pair(1))
                 self.safe_addstr(footer_y + 2, 2, controls2, curses.color_pair(1))
             else:
                 self.safe_addstr(footer_y + 1, 2, controls, curses.color_pair(1))
         
+        elif self.mode == "confirm":
+            footer_y = self.height - 4
+            footer_height = 3
+            self.draw_box(footer_y, 0, footer_height, self.width, "Confirm")
+            self.safe_addstr(footer_y + 1, 2, self.confirm_text, curses.color_pair(5) | curses.A_BOLD)
+        
+        elif self.mode == "memory":
+            self.draw_memory_overlay()
+        
+        status_parts = [job.describe() for job in self.jobs]
         if self.status_message and time.time() - self.status_time < 3:
+            status_parts.append(self.status_message)
+        if status_parts:
             status_y = self.height - 1
-            self.safe_addstr(status_y, 0, " " * (self.width - 1), curses.color_pair(6))  # Clear line
-            self.safe_addstr(status_y, 2, self.status_message[:self.width-4], curses.color_pair(6) | curses.A_BOLD)
+            status_text = " | ".join(status_parts)
+            # safe_addstr leaves the bottom row alone, so write it directly.
+            try:
+                self.stdscr.addstr(status_y, 0, " " * (self.width - 1), curses.color_pair(6))  # Clear line
+                self.stdscr.addstr(status_y, 2, status_text[:self.width-4], curses.color_pair(6) | curses.A_BOLD)
+            except curses.error:
+                pass
         
         self.stdscr.refresh()
 
 
-    def move_edit_cursor_left(self):
-        if self.mode == "edit_link":
-            field_index = self.edit_input_index
-            if self.edit_input_cursor_pos[field_index] > 0:
-                self.edit_input_cursor_pos[field_index] -= 1
-        elif self.mode == "edit_category":
-            if self.edit_category_cursor_pos > 0:
-                self.edit_category_cursor_pos -= 1
-
-    def move_edit_cursor_right(self):
-        if self.mode == "edit_link":
-            field_index = self.edit_input_index
-            if self.edit_input_cursor_pos[field_index] < len(self.edit_inputs[field_index]):
-                self.edit_input_cursor_pos[field_index] += 1
-        elif self.mode == "edit_category":
-            if self.edit_category_cursor_pos < len(self.edit_category_input):
-                self.edit_category_cursor_pos += 1
+    def draw_memory_overlay(self):
+        top = 4
+        height = self.height - 5
+        for y in range(top, top + height):
+            self.safe_addstr(y, 0, " " * (self.width - 1))
+        self.draw_box(top, 0, height, self.width, "Memory")
+        lines = list(self.memory_lines)
+        if self.profiler.active or self.profiler.stats:
+            state = "⏺️ Tracing" if self.profiler.active else "⏸️ Traced"
+            lines.append("")
+            lines.append(f"{state} allocations per call (frame = one redraw, handle_* = one key):")
+            lines.extend(self.profiler.report_lines() or ["  nothing measured yet"])
+        for i, line in enumerate(lines[:height - 3]):
+            color = curses.color_pair(1) | curses.A_BOLD if not line.startswith(" ") else curses.color_pair(3)
+            self.safe_addstr(top + 1 + i, 2, line, color)
+        controls = "T:Trace allocations on/off | R:Measure again | W:Write JSON report | Esc/M:Close"
+        self.safe_addstr(top + height - 2, 2, controls, curses.color_pair(1))
 
-    def move_edit_cursor_home(self):
-        if self.mode == "edit_link":
-            field_index = self.edit_input_index
-            self.edit_input_cursor_pos[field_index] = 0
-        elif self.mode == "edit_category":
-            self.edit_category_cursor_pos = 0
+    def open_memory_view(self):
+        self.mode = "memory"
+        self.measure_memory()
 
-    def move_edit_cursor_end(self):
-        if self.mode == "edit_link":
-            field_index = self.edit_input_index
-            self.edit_input_cursor_pos[field_index] = len(self.edit_inputs[field_index])
-        elif self.mode == "edit_category":
-            self.edit_category_cursor_pos = len(self.edit_category_input)
-
-    def insert_char_at_cursor(self, char):
-        if self.mode == "edit_link":
-            field_index = self.edit_input_index
-            cursor_pos = self.edit_input_cursor_pos[field_index]
-            self.edit_inputs[field_index] = (
-                self.edit_inputs[field_index][:cursor_pos] + 
-                char + 
-                self.edit_inputs[field_index][cursor_pos:]
-            )
-            self.edit_input_cursor_pos[field_index] += 1
-        elif self.mode == "edit_category":
-            cursor_pos = self.edit_category_cursor_pos
-            self.edit_category_input = (
-                self.edit_category_input[:cursor_pos] + 
-                char + 
-                self.edit_category_input[cursor_pos:]
-            )
-            self.edit_category_cursor_pos += 1
-
-    def delete_char_at_cursor(self):
-        if self.mode == "edit_link":
-            field_index = self.edit_input_index
-            cursor_pos = self.edit_input_cursor_pos[field_index]
-            if cursor_pos > 0:
-                self.edit_inputs[field_index] = (
-                    self.edit_inputs[field_index][:cursor_pos-1] + 
-                    self.edit_inputs[field_index][cursor_pos:]
-                )
-                self.edit_input_cursor_pos[field_index] -= 1
-        elif self.mode == "edit_category":
-            cursor_pos = self.edit_category_cursor_pos
-            if cursor_pos > 0:
-                self.edit_category_input = (
-                    self.edit_category_input[:cursor_pos-1] + 
-                    self.edit_category_input[cursor_pos:]
-                )
-                self.edit_category_cursor_pos -= 1
-        
-    def handle_browse_input(self, key):
-        if key == curses.KEY_UP:
-            if self.current_selection == 0:
-                items = self.get_current_items()
-                self.current_selection = len(items)-1
+    def measure_memory(self):
+        start = time.perf_counter()
+        self.memory_size = measure_tree(self.resolve_path(self.path), tuple(self.path))
+        self.memory_lines = report_lines(self.memory_size, MEMORY_TOP)
+        self.show_status(f"🧠 Measured in {time.perf_counter() - start:.2f}s")
+
+    def handle_memory_input(self, key):
+        if key in (27, ord('m'), ord('M'), ord('q'), ord('Q')):
+            self.mode = "browse"
+        elif key in (ord('t'), ord('T')):
+            if self.profiler.active:
+                self.profiler.stop()
+                self.show_status("⏸️ Allocation tracing stopped")
             else:
-                self.current_selection = self.current_selection - 1
-        elif key == curses.KEY_DOWN:
-                items = self.get_current_items()
-                if self.current_selection == len(items)-1:
-                    self.current_selection = 0
-                else:
-                    self.current_selection = self.current_selection + 1
+                self.profiler.start()
+                self.show_status("⏺️ Tracing allocations (slower); use the TUI, then come back here")
+        elif key in (ord('r'), ord('R')):
+            self.measure_memory()
+        elif key in (ord('w'), ord('W')):
+            self.write_memory_report()
+
+    def write_memory_report(self):
+        report = {
+            "time": int(time.time()),
+            "path": "/" + "/".join(self.path),
+            "tree": size_to_dict(self.memory_size),
+            "heaviest": [size_to_dict(size, 0) for size in heaviest(self.memory_size, MEMORY_TOP)],
+            "tracing": self.profiler.active,
+            "profile": self.profiler.report(),
+        }
+        filename = time.strftime("mem-%Y%m%d-%H%M%S.json")
+        try:
+            JsonCodec().write(filename, report)
+            self.show_status(f"💾 Memory report written to {filename}")
+        except OSError as e:
+            self.show_status(f"❌ Could not write report: {e}")
+
+    def handle_browse_input(self, key):
+        if self.search is not None:
+            if key in (27, ord('b'), ord('B')):
+                self.leave_search()
+                return
+            if key in (ord('g'), ord('G')):
+                self.goto_item_category()
+                return
+            if key in SEARCH_VIEW_BLOCKED_KEYS:
+                self.show_status("🔎 Not available in search results (G: go to the link's category)")
+                return
+        if key in NAV_KEYS:
+            self.move_selection(NAV_KEYS[key])
         elif key == ord('\n') or key == curses.KEY_ENTER:
             self.handle_enter()
         elif key == ord('b') or key == ord('B'):
@@ -563,63 +811,91 @@ class ProductLinkManagerTUI:
         elif key == ord('e') or key == ord('E'):
             self.handle_edit()
         elif key == ord('a') or key == ord('A'):
-            self.mode = "adding"
-            self.add_inputs = ["", ""]
-            self.add_input_index = 0
-            try:
-                clipboard_content = pyperclip.paste()
-                if clipboard_content and (clipboard_content.startswith('http://') or clipboard_content.startswith('https://')):
-                    self.add_inputs[0] = clipboard_content.strip()
-                    self.show_status("📋 Auto-pasted URL from clipboard")
-            except:
-                pass
+            self.start_editing("adding", [LineEditor(), LineEditor()])
+            clipboard_content = self.clipboard.get()
+            if clipboard_content and (clipboard_content.startswith('http://') or clipboard_content.startswith('https://')):
+                self.fields[0].set_text(clipboard_content.strip())
+                self.fields[0].end()
+                self.show_status("📋 Auto-pasted URL from clipboard")
         elif key == ord('d') or key == ord('D'):
             self.handle_delete()
         elif key == ord('n') or key == ord('N'):
-            self.mode = "new_category"
-            self.category_input = ""
-            self.category_cursor_pos = 0
+            self.start_editing("new_category", [self.category_field()])
             self.show_status("📁 Enter new category name")
         elif key == ord('o') or key == ord('O'):
-            items = self.get_current_items()
-            for item in items:
-                if item[0] == "link":   # <-- This is the fix!
-                    link_data = item[2]
-                    url = link_data[0] if isinstance(link_data, list) else link_data
-                    try:
-                        webbrowser.open_new_tab(url)
-                        self.show_status(f"🌐 Opened: {url}")
-                    except:
-                        self.show_status(f"❌ Failed to open: {url}")
+            items = list(self.selected.values()) or self.get_current_items()
+            targets = [(item[2], item[3] if len(item) > 3 else None) for item in items if item[0] == "link"]
+            if self.open_links(targets):
+                self.save_data()
+        elif key == ord(' '):
+            self.toggle_selection()
+        elif key == ord('v') or key == ord('V'):
+            self.select_range()
+        elif key == ord('*'):
+            self.select_all()
+        elif key == ord('i') or key == ord('I'):
+            self.invert_selection()
+        elif key == ord('w') or key == ord('W'):
+            self.handle_export()
+        elif key == ord('t') or key == ord('T'):
+            current = self.search[1] if self.search and self.search[0] == "tag" else ""
+            self.start_editing("tag_filter", [LineEditor(current)])
+            self.fields[0].end()
+            known = ", ".join(f"#{tag}" for tag, _ in self.tag_index.tag_counts()[:8])
+            self.show_status(f"🏷️ Tags: {known}" if known else "🏷️ No tags yet")
+        elif key == ord('r') or key == ord('R'):
+            self.enter_search("top", f"{TOP_COUNT} most opened")
+        elif key == ord('m') or key == ord('M'):
+            self.open_memory_view()
+        elif key == ord('z') or key == ord('Z'):
+            self.handle_compress()
+        elif key == ord('$'):
+            self.handle_price_sample()
+        elif key == ord('k') or key == ord('K'):
+            self.handle_archive()
+        elif key == ord('l') or key == ord('L'):
+            self.open_archived()
+        elif key == ord('/'):
+            current = self.search[1] if self.search and self.search[0] == "query" else ""
+            self.start_editing("query_filter", [LineEditor(current)])
+            self.fields[0].end()
+        elif key == 27:
+            if self.selected:
+                self.clear_selection()
+                self.show_status("Selection cleared")
+        elif key == ord('s') or key == ord('S'):
+            self.cycle_sort_mode()
+        elif key == ord('x') or key == ord('X'):
+            self.handle_cut_copy("cut")
+        elif key == ord('c') or key == ord('C'):
+            self.handle_cut_copy("copy")
+        elif key == ord('p') or key == ord('P'):
+            self.handle_paste()
 
         elif key == ord('q') or key == ord('Q'):
             self.running = False
     
     def handle_adding_input(self, key):
         if key == curses.KEY_UP:
-            self.add_input_index = max(0, self.add_input_index - 1)
+            self.field_index = max(0, self.field_index - 1)
         elif key == curses.KEY_DOWN:
-            self.add_input_index = min(1, self.add_input_index + 1)
+            self.field_index = min(1, self.field_index + 1)
         elif key == 27:  
             self.mode = "browse"
             self.show_status("❌ Add cancelled")
-        elif key == 22:  
+        elif key == 22 or key == 16:  
             self.paste_from_clipboard()
         elif key == ord('\t'): 
-            if not self.add_inputs[0].strip():
+            url, desc = self.fields[0].text, self.fields[1].text
+            if not url.strip():
                 self.show_status("❌ URL cannot be empty")
             else:
-                node = self.resolve_path(self.path)
-                links = node.setdefault(LINKS_KEY, [])
-                links.append([self.add_inputs[0], self.add_inputs[1]])
+                self.catalog.add_link(self.path, url, desc)
                 self.save_data()
-                self.show_status(f"✅ Added: {self.add_inputs[0]}")
+                self.show_status(f"✅ Added: {url}")
                 self.mode = "browse"
-        elif key == curses.KEY_BACKSPACE or key == 127 or key == 8:
-            if self.add_inputs[self.add_input_index]:
-                self.add_inputs[self.add_input_index] = self.add_inputs[self.add_input_index][:-1]
-        elif 32 <= key <= 126: 
-            self.add_inputs[self.add_input_index] += chr(key)
+        else:
+            self.fields[self.field_index].handle_key(key)
             
             
     def handle_edit(self):
@@ -631,29 +907,38 @@ class ProductLinkManagerTUI:
         item = items[self.current_selection]
         
         if item[0] == "category":
-            self.mode = "edit_category"
-            self.edit_category_input = item[1]
+            self.start_editing("edit_category", [self.category_field(item[1])])
+            self.fields[0].end()
             self.edit_original_name = item[1]
-            self.edit_category_cursor_pos = len(self.edit_category_input)
             self.show_status(f"✏️ Editing category: {item[1]}")
         else:
-            self.mode = "edit_link"
             link_data = item[2]
-            if isinstance(link_data, list) and len(link_data) == 2:
-                self.edit_inputs[0] = link_data[0]
-                self.edit_inputs[1] = link_data[1]
-            else:
-                self.edit_inputs[0] = link_data
-                self.edit_inputs[1] = ""
-            self.edit_input_index = 0
+            tags_text = " ".join(link_tags(link_data))
+            self.start_editing("edit_link", [LineEditor(link_data[0]), LineEditor(link_data[1]), LineEditor(tags_text)])
+            for field in self.fields:
+                field.end()
+            self.edit_link_ref = link_data
             self.show_status(f"✏️ Editing link: {item[1]}")
     
+    def handle_category_field_key(self, key):
+        field = self.fields[0]
+        if key == 22 or key == 16:
+            self.paste_from_clipboard()
+        elif field.handle_key(key):
+            self.show_rejected(field)
+
+    def show_rejected(self, field):
+        if field.rejected == "invalid":
+            self.show_status("❌ Invalid character (not allowed: < > : \" / \\ | ? *)")
+        elif field.rejected == "full":
+            self.show_status("❌ Maximum length reached (50 characters)")
+    
     def handle_new_category_input(self, key):
         if key == 27:
             self.mode = "browse"
             self.show_status("❌ Category creation cancelled")
         elif key == ord('\n') or key == curses.KEY_ENTER:
-            validated_name, error = self.validate_category_name(self.category_input)
+            validated_name, error = self.validate_category_name(self.fields[0].text)
             if error:
                 self.show_status(f"❌ {error}")
                 return
@@ -663,7 +948,7 @@ class ProductLinkManagerTUI:
                 self.show_status("⚠️ Category already exists")
                 return
             
-            node[validated_name] = {}
+            self.catalog.add_category(self.path, validated_name)
             self.save_data()
             self.show_status(f"✅ Created category: '{validated_name}'")
             self.mode = "browse"
@@ -673,65 +958,60 @@ class ProductLinkManagerTUI:
                 if item[0] == "category" and item[1] == validated_name:
                     self.current_selection = i
                     break
-        elif key == ord('p') or key == ord('P'):
-            self.paste_from_clipboard()
-        elif key == 22:  
-            self.paste_from_clipboard()
-        elif key == curses.KEY_BACKSPACE or key == 127 or key == 8:
-            if self.category_cursor_pos > 0:
-                self.category_input = self.category_input[:self.category_cursor_pos-1] + self.category_input[self.category_cursor_pos:]
-                self.category_cursor_pos -= 1
-        elif key == curses.KEY_LEFT:
-            self.category_cursor_pos = max(0, self.category_cursor_pos - 1)
-        elif key == curses.KEY_RIGHT:
-            self.category_cursor_pos = min(len(self.category_input), self.category_cursor_pos + 1)
-        elif key == curses.KEY_HOME:
-            self.category_cursor_pos = 0
-        elif key == curses.KEY_END:
-            self.category_cursor_pos = len(self.category_input)
-        elif 32 <= key <= 126:
-            if len(self.category_input) < 50:
-                char = chr(key)
-                if not re.search(r'[<>:"/\\|?*]', char):
-                    self.category_input = self.category_input[:self.category_cursor_pos] + char + self.category_input[self.category_cursor_pos:]
-                    self.category_cursor_pos += 1
-                else:
-                    self.show_status("❌ Invalid character (not allowed: < > : \" / \\ | ? *)")
-            else:
-                self.show_status("❌ Maximum length reached (50 characters)")
+        else:
+            self.handle_category_field_key(key)
                 
     def handle_edit_link_input(self, key):
         if key == curses.KEY_UP:
-            self.edit_input_index = max(0, self.edit_input_index - 1)
+            self.field_index = max(0, self.field_index - 1)
         elif key == curses.KEY_DOWN:
-            self.edit_input_index = min(1, self.edit_input_index + 1)
+            self.field_index = min(len(self.fields) - 1, self.field_index + 1)
         elif key == 27:  
             self.mode = "browse"
             self.show_status("❌ Edit cancelled")
-        elif key == 22:  
-            self.paste_from_clipboard_edit()
+        elif key == 22 or key == 16:  
+            self.paste_from_clipboard()
         elif key == ord('\t'):
-            if not self.edit_inputs[0].strip():
+            url, desc = self.fields[0].text, self.fields[1].text
+            if not url.strip():
                 self.show_status("❌ URL cannot be empty")
             else:
                 node = self.resolve_path(self.path)
                 links = node.get(LINKS_KEY, [])
                 
-                num_categories = len([k for k in node if k != LINKS_KEY])
-                link_index = self.current_selection - num_categories
-                
-                if 0 <= link_index < len(links):
-                    links[link_index] = [self.edit_inputs[0], self.edit_inputs[1]]
+                if any(link is self.edit_link_ref for link in links):
+                    link = self.catalog.edit_link(self.path, self.edit_link_ref, url, desc)
+                    tags = {normalize_tag(tag) for tag in self.fields[2].text.replace(",", " ").split()} - {""}
+                    if tags != set(link_tags(link)):
+                        self.catalog.set_tags(self.path, link, tags)
                     self.save_data()
-                    self.show_status(f"✅ Updated link: {self.edit_inputs[0]}")
+                    self.show_status(f"✅ Updated link: {url}")
                     self.mode = "browse"
                 else:
                     self.show_status("❌ Invalid link index")
-        elif key == curses.KEY_BACKSPACE or key == 127 or key == 8:
-            if self.edit_inputs[self.edit_input_index]:
-                self.edit_inputs[self.edit_input_index] = self.edit_inputs[self.edit_input_index][:-1]
-        elif 32 <= key <= 126:
-            self.edit_inputs[self.edit_input_index] += chr(key)
+        else:
+            self.fields[self.field_index].handle_key(key)
+
+    def handle_search_input(self, key):
+        kind = "tag" if self.mode == "tag_filter" else "query"
+        text = self.fields[0].text.strip()
+        if key == 27:
+            self.mode = "browse"
+        elif key == ord('\t') and kind == "query":
+            if text:
+                try:
+                    self.show_status(" | ".join(self.query_engine.explain(text)[:2]))
+                except ValueError as e:
+                    self.show_status(f"❌ {e}")
+        elif key == ord('\n') or key == curses.KEY_ENTER:
+            if text:
+                self.enter_search(kind, text)
+            else:
+                self.mode = "browse"
+                if self.search is not None:
+                    self.leave_search()
+        else:
+            self.fields[0].handle_key(key)
 
     def handle_edit_category_input(self, key):
         if key == 27:
@@ -739,7 +1019,7 @@ class ProductLinkManagerTUI:
             self.show_status("❌ Edit cancelled")
         elif key == ord('\n') or key == curses.KEY_ENTER:
 
-            validated_name, error = self.validate_category_name(self.edit_category_input)
+            validated_name, error = self.validate_category_name(self.fields[0].text)
             if error:
                 self.show_status(f"❌ {error}")
                 return
@@ -755,7 +1035,7 @@ class ProductLinkManagerTUI:
                 return
             
             if self.edit_original_name in node:
-                node[validated_name] = node.pop(self.edit_original_name)
+                self.catalog.rename_category(self.path, self.edit_original_name, validated_name)
                 self.save_data()
                 self.show_status(f"✅ Renamed category: '{self.edit_original_name}' → '{validated_name}'")
                 self.mode = "browse"
@@ -767,60 +1047,8 @@ class ProductLinkManagerTUI:
                         break
             else:
                 self.show_status("❌ Original category not found")
-        elif key == ord('p') or key == ord('P'):
-            self.paste_from_clipboard_edit()
-        elif key == 22:  
-            self.paste_from_clipboard_edit()
-        elif key == curses.KEY_BACKSPACE or key == 127 or key == 8:
-            if self.edit_category_cursor_pos > 0:
-                self.edit_category_input = self.edit_category_input[:self.edit_category_cursor_pos-1] + self.edit_category_input[self.edit_category_cursor_pos:]
-                self.edit_category_cursor_pos -= 1
-        elif key == curses.KEY_LEFT:
-            self.edit_category_cursor_pos = max(0, self.edit_category_cursor_pos - 1)
-        elif key == curses.KEY_RIGHT:
-            self.edit_category_cursor_pos = min(len(self.edit_category_input), self.edit_category_cursor_pos + 1)
-        elif key == curses.KEY_HOME:
-            self.edit_category_cursor_pos = 0
-        elif key == curses.KEY_END:
-            self.edit_category_cursor_pos = len(self.edit_category_input)
-        elif 32 <= key <= 126:
-            if len(self.edit_category_input) < 50:
-                char = chr(key)
-                if not re.search(r'[<>:"/\\|?*]', char):
-                    self.edit_category_input = self.edit_category_input[:self.edit_category_cursor_pos] + char + self.edit_category_input[self.edit_category_cursor_pos:]
-                    self.edit_category_cursor_pos += 1
-                else:
-                    self.show_status("❌ Invalid character (not allowed: < > : \" / \\ | ? *)")
-            else:
-                self.show_status("❌ Maximum length reached (50 characters)")
-
-    def paste_from_clipboard_edit(self):
-        try:
-            paste_text = pyperclip.paste()
-            if paste_text:
-                paste_text = paste_text.strip().replace('\n', ' ').replace('\r', ' ')
-                while '  ' in paste_text:
-                    paste_text = paste_text.replace('  ', ' ')
-                
-                if self.mode == "edit_link":
-                    if self.edit_input_index == 0 and (paste_text.startswith('http://') or paste_text.startswith('https://')):
-                        self.edit_inputs[self.edit_input_index] = paste_text
-                        self.show_status(f"📋 Pasted URL: {paste_text[:50]}{'...' if len(paste_text) > 50 else ''}")
-                    else:
-                        self.edit_inputs[self.edit_input_index] += paste_text
-                        self.show_status(f"📋 Pasted: {paste_text[:30]}{'...' if len(paste_text) > 30 else ''}")
-                elif self.mode == "edit_category":
-                    cleaned_text = re.sub(r'[<>:"/\\|?*]', '', paste_text)
-                    if len(self.edit_category_input + cleaned_text) <= 50:
-                        self.edit_category_input += cleaned_text
-                        self.edit_category_cursor_pos = len(self.edit_category_input)
-                        self.show_status(f"📋 Pasted (cleaned): {cleaned_text[:30]}{'...' if len(cleaned_text) > 30 else ''}")
-                    else:
-                        self.show_status("❌ Paste would exceed character limit")
-            else:
-                self.show_status("📋 Clipboard is empty")
-        except Exception as e:
-            self.show_status(f"❌ Paste failed: {str(e)}")
+        else:
+            self.handle_category_field_key(key)
     
     def handle_enter(self):
         items = self.get_current_items()
@@ -829,107 +1057,460 @@ class ProductLinkManagerTUI:
             if item[0] == "category":
 
                 self.path.append(item[1])
+                self.clear_selection()
                 self.current_selection = 0
                 self.show_status(f"Entered category: {item[1]}")
             else:
-                link_data = item[2]
-                url = link_data[0] if isinstance(link_data, list) else link_data
-                try:
-                    webbrowser.open_new_tab(url)
-                    self.show_status(f"🌐 Opened: {url}")
-                except:
-                    self.show_status(f"❌ Failed to open: {url}")
+                if self.open_link(item[2], item[3] if len(item) > 3 else None):
+                    self.save_data()
     
+    def enter_search(self, kind, text):
+        if kind == "query":
+            try:
+                self.query_engine.prepare(text)
+            except ValueError as e:
+                self.show_status(f"❌ {e}")
+                return
+        self.mode = "browse"
+        self.search = (kind, text)
+        self.clear_selection()
+        self.current_selection = 0
+        count = len(self.get_current_items())
+        if kind == "top":
+            self.show_status(f"⭐ {count} most opened link{'s' if count != 1 else ''}, recent opens count more (Esc/B: leave, G: go to category)")
+            return
+        self.show_status(f"🔎 {count} link{'s' if count != 1 else ''} match '{text}' (Esc/B: leave, G: go to category)")
+    
+    def leave_search(self):
+        self.search = None
+        self.current_selection = 0
+        self.show_status("Left search results")
+    
+    def goto_item_category(self):
+        items = self.get_current_items()
+        if not items or self.current_selection >= len(items) or len(items[self.current_selection]) < 4:
+            return
+        link, path = items[self.current_selection][2], items[self.current_selection][3]
+        self.search = None
+        self.path = list(path)
+        self.current_selection = 0
+        for i, item in enumerate(self.get_current_items()):
+            if item[0] == "link" and item[2] is link:
+                self.current_selection = i
+                break
+        self.show_status(f"📂 {'/'.join(path) or 'root'}")
+    
+    def handle_cut_copy(self, operation):
+        targets = self.selected_items()
+        if not targets:
+            self.show_status("❌ Nothing selected")
+            return
+        self.item_clipboard = (operation, list(self.path), targets)
+        self.clear_selection()
+        verb = "✂️ Cut" if operation == "cut" else "📄 Copied"
+        what = f"'{targets[0][1]}'" if len(targets) == 1 else f"{len(targets)} items"
+        self.show_status(f"{verb} {what} - open a category and press P to paste")
+    
+    def handle_paste(self):
+        if not self.item_clipboard:
+            self.show_status("❌ Nothing to paste (use X to cut or C to copy)")
+            return
+        operation, source, targets = self.item_clipboard
+        if operation == "cut" and source == self.path:
+            self.show_status("⚠️ Items are already here")
+            return
+        
+        source_node = self.resolve_path(source)
+        categories = [item[1] for item in targets if item[0] == "category" and item[1] in source_node]
+        links = [item[2] for item in targets if item[0] == "link"]
+        done = 0
+        errors = []
+        for name in categories:
+            try:
+                if operation == "cut":
+                    self.catalog.move_category(source, name, self.path)
+                else:
+                    self.catalog.copy_category(source, name, self.path)
+                done += 1
+            except ValueError as e:
+                errors.append(str(e))
+        if links:
+            if operation == "cut":
+                done += self.catalog.move_links(source, links, self.path)
+            else:
+                done += self.catalog.copy_links(source, links, self.path)
+        
+        if not done:
+            self.show_status(f"❌ {errors[0] if errors else 'Source items no longer exist'}")
+            return
+        self.save_data()
+        if operation == "cut":
+            self.item_clipboard = None
+        message = f"📦 {'Moved' if operation == 'cut' else 'Copied'} {done} item{'s' if done != 1 else ''} here"
+        if errors:
+            message += f" ({len(errors)} skipped: {errors[0]})"
+        self.show_status(message)
+    
+    def handle_export(self):
+        targets = self.selected_items()
+        if not targets:
+            self.show_status("❌ Nothing to export")
+            return
+        node = self.resolve_path(self.path)
+        export = {}
+        links = [item[2] for item in targets if item[0] == "link"]
+        if links:
+            export[LINKS_KEY] = links
+        for item in targets:
+            if item[0] == "category" and item[1] in node:
+                child = node[item[1]]
+                export[item[1]] = unpack_subtree(child) if is_packed(child) else child
+        filename = time.strftime("export-%Y%m%d-%H%M%S.json")
+        try:
+            JsonCodec().write(filename, export)
+            self.show_status(f"💾 Exported {len(targets)} item{'s' if len(targets) != 1 else ''} to {filename}")
+        except Exception as e:
+            self.show_status(f"❌ Export failed: {str(e)}")
+    
+    def handle_compress(self):
+        items = self.get_current_items()
+        if not items or self.current_selection >= len(items) or items[self.current_selection][0] != "category":
+            self.show_status("❌ Select a category to compress")
+            return
+        name = items[self.current_selection][1]
+        if is_packed(self.resolve_path(self.path).get(name)):
+            self.show_status(f"🗜️ '{name}' is already packed")
+            return
+        before, after = self.archiver.pack(self.path + [name])
+        self.save_data()
+        self.show_status(f"🗜️ Packed '{name}': {format_bytes(before)} → {format_bytes(after)} in memory")
+
     def handle_back(self):
         if self.path:
             category = self.path.pop()
+            self.clear_selection()
             self.current_selection = 0
             self.show_status(f"Left category: {category}")
         else:
             self.show_status("❌ Already at root")
     
     def handle_delete(self):
-        items = self.get_current_items()
-        if not items or self.current_selection >= len(items):
+        targets = self.selected_items()
+        if not targets:
             self.show_status("❌ No item to delete")
             return
 
-        item = items[self.current_selection]
-
-        self.stdscr.clear()
-        if item[0] == "category":
-            confirm_text = f"Delete category '{item[1]}' and all its contents? (y/n)"
+        if len(targets) > 1:
+            categories = sum(1 for item in targets if item[0] == "category")
+            confirm_text = f"Delete {len(targets)} items ({categories} categories with all their contents, {len(targets) - categories} links)? (y/n)"
+        elif targets[0][0] == "category":
+            confirm_text = f"Delete category '{targets[0][1]}' and all its contents? (y/n)"
         else:
-            confirm_text = f"Delete link '{item[1]}'? (y/n)"
-
-        self.safe_addstr(self.height // 2, (self.width - len(confirm_text)) // 2, confirm_text, curses.color_pair(5) | curses.A_BOLD)
-        self.stdscr.refresh()
+            confirm_text = f"Delete link '{targets[0][1]}'? (y/n)"
 
-        self.stdscr.timeout(-1)  
-        key = self.stdscr.getch()
-        self.stdscr.timeout(100)  
+        self.ask_confirm(confirm_text, lambda: self.delete_items(targets))
+    
+    def delete_items(self, targets):
+        node = self.resolve_path(self.path)
+        removed = []
+        for item in targets:
+            if item[0] == "category" and item[1] in node:
+                self.catalog.delete_category(self.path, item[1])
+                removed.append(item)
+        links = [item for item in targets if item[0] == "link"]
+        # Links already gone (e.g. removed meanwhile) are not counted.
+        removed_links = self.catalog.remove_links(self.path, [item[2] for item in links]) if links else 0
+        count = len(removed) + removed_links
         
-        if key == ord('y') or key == ord('Y'):
-            node = self.resolve_path(self.path)
-            if item[0] == "category":
-                if item[1] in node:
-                    del node[item[1]]
-                    self.save_data()
-                    self.show_status(f"🗑️ Deleted category '{item[1]}'")
-                else:
-                    self.show_status("❌ Category not found")
-            else:
-                links = node.get(LINKS_KEY, [])
-                if not links:
-                    self.show_status("❌ No links to delete")
-                    return
-                
-                num_categories = len([k for k in node if k != LINKS_KEY])
-                link_index = self.current_selection - num_categories
-                
-                if 0 <= link_index < len(links):
-                    removed = links.pop(link_index)
-                    self.save_data()
-                    removed_url = removed[0] if isinstance(removed, list) else removed
-                    self.show_status(f"🗑️ Removed: {removed_url}")
-                else:
-                    self.show_status("❌ Invalid link index")
-
-            new_items = self.get_current_items()
-            if self.current_selection >= len(new_items):
-                self.current_selection = max(0, len(new_items) - 1)
+        if not count:
+            self.show_status("❌ Nothing found to delete")
+            return
+        
+        self.save_data()
+        self.clear_selection()
+        self.clamp_selection()
+        missing = f" ({len(links) - removed_links} not found)" if removed_links < len(links) else ""
+        if count == 1 and removed:
+            self.show_status(f"🗑️ Deleted category '{removed[0][1]}'{missing}")
+        elif count == 1 and len(links) == 1:
+            self.show_status(f"🗑️ Removed: {link_url(links[0][2])}")
         else:
-            self.show_status("❌ Delete cancelled")
+            self.show_status(f"🗑️ Deleted {count} item{'s' if count != 1 else ''}{missing}")
             
             
-    def run(self):
-        self.stdscr.timeout(100) 
-        
-        while self.running:
-            self.draw_display()
-          
+    def dispatch_key(self, key):
+        handlers = {
+            "browse": self.handle_browse_input,
+            "adding": self.handle_adding_input,
+            "new_category": self.handle_new_category_input,
+            "edit_link": self.handle_edit_link_input,
+            "edit_category": self.handle_edit_category_input,
+            "confirm": self.handle_confirm_input,
+            "tag_filter": self.handle_search_input,
+            "query_filter": self.handle_search_input,
+            "memory": self.handle_memory_input,
+        }
+        handler = handlers.get(self.mode)
+        if handler:
+            self.profiler.measure(handler.__name__, handler, key)
+
+    def dispatch_batch(self, keys):
+        # Handles every key read since the last frame. A bracketed paste is
+        # one insert, a run of typed characters in a text field one insert
+        # and a run of ↑/↓ in the item list one jump; other keys go to
+        # dispatch_key one by one, so the mode is checked again after each.
+        keys = self.paste_prefix + list(keys)
+        self.paste_prefix = []
+        i = 0
+        while i < len(keys):
+            if self.paste_keys is not None:
+                i = self.collect_paste(keys, i)
+                continue
+            key = keys[i]
+            if key == 27 and tuple(keys[i:i + len(PASTE_START)]) == PASTE_START:
+                self.paste_keys = []
+                i += len(PASTE_START)
+            elif key == 27 and 1 < len(keys) - i < len(PASTE_START) and tuple(keys[i:]) == PASTE_START[:len(keys) - i]:
+                # A lone Esc is never held back, only ESC [ and more.
+                self.paste_prefix = keys[i:]
+                break
+            elif self.mode == "browse" and key in NAV_KEYS:
+                delta = 0
+                while i < len(keys) and keys[i] in NAV_KEYS:
+                    delta += NAV_KEYS[keys[i]]
+                    i += 1
+                self.profiler.measure("move_selection", self.move_selection, delta)
+            elif self.mode in TEXT_MODES and 32 <= key <= 126:
+                end = i + 1
+                while end < len(keys) and 32 <= keys[end] <= 126:
+                    end += 1
+                self.profiler.measure("insert_text", self.insert_text, "".join(map(chr, keys[i:end])))
+                i = end
+            else:
+                self.dispatch_key(key)
+                i += 1
+        self.archiver.touch(self.path)
+
+    def collect_paste(self, keys, i):
+        # Adds keys[i:] to the paste up to its end marker, which may only
+        # come in a later batch (or be split between two). Returns where to
+        # carry on.
+        base = len(self.paste_keys)
+        j = max(0, base - len(PASTE_END) + 1)
+        self.paste_keys.extend(keys[i:])
+        while True:
             try:
-                key = self.stdscr.getch()
-                if key != -1:  
-                    if self.mode == "browse":
-                        self.handle_browse_input(key)
-                    elif self.mode == "adding":
-                        self.handle_adding_input(key)
-                    elif self.mode == "new_category":
-                        self.handle_new_category_input(key)
-                    elif self.mode == "edit_link":
-                        self.handle_edit_link_input(key)
-                    elif self.mode == "edit_category":
-                        self.handle_edit_category_input(key)
-            except:
-                pass
-            
-          
-            time.sleep(0.01)
+                j = self.paste_keys.index(27, j)
+            except ValueError:
+                return len(keys)
+            if tuple(self.paste_keys[j:j + len(PASTE_END)]) == PASTE_END:
+                break
+            j += 1
+        # getch() hands over UTF-8 text a byte at a time.
+        text = bytes(key for key in self.paste_keys[:j] if key < 256).decode("utf-8", "replace")
+        self.paste_keys = None
+        self.profiler.measure("paste_text", self.paste_text, text)
+        return i + j + len(PASTE_END) - base
+
+    def move_selection(self, delta):
+        items = self.get_current_items()
+        if items:
+            self.current_selection = (self.current_selection + delta) % len(items)
+
+    def insert_text(self, text):
+        field = self.fields[self.field_index]
+        if not field.insert(text):
+            self.show_rejected(field)
+
+    def paste_text(self, text):
+        # Line breaks and runs of spaces collapse, as with Ctrl+V.
+        text = " ".join(text.split())
+        if not text:
+            return
+        if self.mode in TEXT_MODES:
+            self.insert_text(text)
+            self.show_status(f"📋 Pasted {len(text)} characters")
+        elif self.mode == "browse" and self.search is None and text.startswith(("http://", "https://")):
+            # A URL pasted into the list starts adding it.
+            self.start_editing("adding", [LineEditor(text), LineEditor()])
+            self.fields[0].end()
+            self.show_status("📋 Pasted URL, now add a description")
+        else:
+            self.show_status("📋 Nothing to paste into here")
+
+    def handle_price_sample(self):
+        # Checks the prices of the marked links, or of every link in the
+        # current category and below.
+        if self.selected:
+            urls = [link_url(item[2]) for item in self.selected.values() if item[0] == "link"]
+        elif self.search is not None:
+            urls = [link_url(item[2]) for item in self.get_current_items() if item[0] == "link"]
+        else:
+            urls = link_urls(self.resolve_path(self.path))
+        if not urls:
+            self.show_status("📭 No links to check")
+        elif self.price_job is not None:
+            self.show_status("💲 Still checking prices")
+        else:
+            self.sample_prices(urls)
+
+    def sample_prices(self, urls, label="💲 Checking prices"):
+        job = BackgroundJob(label, len(urls))
+
+        def check():
+            def progress():
+                job.done += 1
+            return sample_prices(urls, progress=progress)
+
+        def finished(result, error):
+            self.price_job = None
+            if error:
+                self.show_status(f"❌ Checking prices failed: {error}")
+                return
+            samples, failed = result
+            try:
+                self.prices.record(samples)
+            except OSError as e:
+                self.show_status(f"❌ Saving prices failed: {e}")
+                return
+            found = sum(1 for sample in samples if sample[2] is not None)
+            failures = f", {len(failed)} failed" if failed else ""
+            self.show_status(f"💲 Found a price on {found} of {len(urls)} pages{failures}")
+
+        self.price_job = self.run_background(job, check, done=finished)
+
+    def handle_archive(self):
+        # Keeps offline copies of the marked links' pages, or of every link
+        # in the current category and below (see page_archive.py).
+        if self.selected:
+            urls = [link_url(item[2]) for item in self.selected.values() if item[0] == "link"]
+        elif self.search is not None:
+            urls = [link_url(item[2]) for item in self.get_current_items() if item[0] == "link"]
+        else:
+            urls = link_urls(self.resolve_path(self.path))
+        if not urls:
+            self.show_status("📭 No links to archive")
+            return
+        if self.archive_job is not None:
+            self.show_status("📥 Still archiving")
+            return
+        job = BackgroundJob("📥 Archiving", len(urls))
+
+        def fetch():
+            def progress():
+                job.done += 1
+            return self.pages.archive(urls, progress=progress)
+
+        def finished(result, error):
+            self.archive_job = None
+            if error:
+                self.show_status(f"❌ Archiving failed: {error}")
+                return
+            failures = f", {len(result['failed'])} failed" if result["failed"] else ""
+            self.show_status(f"📥 Archived {result['new']} new, {result['unchanged'] + result['same']} unchanged{failures}")
+
+        self.archive_job = self.run_background(job, fetch, done=finished)
+
+    def open_archived(self):
+        items = self.get_current_items()
+        if not items or self.current_selection >= len(items) or items[self.current_selection][0] != "link":
+            self.show_status("🗂️ Select a link to open its offline copy")
+            return
+        versions = self.pages.versions(link_url(items[self.current_selection][2]))
+        if not versions:
+            self.show_status("📭 No offline copy yet (K keeps one)")
+            return
+        try:
+            url = self.pages.view(versions[-1])
+        except OSError as e:
+            self.show_status(f"❌ Offline copy unreadable: {e}")
+            return
+        try:
+            webbrowser.open_new_tab(url)
+        except Exception:
+            self.show_status("❌ Failed to open the offline copy")
+            return
+        self.show_status(f"🗂️ Opened the copy from {format_time(versions[-1]['time'])}")
+
+    def refresh_prices(self):
+        # Resamples the tracked links every SAMPLE_EVERY (see prices.py).
+        if self.price_job is None and self.prices.due():
+            self.sample_prices(list(self.prices.urls), "💲 Refreshing prices")
+
+    def sweep_cold(self):
+        # Packs categories left idle (see cold.py) while nothing else runs.
+        if self.mode != "browse" or self.save_job is not None or not self.archiver.due():
+            return
+        packed = self.archiver.sweep(self.path)
+        if packed:
+            self.save_data()
+            self.show_status(f"🗜️ Packed {len(packed)} idle categor{'y' if len(packed) == 1 else 'ies'}")
+
+    def read_keys(self):
+        # Called by the event loop whenever stdin is readable; curses may
+        # already hold several keys (escape sequences, pastes), so drain it.
+        while True:
+            key = self.stdscr.getch()
+            if key == -1:
+                break
+            self.key_queue.put_nowait(key)
+
+    async def run_async(self):
+        loop = asyncio.get_running_loop()
+        self.key_queue = asyncio.Queue()
+        self.stdscr.nodelay(True)
+        loop.add_reader(sys.stdin.fileno(), self.read_keys)
+        self.set_bracketed_paste(True)
+        try:
+            while self.running:
+                self.profiler.measure("frame", self.draw_display)
+                if self.recorder:
+                    self.recorder.end()
+                try:
+                    # Wake up now and then even without input so progress
+                    # and expiring status messages get redrawn.
+                    key = await asyncio.wait_for(self.key_queue.get(), REDRAW_INTERVAL)
+                except asyncio.TimeoutError:
+                    self.sweep_cold()
+                    self.refresh_prices()
+                    continue
+                # Whatever else arrived meanwhile (held keys, fast typing,
+                # pastes) is handled before the next frame.
+                batch = [key]
+                while not self.key_queue.empty():
+                    batch.append(self.key_queue.get_nowait())
+                if self.recorder:
+                    self.recorder.keys(batch)
+                try:
+                    self.dispatch_batch(batch)
+                except:
+                    pass
+            # Let a running save finish (and any save it queued) before exit.
+            while self.save_job is not None:
+                self.draw_display()
+                await asyncio.sleep(0.05)
+        finally:
+            self.set_bracketed_paste(False)
+            loop.remove_reader(sys.stdin.fileno())
+
+    def set_bracketed_paste(self, enabled):
+        try:
+            sys.stdout.write("\x1b[?2004h" if enabled else "\x1b[?2004l")
+            sys.stdout.flush()
+        except OSError:
+            pass
+
+    def run(self):
+        try:
+            asyncio.run(self.run_async())
+        finally:
+            self.clipboard.stop()
+            if self.recorder:
+                self.recorder.close()
 
 def main():
     def run_app(stdscr):
-        app = ProductLinkManagerTUI(stdscr)
+        app = ProductLinkManagerTUI(stdscr, record_arg(sys.argv[1:]))
         app.run()
     
     try:
@@ -0,0 +1,202 @@
+import heapq
+import json
+import math
+import os
+import time
+
+from catalog import LINKS_KEY, link_url
+
+HALF_LIFE = 14 * 86400
+
+
+def _log2_add(a, b):
+    # log2(2**a + 2**b); the keys are far too large to exponentiate.
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def _under(path, prefix):
+    return path is not None and path[:len(prefix)] == prefix
+
+
+class FrecencyStore:
+    # Ranks links by how often and how recently they were opened: every
+    # open adds 1 to a link's score and scores halve every HALF_LIFE.
+    # Instead of the score, each url keeps log2(sum of 2**(t / HALF_LIFE))
+    # over its opens. That key does not change as time passes, so the
+    # ranking only changes when something is opened, and a heap of
+    # (-key, url) yields the top k in O(k log n). Outdated heap entries are
+    # skipped when they surface.
+
+    def __init__(self, catalog, filename):
+        self.catalog = catalog
+        self.filename = filename
+        # url -> [key, opens, last opened, path of the category or None
+        # while the link is not in the catalog]
+        self.entries = {}
+        self.heap = []
+        # category path -> {url: link object}, so top() does not scan
+        # categories again; kept up to date from the catalog events.
+        self.links = {}
+        self.dirty = False
+        self._load()
+        catalog.subscribe(self)
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, encoding="utf-8") as f:
+            state = json.load(f)
+        for url, key, opens, last, path in state["links"]:
+            self.entries[url] = [key, opens, last, tuple(path.split("/")) if path else ()]
+        self.heap = [(-entry[0], url) for url, entry in self.entries.items()]
+        heapq.heapify(self.heap)
+
+    def save(self):
+        # One row per url; links no longer in the catalog are dropped.
+        if not self.dirty:
+            return
+        rows = [[url, round(key, 6), opens, last, "/".join(path)]
+                for url, (key, opens, last, path) in self.entries.items() if path is not None]
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"half_life": HALF_LIFE, "links": rows}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.filename)
+        self.dirty = False
+
+    def record(self, url, path, when=None):
+        when = time.time() if when is None else when
+        point = when / HALF_LIFE
+        entry = self.entries.get(url)
+        if entry is None:
+            entry = self.entries[url] = [point, 1, int(when), tuple(path)]
+        else:
+            entry[0] = _log2_add(entry[0], point)
+            entry[1] += 1
+            entry[2] = int(when)
+            entry[3] = tuple(path)
+        heapq.heappush(self.heap, (-entry[0], url))
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(-entry[0], url) for url, entry in self.entries.items()]
+            heapq.heapify(self.heap)
+        self.dirty = True
+
+    def score(self, url, now=None):
+        entry = self.entries.get(url)
+        if entry is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return 2 ** (entry[0] - now / HALF_LIFE)
+
+    def _find(self, path, url):
+        link = self.links.get(path, {}).get(url)
+        if link is not None and link_url(link) == url:
+            return link
+        if not self.catalog.has_category(path):
+            return None
+        for link in self.catalog.node(path).get(LINKS_KEY, []):
+            if link_url(link) == url:
+                self.links.setdefault(path, {})[url] = link
+                return link
+        return None
+
+    def _forget(self, path, links):
+        cached = self.links.get(path)
+        if cached:
+            for link in links:
+                if cached.get(link_url(link)) is link:
+                    del cached[link_url(link)]
+
+    def _forget_below(self, prefix):
+        for path in [path for path in self.links if _under(path, prefix)]:
+            del self.links[path]
+
+    def top(self, k):
+        # [(path, link, score)] for the k highest scores, best first.
+        now = time.time()
+        result = []
+        popped = {}
+        while self.heap and len(result) < k:
+            item = heapq.heappop(self.heap)
+            entry = self.entries.get(item[1])
+            if entry is None or -item[0] != entry[0] or entry[3] is None or item[1] in popped:
+                # Outdated, the link left the catalog (re-pushed if it comes
+                # back), or a second copy pushed when it did.
+                continue
+            popped[item[1]] = item
+            link = self._find(entry[3], item[1])
+            if link is not None:
+                result.append((entry[3], link, 2 ** (entry[0] - now / HALF_LIFE)))
+        for item in popped.values():
+            heapq.heappush(self.heap, item)
+        return result
+
+    def _detach(self, path, urls):
+        for url in urls:
+            entry = self.entries.get(url)
+            if entry is not None and entry[3] == path:
+                entry[3] = None
+                self.dirty = True
+
+    def _repath(self, old, new):
+        for entry in self.entries.values():
+            if _under(entry[3], old):
+                entry[3] = new + entry[3][len(old):]
+                self.dirty = True
+        for path in [path for path in self.links if _under(path, old)]:
+            self.links[new + path[len(old):]] = self.links.pop(path)
+
+    def catalog_changed(self, event, path, info):
+        if event == "link_opened":
+            self.record(link_url(info["link"]), path)
+            self.links.setdefault(path, {})[link_url(info["link"])] = info["link"]
+        elif event == "link_edited":
+            old, new = link_url(info["before"]), link_url(info["link"])
+            entry = self.entries.get(old)
+            if old != new and entry is not None and entry[3] == path and new not in self.entries:
+                self.entries[new] = self.entries.pop(old)
+                heapq.heappush(self.heap, (-entry[0], new))
+                self.dirty = True
+            cached = self.links.get(path)
+            if old != new and cached and cached.get(old) is info["link"]:
+                cached[new] = cached.pop(old)
+        elif event == "link_removed":
+            self._detach(path, [link_url(info["link"])])
+            self._forget(path, [info["link"]])
+        elif event == "links_removed":
+            self._detach(path, [link_url(link) for link in info["links"]])
+            self._forget(path, info["links"])
+        elif event == "links_added":
+            # A move is a removal followed by an add: pick the entry back up.
+            for link in info["links"]:
+                entry = self.entries.get(link_url(link))
+                if entry is not None and entry[3] is None:
+                    entry[3] = path
+                    heapq.heappush(self.heap, (-entry[0], link_url(link)))
+                    self.links.setdefault(path, {})[link_url(link)] = link
+                    self.dirty = True
+        elif event == "node_replaced":
+            # Copy-on-write cloned the links of this one category.
+            cached = self.links.get(path)
+            if cached:
+                for link in reversed(self.catalog.node(path).get(LINKS_KEY, [])):
+                    if link_url(link) in cached:
+                        cached[link_url(link)] = link
+        elif event == "category_deleted":
+            prefix = path + (info["name"],)
+            for entry in self.entries.values():
+                if _under(entry[3], prefix):
+                    entry[3] = None
+                    self.dirty = True
+            self._forget_below(prefix)
+        elif event in ("category_replaced", "category_swapped"):
+            # New link objects below, or (packed) none in the catalog.
+            self._forget_below(path + (info["name"],))
+        elif event == "category_renamed":
+            self._repath(path + (info["name"],), path + (info["new_name"],))
+        elif event == "category_moved":
+            self._repath(path + (info["name"],), info["dest"] + (info["new_name"],))
+
+
+def frecency_file(json_file):
+    return os.path.splitext(json_file)[0] + ".frecency"
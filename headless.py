@@ -0,0 +1,154 @@
+import curses
+import importlib.util
+import os
+import tempfile
+import time
+import tracemalloc
+
+TUI_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "curses-tui.py")
+
+BOX_CHARS = ("ACS_ULCORNER", "ACS_URCORNER", "ACS_LLCORNER", "ACS_LRCORNER", "ACS_HLINE", "ACS_VLINE")
+
+
+class FakeScreen:
+    # Stands in for curses' stdscr: writes land in a character grid, and
+    # `cells` counts how many characters were written since it was reset.
+
+    def __init__(self, height=40, width=120, keys=()):
+        self.height = height
+        self.width = width
+        self.keys = list(keys)
+        self.rows = [[" "] * width for _ in range(height)]
+        self.cells = 0
+        self.calls = 0
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addstr(self, y, x, text, attr=0):
+        self.calls += 1
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("addstr outside the screen")
+        row = self.rows[y]
+        end = min(self.width, x + len(text))
+        row[x:end] = text[:end - x]
+        self.cells += len(text)
+
+    def addch(self, y, x, ch, attr=0):
+        self.addstr(y, x, ch if isinstance(ch, str) else chr(ch), attr)
+
+    def clear(self):
+        self.rows = [[" "] * self.width for _ in range(self.height)]
+
+    erase = clear
+
+    def refresh(self):
+        pass
+
+    def timeout(self, delay):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def keypad(self, flag):
+        pass
+
+    def getch(self):
+        return self.keys.pop(0) if self.keys else -1
+
+    def text(self):
+        return "\n".join("".join(row).rstrip() for row in self.rows)
+
+
+def install_fake_curses():
+    # The colour and line-drawing parts of curses only work after initscr(),
+    # which needs a real terminal.
+    for name in ("curs_set", "start_color", "use_default_colors", "init_pair"):
+        setattr(curses, name, lambda *args: None)
+    curses.color_pair = lambda number: number << 8
+    for name in BOX_CHARS:
+        if not hasattr(curses, name):
+            setattr(curses, name, ord("+"))
+
+
+def load_tui():
+    install_fake_curses()
+    spec = importlib.util.spec_from_file_location("curses_tui", TUI_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def headless_class(tui, data, saving=False):
+    # The app class make_app uses, working on `data` in memory. Unless
+    # `saving`, nothing is written to its json_file and no snapshots are
+    # taken.
+    class HeadlessTUI(tui.ProductLinkManagerTUI):
+        def load_data(self):
+            return data
+
+    if saving:
+        return HeadlessTUI
+
+    class InMemoryTUI(HeadlessTUI):
+        def save_data(self):
+            pass
+
+        def take_snapshot(self):
+            pass
+
+    return InMemoryTUI
+
+
+def make_app(tui, data, screen, json_file=None, cls=None):
+    # The app working on `data` in memory (an instance of `cls`, by default
+    # headless_class(tui, data)): nothing is read from products.json. The
+    # files kept next to the catalog (history, prices, archived pages) are
+    # derived from `json_file`, by default one in a scratch directory that
+    # lives as long as the app, so the real ones in the working directory
+    # stay untouched.
+    scratch = None
+    if json_file is None:
+        scratch = tempfile.TemporaryDirectory(prefix="headless-")
+        json_file = os.path.join(scratch.name, "products.json")
+    app = (cls or headless_class(tui, data))(screen, json_file=json_file)
+    app.scratch = scratch
+    return app
+
+
+def keys(*parts):
+    # keys("a", "https://x", 9, curses.KEY_DOWN) -> list of key codes.
+    result = []
+    for part in parts:
+        if isinstance(part, str):
+            result.extend(ord(ch) for ch in part)
+        else:
+            result.append(part)
+    return result
+
+
+def replay(app, key_codes, trace_memory=False, batch_size=1):
+    # Mirrors run(): draw a frame, then hand the keys read since to
+    # dispatch_batch, `batch_size` at a time (1 = a key per frame, as when
+    # typing slowly). Returns one (mode, seconds, cells, peak_bytes) per
+    # frame; peak_bytes is None unless tracemalloc was asked for.
+    screen = app.stdscr
+    frames = []
+    pending = list(key_codes)
+    while app.running:
+        mode = app.mode
+        screen.cells = 0
+        if trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        app.profiler.measure("frame", app.draw_display)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - base if trace_memory else None
+        frames.append((mode, elapsed, screen.cells, peak))
+        if not pending:
+            break
+        app.dispatch_batch(pending[:batch_size])
+        del pending[:batch_size]
+    return frames
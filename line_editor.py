@@ -0,0 +1,240 @@
+import re
+
+import curses
+
+# Ctrl+Left / Ctrl+Right are not predefined by curses; these are the codes
+# ncurses assigns to kLFT5 / kRIT5 on xterm-compatible terminals.
+CTRL_LEFT = 545
+CTRL_RIGHT = 560
+
+
+class GapBuffer:
+    # Characters live in one list with a hole (the gap) at the cursor, so
+    # inserting or deleting at the cursor only touches the gap edges.
+
+    def __init__(self, text="", capacity=16):
+        size = max(capacity, len(text) * 2, 1)
+        self.buf = list(text) + [""] * (size - len(text))
+        self.gap_start = len(text)
+        self.gap_end = size
+
+    def __len__(self):
+        return len(self.buf) - (self.gap_end - self.gap_start)
+
+    @property
+    def cursor(self):
+        return self.gap_start
+
+    def _grow(self, needed):
+        size = len(self.buf)
+        new_size = max(size * 2, len(self) + needed + 16)
+        extra = new_size - size
+        self.buf[self.gap_end:self.gap_end] = [""] * extra
+        self.gap_end += extra
+
+    def move_to(self, pos):
+        pos = max(0, min(len(self), pos))
+        if pos < self.gap_start:
+            count = self.gap_start - pos
+            self.buf[self.gap_end - count:self.gap_end] = self.buf[pos:self.gap_start]
+            self.gap_start = pos
+            self.gap_end -= count
+        elif pos > self.gap_start:
+            count = pos - self.gap_start
+            self.buf[self.gap_start:self.gap_start + count] = self.buf[self.gap_end:self.gap_end + count]
+            self.gap_start += count
+            self.gap_end += count
+
+    def insert(self, text):
+        if self.gap_end - self.gap_start < len(text):
+            self._grow(len(text))
+        self.buf[self.gap_start:self.gap_start + len(text)] = text
+        self.gap_start += len(text)
+
+    def delete_before(self, count=1):
+        count = min(count, self.gap_start)
+        self.gap_start -= count
+        return count
+
+    def delete_after(self, count=1):
+        count = min(count, len(self.buf) - self.gap_end)
+        self.gap_end += count
+        return count
+
+    def char_at(self, index):
+        if index < self.gap_start:
+            return self.buf[index]
+        return self.buf[index + self.gap_end - self.gap_start]
+
+    def slice(self, start, end):
+        start = max(0, start)
+        end = min(len(self), end)
+        if end <= start:
+            return ""
+        if end <= self.gap_start:
+            return "".join(self.buf[start:end])
+        gap = self.gap_end - self.gap_start
+        if start >= self.gap_start:
+            return "".join(self.buf[start + gap:end + gap])
+        return "".join(self.buf[start:self.gap_start]) + "".join(self.buf[self.gap_end:end + gap])
+
+    def text(self):
+        return "".join(self.buf[:self.gap_start]) + "".join(self.buf[self.gap_end:])
+
+
+class LineEditor:
+    # A single-line text field shared by every TUI input mode.
+
+    def __init__(self, text="", max_length=None, invalid_chars=None):
+        self.max_length = max_length
+        self.invalid_chars = re.compile(invalid_chars) if invalid_chars else None
+        self.rejected = None
+        self.version = 0
+        self.set_text(text)
+
+    def set_text(self, text):
+        if self.invalid_chars:
+            text = self.invalid_chars.sub("", text)
+        if self.max_length is not None:
+            text = text[:self.max_length]
+        self.buffer = GapBuffer(text)
+        self.scroll = 0
+        self.version += 1
+        self._text = text
+        self._view_key = None
+        self._view = None
+
+    def _changed(self):
+        self.version += 1
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.buffer.text()
+        return self._text
+
+    @property
+    def cursor(self):
+        return self.buffer.cursor
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def insert(self, text):
+        # Returns False (and sets self.rejected) if any of the text was
+        # dropped because of the character filter or the length limit.
+        self.rejected = None
+        if self.invalid_chars:
+            cleaned = self.invalid_chars.sub("", text)
+            if cleaned != text:
+                self.rejected = "invalid"
+            text = cleaned
+        if self.max_length is not None:
+            room = self.max_length - len(self.buffer)
+            if len(text) > room:
+                self.rejected = "full"
+                text = text[:max(0, room)]
+        if text:
+            self.buffer.insert(text)
+            self._changed()
+        return self.rejected is None
+
+    def backspace(self):
+        if self.buffer.delete_before():
+            self._changed()
+
+    def delete(self):
+        if self.buffer.delete_after():
+            self._changed()
+
+    def move_to(self, pos):
+        self.buffer.move_to(pos)
+
+    def left(self):
+        self.move_to(self.cursor - 1)
+
+    def right(self):
+        self.move_to(self.cursor + 1)
+
+    def home(self):
+        self.move_to(0)
+
+    def end(self):
+        self.move_to(len(self.buffer))
+
+    def _is_word(self, index):
+        return self.buffer.char_at(index).isalnum()
+
+    def word_left(self):
+        pos = self.cursor
+        while pos > 0 and not self._is_word(pos - 1):
+            pos -= 1
+        while pos > 0 and self._is_word(pos - 1):
+            pos -= 1
+        self.move_to(pos)
+
+    def word_right(self):
+        pos = self.cursor
+        size = len(self.buffer)
+        while pos < size and not self._is_word(pos):
+            pos += 1
+        while pos < size and self._is_word(pos):
+            pos += 1
+        self.move_to(pos)
+
+    def delete_word(self):
+        end = self.cursor
+        self.word_left()
+        if self.buffer.delete_after(end - self.cursor):
+            self._changed()
+
+    def handle_key(self, key):
+        # Editing keys common to all modes; returns True if the key was used.
+        self.rejected = None
+        if key == curses.KEY_LEFT:
+            self.left()
+        elif key == curses.KEY_RIGHT:
+            self.right()
+        elif key in (curses.KEY_HOME, 1):
+            self.home()
+        elif key in (curses.KEY_END, 5):
+            self.end()
+        elif key in (curses.KEY_SLEFT, CTRL_LEFT):
+            self.word_left()
+        elif key in (curses.KEY_SRIGHT, CTRL_RIGHT):
+            self.word_right()
+        elif key in (curses.KEY_BACKSPACE, 127, 8):
+            self.backspace()
+        elif key == curses.KEY_DC:
+            self.delete()
+        elif key == 23:
+            self.delete_word()
+        elif 32 <= key <= 126:
+            self.insert(chr(key))
+        else:
+            return False
+        return True
+
+    def view(self, width):
+        # Returns (visible_text, cursor_column, more_left, more_right) for a
+        # window `width` characters wide. The scroll offset only moves when
+        # the cursor leaves the window, and the result is cached until the
+        # text, cursor or width changes.
+        width = max(1, width)
+        cursor = self.cursor
+        key = (self.version, cursor, width)
+        if key == self._view_key:
+            return self._view
+
+        if cursor < self.scroll:
+            self.scroll = cursor
+        elif cursor >= self.scroll + width:
+            self.scroll = cursor - width + 1
+        self.scroll = max(0, min(self.scroll, max(0, len(self.buffer) - width + 1)))
+
+        visible = self.buffer.slice(self.scroll, self.scroll + width)
+        self._view = (visible, cursor - self.scroll, self.scroll > 0, self.scroll + width < len(self.buffer))
+        self._view_key = key
+        return self._view
+
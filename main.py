@@ -1,62 +1,215 @@
 import json
 import webbrowser
 import os
+import sys
+import time
+
+try:
+    import readline
+except ImportError:
+    readline = None
+
+from catalog import RESERVED_NAMES, Catalog, iter_links, link_display, link_url, link_urls
+from sort_index import SORT_LABELS, SORT_MODES, SortIndex
+from pager import default_page_size, parse_list_args, stream_listing
+from tags import TagIndex, link_tags, normalize_tag
+from subtree_stats import NodeStats, SubtreeStats, format_modified, format_stats, iter_tree
+from snapshots import SnapshotStore, snapshot_dir
+from query import QueryEngine
+from codec import MODES, JsonCodec, load_file
+from frecency import FrecencyStore, frecency_file
+from completion import Completer, PathIndex
+from memory import format_bytes, heaviest, measure_tree, report_lines, size_to_dict
+from cold import Archiver
+from publish import SiteBuilder, site_dir
+from recording import Recorder, record_arg
+from page_archive import PageArchive, archive_dir, format_time
+from prices import PriceHistory, format_price, prices_file, sample_prices
+from sync import advance_base, compute_delta, describe_op, empty_tree, load_base, merge_delta, read_delta, save_base, write_delta
 
 JSON_FILE = "products.json"
-LINKS_KEY = "_links"
-
-def show_current_view(node):
-    subcategories = [k for k in node if k != LINKS_KEY]
-    links = node.get(LINKS_KEY, [])
-
-    if subcategories:
-        print("📂 Subcategories:")
-        for i, sub in enumerate(subcategories, 1):
-            print(f"  [{i}] {sub}")
-
-    if links:
-        print("🔗 Links:")
-        for i, item in enumerate(links, len(subcategories) + 1):
-            if isinstance(item, list) and len(item) == 2:
-                url, desc = item
-            else:
-                url, desc = item, ""
-
-            display_text = desc if desc.strip() else url
-            print(f"  [{i}] {display_text}")
 
+def iter_view_entries(subcategories, links, stats, predicate=None, start=0):
+    # Lazily yields (heading, line) for the numbered listing. Without a
+    # filter, `start` entries are skipped by slicing instead of formatting.
+    if predicate is None and start:
+        skip_subs = min(start, len(subcategories))
+        first_link = start - skip_subs
+    else:
+        skip_subs = first_link = 0
+
+    for i in range(skip_subs, len(subcategories)):
+        sub = subcategories[i]
+        if predicate is None or predicate(sub):
+            yield "📂 Subcategories:", f"  [{i + 1}] {sub}  ({format_stats(stats.children.get(sub) or NodeStats())})"
+
+    number = len(subcategories) + first_link
+    for item in (links[first_link:] if first_link else links):
+        number += 1
+        text = link_display(item)
+        if predicate is None or predicate(text) or predicate(link_url(item)):
+            yield "🔗 Links:", f"  [{number}] {text}"
+
+
+def show_current_view(subcategories, links, stats, args=()):
+    options = parse_list_args(args)
     if not subcategories and not links:
         print("📭 Empty category")
+        return
+
+    predicate = None
+    if options["filter"]:
+        needle = options["filter"].casefold()
+        predicate = lambda text: needle in text.casefold()
+
+    page_size = options["page"]
+    if page_size is None:
+        page_size = default_page_size() if sys.stdin.isatty() and sys.stdout.isatty() else 0
 
+    offset = options["offset"]
+    entries = iter_view_entries(subcategories, links, stats, predicate, offset)
+    if predicate is None:
+        offset = 0
+    shown = stream_listing(entries, page_size=page_size, offset=offset, limit=options["limit"])
+    if not shown:
+        print("🔍 No matching items")
+
+
+def show_tree(stats, name, max_depth=None):
+    print(f"🌳 {name}: {format_stats(stats)}, last modified {format_modified(stats)}")
+    for depth, child_name, child in iter_tree(stats, max_depth):
+        print(f"{'  ' * (depth + 1)}📁 {child_name}  ({format_stats(child)}, {format_modified(child)})")
 
 
 def load_data():
     if not os.path.exists(JSON_FILE):
-        return {}
-    with open(JSON_FILE) as f:
-        return json.load(f)
+        return {}, JsonCodec()
+    return load_file(JSON_FILE)
+
+def save_data(data, codec):
+    codec.write(JSON_FILE, data)
+
+def join_path(path, target):
+    # "/a/b" is absolute, anything else is relative to `path`; ".." goes up.
+    result = [] if target.startswith("/") else list(path)
+    for part in target.split("/"):
+        if part in ("", "."):
+            continue
+        if part == "..":
+            if result:
+                result.pop()
+            continue
+        result.append(part)
+    return result
+
+
+def resolve_target(catalog, path, target):
+    result = join_path(path, target)
+    return result if catalog.has_category(result) else None
+
+
+def show_versions(snapshots, count):
+    versions = snapshots.versions[-count:]
+    if not versions:
+        print("🗄️ No versions yet.")
+        return
+    for version in reversed(versions):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(version["time"]))
+        links = f"  {version['links']} links" if "links" in version else ""
+        print(f"  #{version['id']:<5} {when}  {version['root'][:10]}  +{version['objects']} objects{links}")
+
+
+def show_recent(frecency, count):
+    top = frecency.top(count)
+    if not top:
+        print("⭐ Nothing opened yet.")
+        return
+    for i, (link_path, link, score) in enumerate(top, 1):
+        opens = frecency.entries[link_url(link)][1]
+        print(f"  [{i}] {score:6.2f}  {'/'.join(link_path) or 'root'}: {link_display(link)}  ({opens}× opened)")
+        print(f"       {link_url(link)}")
+
+
+def show_diff(snapshots, old, new):
+    changes = 0
+    for change, change_path, url in snapshots.diff(old, new):
+        where = '/'.join(change_path) or 'root'
+        if url is None:
+            print(f"  {change} 📂 {where}")
+        else:
+            print(f"  {change} 🔗 {where}: {url}")
+        changes += 1
+    if not changes:
+        print("✅ No differences")
 
-def save_data(data):
-    with open(JSON_FILE, "w") as f:
-        json.dump(data, f, indent=2)
 
-def resolve_path(data, path):
-    ref = data
-    for key in path:
-        ref = ref.get(key, {})
-    return ref
+def parse_item_range(arg):
+    start_str, _, end_str = arg.partition("-")
+    start = int(start_str)
+    end = int(end_str) if end_str else start
+    if start < 1 or end < start:
+        raise ValueError(arg)
+    return start, end
 
 
-def main_loop(data):
+def main_loop(data, codec, record_to=None):
     path = []
+    catalog = Catalog(data)
+    sort_index = SortIndex(catalog)
+    subtree_stats = SubtreeStats(catalog)
+    tag_index = TagIndex(catalog)
+    query_engine = QueryEngine(catalog)
+    snapshots = SnapshotStore(catalog, snapshot_dir(JSON_FILE))
+    frecency = FrecencyStore(catalog, frecency_file(JSON_FILE))
+    paths = PathIndex(catalog)
+    archiver = Archiver(catalog, subtree_stats, snapshots)
+    sites = {}
+    prices = PriceHistory(prices_file(JSON_FILE))
+    pages = PageArchive(archive_dir(JSON_FILE))
+    completer = Completer(paths, readline) if readline else None
+    if completer:
+        completer.install()
+    sort_mode = "insertion"
+
+    def save():
+        save_data(data, codec)
+        try:
+            snapshots.snapshot(subtree_stats.root.links)
+        except OSError as e:
+            print(f"⚠️ Snapshot failed: {e}")
+        try:
+            frecency.save()
+        except OSError as e:
+            print(f"⚠️ Saving open history failed: {e}")
+
+    try:
+        # Baseline, so the state before the first edit can be restored too.
+        snapshots.snapshot(subtree_stats.root.links)
+    except OSError as e:
+        print(f"⚠️ Snapshot failed: {e}")
+    recorder = None
+    if record_to:
+        recorder = Recorder(record_to, "cli", snapshots.current_hash(), snapshots.directory, JSON_FILE)
+        print(f"⏺️ Recording this session to {record_to}")
     print("🛒 Product Link Manager (infinite nesting enabled)")
-    print("Commands: list, open <x>, goto <x>, add <url>, edit <n> <url>, remove <n>, sub <name>, back, exit\n")
+    print("Commands: list, open <x>, cd <path>, goto <x>, add <url>, edit <n> <url>, remove <n>, sub <name>, sort <mode>, tree, mv, cp, tag, tagged, back, exit\n")
 
     while True:
         try:
-            node = resolve_path(data, path)
+            archiver.touch(path)
+            if archiver.due() and archiver.sweep(path):
+                save()
+            node = catalog.node(path)
+            links = sort_index.view(path, sort_mode)
+            subcats = catalog.subcategory_names(path)
             prompt = f"{'/'.join(path) or 'root'}> "
+            if completer:
+                completer.path = path
+            if recorder:
+                recorder.end()
             cmd = input(prompt).strip()
+            if recorder:
+                recorder.command(cmd)
         except KeyboardInterrupt:
             print("\n👋 Exiting.")
             break
@@ -65,8 +218,36 @@ def main_loop(data):
             print("👋 Goodbye!")
             break
 
-        if cmd == "list":
-            show_current_view(node)
+        if cmd == "list" or cmd.startswith("list "):
+            try:
+                show_current_view(subcats, links, subtree_stats.get(path), cmd.split()[1:])
+            except ValueError as e:
+                print(f"❌ {e}. Usage: list [--offset N] [--limit N] [--page N] [filter]")
+
+        elif cmd == "tree" or cmd.startswith("tree "):
+            arg = cmd[4:].strip()
+            if arg and not arg.isdigit():
+                print("❌ Usage: tree [max_depth]")
+                continue
+            show_tree(subtree_stats.get(path), '/'.join(path) or 'root', int(arg) if arg else None)
+
+        elif cmd == "sort" or cmd.startswith("sort "):
+            mode = cmd[4:].strip()
+            if not mode:
+                print(f"↕️ Current sort: {sort_mode} ({SORT_LABELS[sort_mode]})")
+                print("   Available: " + ", ".join(SORT_MODES))
+            elif mode not in SORT_MODES:
+                print("❌ Usage: sort <" + "|".join(SORT_MODES) + ">")
+            else:
+                sort_mode = mode
+                print(f"↕️ Sorting links by {SORT_LABELS[sort_mode]}")
+
+        elif cmd == "recent" or cmd.startswith("recent "):
+            arg = cmd[6:].strip()
+            if arg and not arg.isdigit():
+                print("❌ Usage: recent [count]")
+                continue
+            show_recent(frecency, int(arg) if arg else 10)
 
         elif cmd == "back":
             if path:
@@ -74,10 +255,16 @@ def main_loop(data):
             else:
                 print("❌ Already at the root level.")
 
+        elif cmd.startswith("open ") and not cmd[5:].strip().isdigit():
+            # open <name or path>: same as cd.
+            try:
+                path = paths.resolve(path, cmd[5:].strip())
+            except ValueError as e:
+                print(f"❌ {e}")
+
         elif cmd.startswith("open "):
             try:
                 idx = int(cmd.split()[1]) - 1
-                subcats = [k for k in node if k != LINKS_KEY]
                 if idx < 0 or idx >= len(subcats):
                     print("❌ Invalid subcategory number.")
                     continue
@@ -85,19 +272,27 @@ def main_loop(data):
             except:
                 print("❌ Usage: open <subcategory_number>")
 
+        elif cmd == "cd" or cmd.startswith("cd "):
+            try:
+                path = paths.resolve(path, cmd[2:].strip() or "/")
+            except ValueError as e:
+                print(f"❌ {e}")
+
         elif cmd.startswith("goto "):
             arg = cmd[5:].strip()
-            links = node.get(LINKS_KEY, [])
-            offset = len([k for k in node if k != LINKS_KEY])
+            offset = len(subcats)
 
             if arg == "all":
                 if not links:
                     print("📭 No links to open.")
                 else:
                     print(f"🌐 Opening all {len(links)} links...")
-                    for item in links:
-                        url = item[0] if isinstance(item, list) else item
-                        webbrowser.open_new_tab(url)
+                    opened = list(links)
+                    for item in opened:
+                        webbrowser.open_new_tab(link_url(item))
+                    for item in opened:
+                        catalog.mark_opened(path, item)
+                    save()
 
             elif arg.startswith("range "):
                 try:
@@ -107,11 +302,14 @@ def main_loop(data):
                     end = int(end_str) - offset
                     if start < 0 or end > len(links) or start >= end:
                         print("❌ Invalid range.")
-                        return
+                        continue
                     print(f"🌐 Opening links {start+1+offset} to {end+offset}...")
-                    for item in links[start:end]:
-                        url = item[0] if isinstance(item, list) else item
-                        webbrowser.open_new_tab(url)
+                    opened = links[start:end]
+                    for item in opened:
+                        webbrowser.open_new_tab(link_url(item))
+                    for item in opened:
+                        catalog.mark_opened(path, item)
+                    save()
                 except:
                     print("❌ Usage: goto range <start>-<end>")
 
@@ -120,11 +318,13 @@ def main_loop(data):
                     idx = int(arg) - 1 - offset
                     if idx < 0 or idx >= len(links):
                         print("❌ Invalid link number.")
-                        return
+                        continue
                     item = links[idx]
-                    url = item[0] if isinstance(item, list) else item
+                    url = link_url(item)
                     print(f"🌐 Opening: {url}")
                     webbrowser.open_new_tab(url)
+                    catalog.mark_opened(path, item)
+                    save()
                 except:
                     print("❌ Usage: goto <link_number>, goto all, or goto range x-y")
 
@@ -134,9 +334,8 @@ def main_loop(data):
                 parts = cmd[4:].strip().split(maxsplit=1)
                 url = parts[0]
                 desc = parts[1] if len(parts) > 1 else ""
-                links = node.setdefault(LINKS_KEY, [])
-                links.append([url, desc])
-                save_data(data)
+                catalog.add_link(path, url, desc)
+                save()
                 print(f"✅ Added: {url}  →  \"{desc}\"")
             except:
                 print("❌ Usage: add <url> <optional description>")
@@ -148,45 +347,250 @@ def main_loop(data):
                 print("❌ Usage: edit <link_number> <new_url> <new_desc>")
                 continue
             try:
-                idx = int(parts[1]) - 1 - len([k for k in node if k != LINKS_KEY])
+                idx = int(parts[1]) - 1 - len(subcats)
                 new_url = parts[2]
                 new_desc = parts[3] if len(parts) > 3 else ""
-                links = node.get(LINKS_KEY, [])
                 if idx < 0 or idx >= len(links):
                     print("❌ Invalid link number.")
                     continue
-                old = links[idx]
-                links[idx] = [new_url, new_desc]
-                save_data(data)
-                print(f"✏️ Replaced [{idx+1}] {old[0]} → {new_url}  \"{new_desc}\"")
+                old_url = link_url(links[idx])
+                catalog.edit_link(path, links[idx], new_url, new_desc)
+                save()
+                print(f"✏️ Replaced [{parts[1]}] {old_url} → {new_url}  \"{new_desc}\"")
             except:
                 print("❌ Usage: edit <link_number> <new_url> <new_desc>")
 
 
         elif cmd.startswith("remove "):
             try:
-                idx = int(cmd.split()[1]) - 1 - len([k for k in node if k != LINKS_KEY])
-                links = node.get(LINKS_KEY, [])
+                idx = int(cmd.split()[1]) - 1 - len(subcats)
                 if idx < 0 or idx >= len(links):
                     print("❌ Invalid link number.")
                     continue
-                removed = links.pop(idx)
-                save_data(data)
+                removed = links[idx]
+                catalog.remove_link(path, removed)
+                save()
                 print(f"🗑️ Removed: {removed[0]}")
             except:
                 print("❌ Usage: remove <link_number>")
 
 
+        elif cmd.startswith("mv ") or cmd.startswith("cp "):
+            parts = cmd.split(maxsplit=3)
+            verb = "Moved" if parts[0] == "mv" else "Copied"
+            usage = f"❌ Usage: {parts[0]} <x|x-y> <destination_path> [new_name]"
+            if len(parts) < 3:
+                print(usage)
+                continue
+            try:
+                start, end = parse_item_range(parts[1])
+            except ValueError:
+                print(usage)
+                continue
+            dest = resolve_target(catalog, path, parts[2])
+            if dest is None:
+                print(f"❌ Destination category not found: {parts[2]}")
+                continue
+            dest_text = '/'.join(dest) or 'root'
+
+            if start <= len(subcats):
+                if end != start:
+                    print("❌ Ranges can only contain links.")
+                    continue
+                name = subcats[start - 1]
+                new_name = parts[3].strip() if len(parts) > 3 else None
+                try:
+                    if parts[0] == "mv":
+                        if dest == path and not new_name:
+                            print("⚠️ Category is already there.")
+                            continue
+                        used = catalog.move_category(path, name, dest, new_name)
+                    else:
+                        used = catalog.copy_category(path, name, dest, new_name)
+                except ValueError as e:
+                    print(f"❌ {e}.")
+                    continue
+                save()
+                print(f"📦 {verb} '{name}' → {dest_text}/{used}")
+            else:
+                first = start - 1 - len(subcats)
+                last = end - len(subcats)
+                if last > len(links) or len(parts) > 3:
+                    print("❌ Invalid link number." if last > len(links) else usage)
+                    continue
+                selected = links[first:last]
+                if parts[0] == "mv":
+                    if dest == path:
+                        print("⚠️ Links are already there.")
+                        continue
+                    count = catalog.move_links(path, selected, dest)
+                else:
+                    count = catalog.copy_links(path, selected, dest)
+                save()
+                print(f"📦 {verb} {count} link{'s' if count != 1 else ''} → {dest_text}")
+
+        elif cmd.startswith("tag ") or cmd.startswith("untag "):
+            parts = cmd.split()
+            usage = f"❌ Usage: {parts[0]} <link_number|x-y> <tag> [tag ...]"
+            tags = {normalize_tag(t) for t in parts[2:]} - {""}
+            try:
+                start, end = parse_item_range(parts[1])
+            except (IndexError, ValueError):
+                print(usage)
+                continue
+            if not tags:
+                print(usage)
+                continue
+            first = start - 1 - len(subcats)
+            last = end - len(subcats)
+            if first < 0 or last > len(links):
+                print("❌ Invalid link number.")
+                continue
+            changed = 0
+            for item in links[first:last]:
+                current = set(link_tags(item))
+                updated = current | tags if parts[0] == "tag" else current - tags
+                if updated != current:
+                    catalog.set_tags(path, item, updated)
+                    changed += 1
+            if changed:
+                save()
+            action = "Tagged" if parts[0] == "tag" else "Untagged"
+            print(f"🏷️ {action} {changed} link{'s' if changed != 1 else ''} ({', '.join(sorted(tags))})")
+
+        elif cmd == "tags":
+            counts = tag_index.tag_counts()
+            if not counts:
+                print("🏷️ No tags yet. Use: tag <link_number> <tag>")
+            for tag, count in counts:
+                print(f"  #{tag}  ({count})")
+
+        elif cmd.startswith("tagged "):
+            query = cmd[7:].strip()
+            entries = (("🏷️ Matches:", f"  {'/'.join(link_path) or 'root'}: {link_display(item)}  [{link_url(item)}]")
+                       for link_path, item in tag_index.query(query))
+            page_size = default_page_size() if sys.stdin.isatty() and sys.stdout.isatty() else 0
+            if not stream_listing(entries, page_size=page_size):
+                print("🔍 No links match that tag query")
+
+        elif cmd.startswith("query "):
+            text = cmd[6:].strip()
+            explain = text.startswith("--explain")
+            if explain:
+                text = text[len("--explain"):].strip()
+            try:
+                if explain:
+                    for line in query_engine.explain(text):
+                        print(f"🧭 {line}")
+                    continue
+                results = query_engine.run(text)
+            except ValueError as e:
+                print(f"❌ {e}")
+                continue
+            entries = (("🔎 Matches:", f"  {'/'.join(link_path) or 'root'}: {link_display(item)}  [{link_url(item)}]")
+                       for link_path, item in results)
+            page_size = default_page_size() if sys.stdin.isatty() and sys.stdout.isatty() else 0
+            if not stream_listing(entries, page_size=page_size):
+                print("🔍 No links match that query")
+
+        elif cmd == "versions" or cmd.startswith("versions "):
+            arg = cmd[8:].strip()
+            if arg and not arg.isdigit():
+                print("❌ Usage: versions [count]")
+                continue
+            show_versions(snapshots, int(arg) if arg else 10)
+
+        elif cmd.startswith("diff "):
+            parts = cmd.split()
+            try:
+                old = snapshots.get_version(int(parts[1].lstrip("#")))["root"]
+                new = snapshots.get_version(int(parts[2].lstrip("#")))["root"] if len(parts) > 2 else snapshots.current_hash()
+            except (IndexError, ValueError):
+                print("❌ Usage: diff <version> [other_version]")
+                continue
+            except KeyError as e:
+                print(f"❌ {e.args[0]}")
+                continue
+            show_diff(snapshots, old, new)
+
+        elif cmd.startswith("restore "):
+            parts = cmd.split(maxsplit=2)
+            try:
+                version_id = int(parts[1].lstrip("#"))
+            except ValueError:
+                print("❌ Usage: restore <version> [category_path]")
+                continue
+            target = join_path(path, parts[2]) if len(parts) > 2 else list(path)
+            if not catalog.has_category(target[:-1]):
+                print(f"❌ Parent category not found: /{'/'.join(target[:-1])}")
+                continue
+            try:
+                snapshots.restore(version_id, tuple(target))
+            except KeyError as e:
+                print(f"❌ {e.args[0]}")
+                continue
+            save()
+            if not catalog.has_category(path):
+                path = []
+            print(f"♻️ Restored {'/'.join(target) or 'everything'} from version #{version_id}")
+
+        elif cmd == "gc" or cmd.startswith("gc "):
+            arg = cmd[2:].strip()
+            if arg and not arg.isdigit():
+                print("❌ Usage: gc [versions_to_keep]")
+                continue
+            dropped, removed = snapshots.gc(int(arg) if arg else None)
+            print(f"🧹 Dropped {dropped} old version{'s' if dropped != 1 else ''}, removed {removed} unreferenced object{'s' if removed != 1 else ''}")
+
+        elif cmd == "sync" or cmd.startswith("sync "):
+            parts = cmd.split()
+            action = parts[1] if len(parts) > 1 else "status"
+            usage = "❌ Usage: sync [status] | sync export <file> [--full] | sync import <file>"
+            try:
+                if action == "status" and len(parts) <= 2:
+                    ops = compute_delta(snapshots, load_base(snapshots), snapshots.current_hash())
+                    if not ops:
+                        print("✅ Nothing to export since the last sync")
+                    for op in ops[:20]:
+                        print(f"  {describe_op(op)}")
+                    if len(ops) > 20:
+                        print(f"  ... and {len(ops) - 20} more")
+                elif action == "export" and len(parts) in (3, 4) and parts[3:] in ([], ["--full"]):
+                    base = empty_tree(snapshots) if parts[3:] else load_base(snapshots)
+                    head = snapshots.current_hash()
+                    ops = compute_delta(snapshots, base, head)
+                    write_delta(parts[2], base, head, ops)
+                    save_base(snapshots, head)
+                    print(f"📤 Wrote {len(ops)} change{'s' if len(ops) != 1 else ''} to {parts[2]}")
+                elif action == "import" and len(parts) == 3:
+                    delta = read_delta(parts[2])
+                    applied, skipped, conflicts = merge_delta(catalog, snapshots, delta["ops"])
+                    if applied:
+                        save()
+                    save_base(snapshots, advance_base(snapshots, load_base(snapshots), delta["ops"]))
+                    if not catalog.has_category(path):
+                        path = []
+                    print(f"📥 Applied {applied}, already present {skipped}, conflicts {len(conflicts)}")
+                    for op, reason in conflicts:
+                        print(f"  ⚠️ {describe_op(op)}  ({reason})")
+                else:
+                    print(usage)
+            except (OSError, ValueError) as e:
+                print(f"❌ Sync failed: {e}")
+
         elif cmd.startswith("sub "):
             name = cmd[4:].strip()
             if not name:
                 print("❌ Usage: sub <subcategory_name>")
                 continue
+            if name in RESERVED_NAMES:
+                print(f"❌ '{name}' is a reserved name")
+                continue
             if name in node:
                 print("⚠️ Subcategory already exists.")
             else:
-                node[name] = {}
-                save_data(data)
+                catalog.add_category(path, name)
+                save()
                 print(f"✅ Created subcategory: '{name}'")
 
         elif cmd.startswith("new "):
@@ -197,26 +601,28 @@ def main_loop(data):
             if not name:
                 print("❌ Usage: new <category_name>")
                 continue
+            if name in RESERVED_NAMES:
+                print(f"❌ '{name}' is a reserved name")
+                continue
             if name in data:
                 print("⚠️ Category already exists.")
                 continue
-            data[name] = {}
-            save_data(data)
+            catalog.add_category(path, name)
+            save()
             print(f"✅ Created new top-level category: '{name}'")
             
         
         elif cmd.startswith("delcat "):
             try:
                 idx = int(cmd.split()[1]) - 1
-                subcats = [k for k in node if k != LINKS_KEY]
                 if idx < 0 or idx >= len(subcats):
                     print("❌ Invalid category number.")
                     continue
                 target = subcats[idx]
                 confirm = input(f"⚠️ Are you sure you want to delete '{target}' and all its contents? (y/N): ").strip().lower()
                 if confirm == "y":
-                    del node[target]
-                    save_data(data)
+                    catalog.delete_category(path, target)
+                    save()
                     print(f"🗑️ Deleted category '{target}'")
                 else:
                     print("❌ Cancelled.")
@@ -231,38 +637,307 @@ def main_loop(data):
             try:
                 idx = int(parts[1]) - 1
                 new_name = parts[2].strip()
-                subcats = [k for k in node if k != LINKS_KEY]
                 if idx < 0 or idx >= len(subcats):
                     print("❌ Invalid category number.")
                     continue
                 old_name = subcats[idx]
+                if new_name in RESERVED_NAMES:
+                    print(f"❌ '{new_name}' is a reserved name")
+                    continue
                 if new_name in node:
                     print("⚠️ A category with that name already exists.")
                     continue
-                node[new_name] = node.pop(old_name)
-                save_data(data)
+                catalog.rename_category(path, old_name, new_name)
+                save()
                 print(f"✏️ Renamed '{old_name}' → '{new_name}'")
             
             except:
                 print("❌ Invalid input. Usage: rename <category_number> <new_name>")
 
 
+        elif cmd == "mem" or cmd.startswith("mem "):
+            args = cmd.split()[1:]
+            as_json = "--json" in args
+            args = [arg for arg in args if arg != "--json"]
+            if len(args) > 1 or (args and not args[0].isdigit()):
+                print("❌ Usage: mem [top_n] [--json]")
+                continue
+            count = int(args[0]) if args else 10
+            size = measure_tree(node, tuple(path))
+            if as_json:
+                print(json.dumps({
+                    "time": int(time.time()),
+                    "path": "/" + "/".join(path),
+                    "tree": size_to_dict(size),
+                    "heaviest": [size_to_dict(child, 0) for child in heaviest(size, count)],
+                }, indent=2, ensure_ascii=False))
+            else:
+                for line in report_lines(size, count):
+                    print(line)
+
+        elif cmd == "compress" or cmd.startswith("compress "):
+            args = cmd.split(maxsplit=1)[1:]
+            if not args:
+                if not archiver.cold_after:
+                    print("🗜️ Idle compression is off; use 'compress idle <minutes>' to turn it on.")
+                    continue
+                packed = archiver.sweep(path)
+                if packed:
+                    save()
+                for target in packed:
+                    print(f"🗜️ Packed /{'/'.join(target)}")
+                print(f"🗜️ {len(packed)} cold categor{'y' if len(packed) == 1 else 'ies'} packed")
+            elif args[0].split()[0] == "idle":
+                value = args[0][4:].strip()
+                if not value:
+                    state = f"after {archiver.cold_after // 60} min" if archiver.cold_after else "off"
+                    print(f"🗜️ Categories idle for a while are packed: {state}")
+                elif value.isdigit():
+                    archiver.cold_after = int(value) * 60
+                    print(f"🗜️ Idle compression {'after ' + value + ' min' if archiver.cold_after else 'off'} for this session")
+                else:
+                    print("❌ Usage: compress idle [minutes]")
+            else:
+                try:
+                    if args[0].isdigit():
+                        idx = int(args[0]) - 1
+                        if idx < 0 or idx >= len(subcats):
+                            print("❌ Invalid category number.")
+                            continue
+                        target = path + [subcats[idx]]
+                    else:
+                        target = paths.resolve(path, args[0])
+                except ValueError as e:
+                    print(f"❌ {e}")
+                    continue
+                if target == path[:len(target)]:
+                    print("❌ Cannot compress the category you are in.")
+                    continue
+                before, after = archiver.pack(target)
+                save()
+                print(f"🗜️ Packed /{'/'.join(target)}: {format_bytes(before)} → {format_bytes(after)} in memory")
+
+        elif cmd == "publish" or cmd.startswith("publish "):
+            args = cmd.split()[1:]
+            full = "--full" in args
+            workers = None
+            if "--workers" in args:
+                i = args.index("--workers")
+                if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) < 1:
+                    print("❌ Usage: publish [dir] [--full] [--workers N]")
+                    continue
+                workers = int(args[i + 1])
+                del args[i:i + 2]
+            args = [arg for arg in args if arg != "--full"]
+            if len(args) > 1:
+                print("❌ Usage: publish [dir] [--full] [--workers N]")
+                continue
+            out_dir = args[0] if args else site_dir(JSON_FILE)
+            try:
+                if out_dir not in sites:
+                    sites[out_dir] = SiteBuilder(catalog, subtree_stats, snapshots, out_dir)
+                result = sites[out_dir].build(workers, full)
+            except (OSError, ValueError) as e:
+                print(f"❌ Publishing failed: {e}")
+                continue
+            removed = f", {result['removed']} removed" if result["removed"] else ""
+            pool = f" on {result['workers']} processes" if result["workers"] > 1 else ""
+            print(f"🌐 Rendered {result['rendered']} of {result['pages']} pages{removed}{pool} "
+                  f"in {result['seconds'] * 1000:.0f} ms → {os.path.join(out_dir, 'index.html')}")
+
+        elif cmd == "prices" or cmd.startswith("prices "):
+            args = cmd.split()[1:]
+            if args and args[0] in {"sample", "refresh"}:
+                if args[0] == "refresh":
+                    urls = list(prices.urls)
+                else:
+                    try:
+                        target = paths.resolve(path, " ".join(args[1:])) if len(args) > 1 else path
+                    except ValueError as e:
+                        print(f"❌ {e}")
+                        continue
+                    urls = link_urls(catalog.node(target))
+                if not urls:
+                    print("📭 No links to sample.")
+                    continue
+                print(f"💲 Checking {len(urls)} page{'s' if len(urls) != 1 else ''}...")
+                samples, failed = sample_prices(urls)
+                try:
+                    prices.record(samples)
+                except OSError as e:
+                    print(f"❌ Saving prices failed: {e}")
+                    continue
+                found = sum(1 for sample in samples if sample[2] is not None)
+                print(f"💲 Found a price on {found} of {len(urls)} pages")
+                for url, error in failed[:5]:
+                    print(f"⚠️ {url}: {error}")
+                if len(failed) > 5:
+                    print(f"⚠️ ... and {len(failed) - 5} more failed")
+            elif not args:
+                offset = len(subcats)
+                shown = 0
+                for i, item in enumerate(links):
+                    series = prices.get(link_url(item))
+                    if series is None:
+                        continue
+                    shown += 1
+                    print(f"  [{i + 1 + offset}] {link_display(item)}  {series.sparkline(16)} {format_price(series.last)}")
+                if not shown:
+                    print("📭 No price history here yet. Use 'prices sample' to start.")
+            elif args[0].isdigit() and len(args) <= 2 and (len(args) == 1 or args[1].isdigit()):
+                idx = int(args[0]) - 1 - len(subcats)
+                if idx < 0 or idx >= len(links):
+                    print("❌ Invalid link number.")
+                    continue
+                series = prices.get(link_url(links[idx]))
+                if series is None:
+                    print("📭 No prices recorded for this link yet.")
+                    continue
+                start = time.time() - int(args[1]) * 86400 if len(args) == 2 else None
+                rows = series.range(start)
+                print(f"💲 {link_display(links[idx])}: low {format_price(series.low)}, "
+                      f"high {format_price(series.high)}, last {format_price(series.last)}")
+                for when, price, available in rows:
+                    stock = {True: "in stock", False: "out of stock", None: ""}[available]
+                    print(f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(when))}  {format_price(price):>12}  {stock}")
+            else:
+                print("❌ Usage: prices [x [days]] | prices sample [path] | prices refresh")
+
+        elif cmd == "drops" or cmd.startswith("drops "):
+            arg = cmd[5:].strip().rstrip("%")
+            try:
+                percent = float(arg) if arg else 10.0
+            except ValueError:
+                print("❌ Usage: drops [percent]")
+                continue
+            found = prices.drops(percent)
+            if not found:
+                print(f"📭 No link is more than {percent:g}% below its highest price.")
+                continue
+            wanted = {url for url, _, _ in found}
+            where = {}
+            for link_path, item in iter_links(catalog.data):
+                if link_url(item) in wanted:
+                    where.setdefault(link_url(item), (link_path, item))
+            print(f"📉 {len(found)} link{'s' if len(found) != 1 else ''} down more than {percent:g}% from their highest price:")
+            for url, series, fall in found:
+                link_path, item = where.get(url, ((), url))
+                low = " (lowest yet)" if series.last <= series.low else ""
+                print(f"  -{fall:.0f}%  {format_price(series.high)} → {format_price(series.last)}{low}  "
+                      f"{link_display(item)}  /{'/'.join(link_path)}")
+
+        elif cmd == "archive" or cmd.startswith("archive "):
+            args = cmd.split()[1:]
+            if args and args[0] in {"open", "versions"}:
+                if len(args) not in (2, 3) or not all(arg.isdigit() for arg in args[1:]):
+                    print("❌ Usage: archive open <x> [version] | archive versions <x>")
+                    continue
+                idx = int(args[1]) - 1 - len(subcats)
+                if idx < 0 or idx >= len(links):
+                    print("❌ Invalid link number.")
+                    continue
+                versions = pages.versions(link_url(links[idx]))
+                if not versions:
+                    print("📭 No archived copy of this link yet. Use 'archive' to fetch one.")
+                elif args[0] == "versions":
+                    for i, entry in enumerate(versions, 1):
+                        print(f"  {i}. {format_time(entry['time'])}  {format_bytes(entry['bytes'])}  "
+                              f"{len(entry.get('assets', {}))} assets")
+                else:
+                    number = int(args[2]) if len(args) == 3 else len(versions)
+                    if number < 1 or number > len(versions):
+                        print(f"❌ There {'is 1 archived version' if len(versions) == 1 else f'are {len(versions)} archived versions'}.")
+                        continue
+                    try:
+                        url = pages.view(versions[number - 1])
+                    except OSError as e:
+                        print(f"❌ Archived copy unreadable: {e}")
+                        continue
+                    print(f"🗂️ Opening the copy from {format_time(versions[number - 1]['time'])}")
+                    webbrowser.open_new_tab(url)
+                continue
+            try:
+                target = paths.resolve(path, " ".join(args)) if args else path
+            except ValueError as e:
+                print(f"❌ {e}")
+                continue
+            urls = link_urls(catalog.node(target))
+            if not urls:
+                print("📭 No links to archive.")
+                continue
+            print(f"📥 Archiving {len(urls)} page{'s' if len(urls) != 1 else ''}...")
+            try:
+                result = pages.archive(urls)
+            except OSError as e:
+                print(f"❌ Archiving failed: {e}")
+                continue
+            print(f"📥 {result['new']} new, {result['unchanged'] + result['same']} unchanged, "
+                  f"{len(result['failed'])} failed in {result['seconds']:.1f} s; "
+                  f"stored {format_bytes(result['stored_bytes'])} of {format_bytes(result['fetched_bytes'])} fetched")
+            for url, error in result["failed"][:5]:
+                print(f"⚠️ {url}: {error}")
+            if len(result["failed"]) > 5:
+                print(f"⚠️ ... and {len(result['failed']) - 5} more failed")
+
+        elif cmd == "format" or cmd.startswith("format "):
+            parts = cmd.split()
+            if len(parts) == 1:
+                print(f"💾 {JSON_FILE} is saved {codec.mode} (JSON library: {codec.backend})")
+            elif len(parts) == 2 and parts[1] in MODES:
+                codec.mode = parts[1]
+                save()
+                print(f"💾 {JSON_FILE} is now saved {codec.mode}")
+            else:
+                print("❌ Usage: format [pretty|compact]")
+
         else:
-            print("❓ Unknown command. Try: list, open <x>, sub <name>, add <url>, goto <x>, edit <n> <url>, remove <n>, back, exit")
+            print("❓ Unknown command. Try: list, open <x>, cd <path>, sub <name>, add <url>, goto <x>, edit <n> <url>, remove <n>, sort <mode>, tree, mv, cp, tag, tagged, query, recent, versions, back, exit")
+
+    if recorder:
+        recorder.close()
 
 if __name__ == "__main__":
-    data = load_data()
+    data, codec = load_data()
     print("🛒 Product Link Manager Ready!")
     print("""
     📘 Available Commands:
 
     📁 Category Navigation:
     list                   → List all categories or contents of current category
+    list [--offset N] [--limit N] [--page N] [text]
+                           → Page through, slice or filter the listing
     open <x>               → Open category number x
+    cd <path>              → Go to a category: /a/b, a/b, .. or unique prefixes like /ele/pho (Tab completes)
     back                   → Go back to parent category
     new <name>             → Create a new category or subcategory
     rename <x> <new_name>  → Rename category or subcategory
     delete <x>             → Delete category or subcategory
+    mv <x|x-y> <dest> [name] → Move a category or links to another category
+    cp <x|x-y> <dest> [name] → Copy a category or links to another category
+    sort <mode>            → Sort links by insertion, desc, url, added or opened
+    tree [depth]           → Show the category tree with recursive counts
+
+    🏷️ Tags:
+    tag <x|x-y> <tags>     → Add tags to links
+    untag <x|x-y> <tags>   → Remove tags from links
+    tags                   → List all tags with their link counts
+    tagged <query>         → Find links by tag: "a b" (and), "a or b", "not a" / "-a"
+
+    🔎 Query:
+    query <expr>           → Search all links, e.g. domain:amazon.com under:Electronics desc~ssd added>=2026-10
+                             (also url~text, tag:x, opened<7d, and / or / not / -x / parentheses)
+    query --explain <expr> → Show which index the query would use
+
+    🗄️ Versions:
+    versions [n]           → List the last n snapshots (one is taken on every save)
+    diff <v> [w]           → Show what changed between version v and w (or now)
+    restore <v> [path]     → Restore the current (or given) category from version v
+    gc [keep]              → Keep only the newest versions and delete unused objects
+
+    🔄 Sync:
+    sync [status]          → Show the changes not yet exported to other replicas
+    sync export <file> [--full] → Write those changes to a delta file
+    sync import <file>     → Merge a delta file from another replica
 
     🔗 Link Management:
     add <url> <desc>       → Add a new link with optional description
@@ -271,11 +946,25 @@ if __name__ == "__main__":
     goto <x>               → Open link number x
     goto all               → Open all links in current category
     goto range x-y         → Open link numbers x to y (inclusive)
+    recent [k]             → Show the k links you open most, weighted towards recent opens
 
     ❓ Other:
+    mem [n] [--json]       → Memory used by the current category and its n heaviest subtrees
+    compress [x|path]      → Pack a category (or every idle one) compressed until it is next opened
+    compress idle [min]    → Show or set how long a category stays unvisited before it is packed (0 = never)
+    prices [x [days]]      → Price trend of the links here, or the price history of link x
+    prices sample [path]   → Check the prices of every link in the current (or given) category
+    prices refresh         → Check the prices of every link already tracked
+    drops [percent]        → Links whose last price is more than percent (10) below the highest ever seen
+    archive [path]         → Save offline copies of the pages of every link here (or in path)
+    archive open <x> [v]   → Open the archived copy of link x (the latest, or version v)
+    archive versions <x>   → List the archived copies of link x
+    publish [dir] [--full] [--workers N]
+                           → Write the catalog as a static HTML site with search (only changed pages)
+    format [pretty|compact] → Save products.json indented for reading or compact for speed
     exit / quit            → Exit the application
     """)
 
-    main_loop(data)
+    main_loop(data, codec, record_arg(sys.argv[1:]))
 
     
\ No newline at end of file
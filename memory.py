@@ -0,0 +1,212 @@
+import heapq
+import sys
+import time
+import tracemalloc
+
+from catalog import ARCHIVE_KEY, LINKS_KEY
+
+
+class SubtreeSize:
+    # Deep size of one category and everything below it, split into the
+    # bytes held by strings, by containers (dicts and lists) and by the
+    # rest (timestamps). `shared` marks a copy that shares its contents
+    # with a category counted earlier, so it adds nothing itself.
+
+    __slots__ = ("path", "links", "strings", "containers", "other", "shared", "children")
+
+    def __init__(self, path):
+        self.path = path
+        self.links = 0
+        self.strings = 0
+        self.containers = 0
+        self.other = 0
+        self.shared = False
+        self.children = {}
+
+    @property
+    def total(self):
+        return self.strings + self.containers + self.other
+
+    def add(self, other):
+        self.links += other.links
+        self.strings += other.strings
+        self.containers += other.containers
+        self.other += other.other
+
+    def walk(self):
+        yield self
+        for child in self.children.values():
+            yield from child.walk()
+
+
+def _account(size, obj):
+    # Link lists, links and their metadata: small, so plain recursion.
+    n = sys.getsizeof(obj)
+    if isinstance(obj, str):
+        size.strings += n
+    elif isinstance(obj, dict):
+        size.containers += n
+        for key, value in obj.items():
+            _account(size, key)
+            _account(size, value)
+    elif isinstance(obj, (list, tuple)):
+        size.containers += n
+        for item in obj:
+            _account(size, item)
+    else:
+        size.other += n
+
+
+def measure_tree(node, path=(), seen=None):
+    # Categories shared by copy-on-write copies are counted once, the first
+    # time they are reached.
+    seen = set() if seen is None else seen
+    size = SubtreeSize(path)
+    if id(node) in seen:
+        size.shared = True
+        return size
+    seen.add(id(node))
+    size.containers += sys.getsizeof(node)
+    for name, value in node.items():
+        size.strings += sys.getsizeof(name)
+        if name == LINKS_KEY:
+            size.links += len(value)
+            _account(size, value)
+        elif name == ARCHIVE_KEY:
+            # Packed category: the compressed blob is all it holds.
+            size.links += value[1]
+            _account(size, value)
+        elif isinstance(value, dict):
+            child = measure_tree(value, path + (name,), seen)
+            size.children[name] = child
+            size.add(child)
+        else:
+            _account(size, value)
+    return size
+
+
+def heaviest(size, count):
+    return heapq.nlargest(count, (s for s in size.walk() if s is not size), key=lambda s: s.total)
+
+
+def format_bytes(n):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def size_to_dict(size, max_depth=None):
+    result = {
+        "path": "/" + "/".join(size.path),
+        "bytes": size.total,
+        "links": size.links,
+        "strings": size.strings,
+        "containers": size.containers,
+        "other": size.other,
+    }
+    if size.shared:
+        result["shared"] = True
+    if max_depth is None or max_depth > 0:
+        result["children"] = [size_to_dict(child, None if max_depth is None else max_depth - 1)
+                              for child in size.children.values()]
+    return result
+
+
+def report_lines(size, count):
+    # Human-readable report: the categories directly below `size`, then
+    # the `count` heaviest subtrees anywhere below it.
+    where = "/" + "/".join(size.path)
+    lines = [f"🧠 {where}: {format_bytes(size.total)} for {size.links:,} links "
+             f"(strings {format_bytes(size.strings)}, containers {format_bytes(size.containers)}, "
+             f"other {format_bytes(size.other)})"]
+    for name, child in sorted(size.children.items(), key=lambda item: -item[1].total):
+        share = child.total / size.total * 100 if size.total else 0
+        note = "  (shared with an earlier copy)" if child.shared else ""
+        lines.append(f"  📁 {name}: {format_bytes(child.total)}, {child.links:,} links, {share:.0f}%{note}")
+    top = heaviest(size, count)
+    if top:
+        lines.append(f"🏋️ Heaviest {len(top)} subtrees:")
+        for i, child in enumerate(top, 1):
+            lines.append(f"  [{i}] {format_bytes(child.total):>10}  /{'/'.join(child.path)}  ({child.links:,} links)")
+    return lines
+
+
+class AllocationProfiler:
+    # Attributes memory allocated while running labelled calls (TUI
+    # frames, key handlers) using tracemalloc. Calls made inside another
+    # measured call only record their net allocation, since resetting the
+    # peak would spoil the outer measurement.
+
+    def __init__(self):
+        self.active = False
+        self.started_tracing = False
+        self.stats = {}
+        self.depth = 0
+        self.since = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.active = True
+        self.stats = {}
+        self.since = time.time()
+
+    def stop(self):
+        self.active = False
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def measure(self, label, func, *args):
+        if not self.active:
+            return func(*args)
+        outer = self.depth == 0
+        if outer:
+            tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        self.depth += 1
+        try:
+            return func(*args)
+        finally:
+            self.depth -= 1
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            entry = self.stats.get(label)
+            if entry is None:
+                entry = self.stats[label] = {"calls": 0, "seconds": 0.0, "net_bytes": 0,
+                                             "measured_peaks": 0, "peak_bytes": 0, "max_peak_bytes": 0}
+            entry["calls"] += 1
+            entry["seconds"] += elapsed
+            entry["net_bytes"] += current - before
+            if outer:
+                entry["measured_peaks"] += 1
+                entry["peak_bytes"] += peak - before
+                entry["max_peak_bytes"] = max(entry["max_peak_bytes"], peak - before)
+
+    def report(self):
+        # {label: per-call averages}, heaviest peak first.
+        result = {}
+        for label, entry in sorted(self.stats.items(), key=lambda item: -item[1]["max_peak_bytes"]):
+            calls = entry["calls"]
+            peaks = entry["measured_peaks"]
+            result[label] = {
+                "calls": calls,
+                "mean_ms": entry["seconds"] / calls * 1000,
+                "mean_net_bytes": entry["net_bytes"] / calls,
+                "mean_peak_bytes": entry["peak_bytes"] / peaks if peaks else None,
+                "max_peak_bytes": entry["max_peak_bytes"] if peaks else None,
+            }
+        return result
+
+    def report_lines(self):
+        lines = []
+        for label, entry in self.report().items():
+            peak = (f"peak {format_bytes(entry['mean_peak_bytes'])} avg / {format_bytes(entry['max_peak_bytes'])} max"
+                    if entry["mean_peak_bytes"] is not None else "nested")
+            lines.append(f"  {label}: {entry['calls']}×, {entry['mean_ms']:.2f} ms, "
+                         f"net {format_bytes(entry['mean_net_bytes'])}, {peak}")
+        return lines
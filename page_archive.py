@@ -0,0 +1,379 @@
+import hashlib
+import html
+import http.client
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+ARCHIVE_WORKERS = 8
+# At most this many requests to one host at a time, whatever the workers.
+PER_HOST = 4
+FETCH_TIMEOUT = 20
+MAX_BYTES = 10 << 20
+MAX_ASSETS = 30
+MAX_REDIRECTS = 5
+USER_AGENT = "Mozilla/5.0 (compatible; OneCart page archiver)"
+# Stylesheets and images are kept with the page, so the copy still looks
+# right once the shop is gone.
+TAG_RE = re.compile(r"<(img|link)\b([^>]*)>", re.IGNORECASE)
+TAG_ATTR_RE = re.compile(r'([\w-]+)\s*=\s*["\']([^"\']*)["\']')
+ATTR_RE = re.compile(r'(\b(?:src|href)=["\'])([^"\'>]+)(["\'])', re.IGNORECASE)
+HEAD_RE = re.compile(r"<head\b[^>]*>", re.IGNORECASE)
+# Goes first in the <head> of a viewed copy: no scripts, plugins or form
+# posts from a page opened off the disk.
+VIEW_POLICY = ('<meta http-equiv="Content-Security-Policy" '
+               'content="script-src \'none\'; object-src \'none\'; form-action \'none\'">')
+
+
+class FetchError(Exception):
+    pass
+
+
+class HttpClient:
+    # Keeps one open connection per host and thread, so fetching many
+    # pages from a shop reuses a few keep-alive connections instead of
+    # connecting for every page.
+
+    def __init__(self, timeout=FETCH_TIMEOUT, per_host=PER_HOST):
+        self.timeout = timeout
+        self.per_host = per_host
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.host_slots = {}
+        self.opened = []
+
+    def _slot(self, key):
+        with self.lock:
+            if key not in self.host_slots:
+                self.host_slots[key] = threading.BoundedSemaphore(self.per_host)
+            return self.host_slots[key]
+
+    def _connection(self, key):
+        connections = self.local.__dict__.setdefault("connections", {})
+        if key not in connections:
+            scheme, host = key
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connections[key] = cls(host, timeout=self.timeout)
+            with self.lock:
+                self.opened.append(connections[key])
+        return connections[key]
+
+    def _drop(self, key):
+        connection = self.local.__dict__.get("connections", {}).pop(key, None)
+        if connection is not None:
+            connection.close()
+
+    def _request(self, url, headers):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            raise FetchError(f"not a web address: {url}")
+        key = (parts.scheme, parts.netloc)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "identity", **headers}
+        with self._slot(key):
+            # A kept-alive connection the server has closed fails on first
+            # use; that gets one retry on a fresh connection.
+            for attempt in (1, 2):
+                connection = self._connection(key)
+                try:
+                    connection.request("GET", target, headers=headers)
+                    response = connection.getresponse()
+                    body = response.read(MAX_BYTES + 1)
+                except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError) as e:
+                    self._drop(key)
+                    if attempt == 2:
+                        raise FetchError(str(e) or type(e).__name__)
+                    continue
+                except (OSError, http.client.HTTPException) as e:
+                    self._drop(key)
+                    raise FetchError(str(e) or type(e).__name__)
+                if len(body) > MAX_BYTES or response.will_close:
+                    self._drop(key)
+                if len(body) > MAX_BYTES:
+                    raise FetchError(f"larger than {MAX_BYTES >> 20} MiB")
+                return response.status, response.headers, body
+
+    def get(self, url, headers=None, final=None):
+        # (status, headers, body, url answered) after following redirects.
+        # `headers` go with the request to `final` only (by default `url`,
+        # the first): validators of one address mean nothing to another.
+        headers = headers or {}
+        final = final or url
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request(url, headers if url == final else {})
+            location = response_headers.get("Location")
+            if status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            return status, response_headers, body, url
+        raise FetchError("too many redirects")
+
+    def close(self):
+        # Only once no request is running.
+        for connection in self.opened:
+            connection.close()
+
+
+class SharedAssets:
+    # Asset url -> entry for one archive run, shared by the workers. Every
+    # url has a lock of its own, so an asset used by many pages is fetched
+    # once and workers that need it meanwhile wait for that fetch.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}
+
+    def slot(self, url):
+        # [lock, fetched yet, entry or None]
+        with self.lock:
+            if url not in self.slots:
+                self.slots[url] = [threading.Lock(), False, None]
+            return self.slots[url]
+
+
+def asset_refs(page):
+    # src / href values of the images and stylesheets in `page`, as written.
+    refs = []
+    for tag, attrs in TAG_RE.findall(page):
+        attrs = {name.lower(): value for name, value in TAG_ATTR_RE.findall(attrs)}
+        if tag.lower() == "img" and attrs.get("src"):
+            refs.append(attrs["src"])
+        elif "stylesheet" in attrs.get("rel", "").lower().split() and attrs.get("href"):
+            refs.append(attrs["href"])
+    return list(dict.fromkeys(refs))
+
+
+def _conditional(entry):
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("modified"):
+        headers["If-Modified-Since"] = entry["modified"]
+    return headers
+
+
+def is_html(content_type):
+    return content_type.split(";")[0].strip().lower() in ("text/html", "application/xhtml+xml")
+
+
+class PageArchive:
+    # Offline copies of link pages. Bodies are stored zlib-compressed under
+    # their sha256 in objects/, so a page or asset that is the same in many
+    # places (or unchanged between fetches) is stored once; index.jsonl
+    # lists every fetch as {"url", "time", "sha", "type", ...} and is
+    # only appended to. Pages also list the assets they use.
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.view_dir = os.path.join(directory, "view")
+        self.index_file = os.path.join(directory, "index.jsonl")
+        # url -> its entries, oldest first
+        self.index = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash.
+                    continue
+                self.index.setdefault(entry["url"], []).append(entry)
+
+    def versions(self, url):
+        return [entry for entry in self.index.get(url, []) if entry.get("kind") == "page"]
+
+    def latest(self, url):
+        entries = self.index.get(url)
+        return entries[-1] if entries else None
+
+    def page_count(self):
+        return sum(1 for entries in self.index.values() if entries[-1].get("kind") == "page")
+
+    def _object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha[2:])
+
+    def put(self, body):
+        # Stores `body` unless it is already there. Returns (sha, bytes
+        # written).
+        sha = hashlib.sha256(body).hexdigest()
+        path = self._object_path(sha)
+        if os.path.exists(path):
+            return sha, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(body, 6)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return sha, len(data)
+
+    def get(self, sha):
+        with open(self._object_path(sha), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def _record(self, entries):
+        if not entries:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.index.setdefault(entry["url"], []).append(entry)
+
+    def _fetch(self, client, url, latest, kind):
+        # (entry to record or None, status): "new", "same" (200 but the
+        # same content) or "unchanged" (304).
+        # The validators belong to the address that answered last time.
+        status, headers, body, final = client.get(url, _conditional(latest), latest and latest.get("final"))
+        if status == 304 and latest:
+            return None, "unchanged"
+        if status != 200:
+            raise FetchError(f"HTTP {status}")
+        sha, written = self.put(body)
+        entry = {
+            "url": url,
+            "final": final if final != url else None,
+            "kind": kind,
+            "time": int(time.time()),
+            "sha": sha,
+            "type": headers.get("Content-Type", ""),
+            "etag": headers.get("ETag"),
+            "modified": headers.get("Last-Modified"),
+            "bytes": len(body),
+            "stored": written,
+        }
+        return entry, body
+
+    def _archive_page(self, client, url, latest, assets):
+        # Fetches a page and the assets it uses; `assets` is the run's
+        # SharedAssets. Returns (entries, status).
+        entry, body = self._fetch(client, url, latest, "page")
+        if entry is None:
+            return [], "unchanged"
+        entries = []
+        if is_html(entry["type"]):
+            page = body.decode("utf-8", "replace")
+            used = {}
+            for src in asset_refs(page):
+                asset_url = urljoin(entry["final"] or url, html.unescape(src))
+                if not asset_url.startswith(("http://", "https://")) or len(used) >= MAX_ASSETS:
+                    continue
+                slot = assets.slot(asset_url)
+                with slot[0]:
+                    if not slot[1]:
+                        slot[1] = True
+                        previous = self.latest(asset_url)
+                        try:
+                            asset, _ = self._fetch(client, asset_url, previous, "asset")
+                        except FetchError:
+                            asset = None
+                        else:
+                            if asset is None:
+                                asset = previous
+                            elif previous is None or previous["sha"] != asset["sha"]:
+                                entries.append(asset)
+                        slot[2] = asset
+                    asset = slot[2]
+                if asset is not None:
+                    used[src] = asset["sha"]
+            entry["assets"] = used
+        if latest and latest["sha"] == entry["sha"] and latest.get("assets") == entry.get("assets"):
+            return entries, "same"
+        entries.append(entry)
+        return entries, "new"
+
+    def archive(self, urls, workers=ARCHIVE_WORKERS, client=None, progress=None):
+        # Fetches every url `workers` at a time, sending the validators of
+        # the last copy so unchanged pages come back as 304 and cost no
+        # storage. Returns a summary dict; `progress` is called per url.
+        own_client = client is None
+        client = client or HttpClient()
+        urls = list(dict.fromkeys(urls))
+        latest = {url: self.latest(url) for url in urls}
+        assets = SharedAssets()
+        result = {"pages": len(urls), "new": 0, "same": 0, "unchanged": 0, "failed": [],
+                  "fetched_bytes": 0, "stored_bytes": 0}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            futures = {pool.submit(self._archive_page, client, url, latest[url], assets): url for url in urls}
+            for future in as_completed(futures):
+                try:
+                    entries, status = future.result()
+                except FetchError as e:
+                    result["failed"].append((futures[future], str(e)))
+                else:
+                    result[status] += 1
+                    for entry in entries:
+                        result["fetched_bytes"] += entry["bytes"]
+                        result["stored_bytes"] += entry["stored"]
+                    self._record(entries)
+                if progress:
+                    progress()
+        result["seconds"] = time.perf_counter() - started
+        result["connections"] = len(client.opened)
+        if own_client:
+            client.close()
+        return result
+
+    def _view_file(self, sha, content_type):
+        # Writes a stored body out as a file a browser can open.
+        extension = ".html" if is_html(content_type) else (
+            mimetypes.guess_extension(content_type.split(";")[0].strip()) or "")
+        path = os.path.join(self.view_dir, sha + extension)
+        if not os.path.exists(path):
+            os.makedirs(self.view_dir, exist_ok=True)
+            body = self.get(sha)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        return path
+
+    def view(self, entry):
+        # A file:// URL showing the archived copy `entry`. Its stylesheets
+        # and images point at the stored ones; other links go to the live
+        # site through a <base> tag. The shop's scripts are not run: the
+        # copy is a file on this machine.
+        if not is_html(entry["type"]):
+            return Path(os.path.abspath(self._view_file(entry["sha"], entry["type"]))).as_uri()
+        url = entry.get("final") or entry["url"]
+        local = {}
+        for src, sha in entry.get("assets", {}).items():
+            asset = next((e for e in reversed(self.index.get(urljoin(url, html.unescape(src)), []))
+                          if e["sha"] == sha), None)
+            if asset is not None:
+                local[src] = Path(os.path.abspath(self._view_file(sha, asset["type"]))).as_uri()
+        page = self.get(entry["sha"]).decode("utf-8", "replace")
+        page = ATTR_RE.sub(lambda m: m.group(1) + local.get(m.group(2), m.group(2)) + m.group(3), page)
+        head = VIEW_POLICY + f'<base href="{html.escape(url)}">'
+        match = HEAD_RE.search(page)
+        page = page[:match.end()] + head + page[match.end():] if match else head + page
+        key = hashlib.sha256(json.dumps([entry["sha"], local, head]).encode("utf-8")).hexdigest()
+        path = os.path.join(self.view_dir, key + ".view.html")
+        if not os.path.exists(path):
+            os.makedirs(self.view_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(page)
+        return Path(os.path.abspath(path)).as_uri()
+
+
+def format_time(when):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(when))
+
+
+def archive_dir(json_file):
+    return os.path.splitext(json_file)[0] + ".archive"
@@ -0,0 +1,70 @@
+import itertools
+import shutil
+import sys
+
+
+def default_page_size():
+    return max(5, shutil.get_terminal_size((80, 24)).lines - 2)
+
+
+def ask_more(shown):
+    try:
+        answer = input(f"-- {shown} shown, Enter for more, q to stop -- ").strip().lower()
+    except (EOFError, KeyboardInterrupt):
+        print()
+        return False
+    return answer not in {"q", "quit"}
+
+
+def stream_listing(entries, out=None, page_size=None, offset=0, limit=None, chunk_size=512, more=ask_more):
+    # `entries` yields (heading, line) lazily. Lines are written in chunks
+    # instead of one print() each, a heading is emitted whenever it changes,
+    # and with a page size the caller is asked before every further page.
+    # Returns the number of entries written.
+    out = out or sys.stdout
+    stop = None if limit is None else offset + limit
+    entries = itertools.islice(entries, offset, stop)
+
+    chunk = []
+    heading = None
+    shown = 0
+    page_lines = 0
+    for entry_heading, line in entries:
+        needed = 1 if entry_heading == heading else 2
+        if page_size and page_lines and page_lines + needed > page_size:
+            out.write("".join(chunk))
+            out.flush()
+            chunk = []
+            page_lines = 0
+            if not more(shown):
+                return shown
+        if entry_heading != heading:
+            heading = entry_heading
+            chunk.append(heading + "\n")
+            page_lines += 1
+        chunk.append(line + "\n")
+        shown += 1
+        page_lines += 1
+        if len(chunk) >= chunk_size:
+            out.write("".join(chunk))
+            chunk = []
+    out.write("".join(chunk))
+    out.flush()
+    return shown
+
+
+def parse_list_args(args):
+    # list [--offset N] [--limit N] [--page N] [filter text...]
+    options = {"offset": 0, "limit": None, "page": None, "filter": ""}
+    words = []
+    tokens = iter(args)
+    for token in tokens:
+        if token in ("--offset", "--limit", "--page"):
+            value = next(tokens, None)
+            if value is None or not value.isdigit():
+                raise ValueError(f"{token} expects a number")
+            options[token[2:]] = int(value)
+        else:
+            words.append(token)
+    options["filter"] = " ".join(words)
+    return options
@@ -0,0 +1,298 @@
+import bisect
+import math
+import os
+import re
+import struct
+import sys
+import time
+import urllib.request
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+MAGIC = b"OCPH\x01"
+# Every block starts with its kind and item count. "U" blocks name new
+# urls (ids count up from 0); "S" blocks hold samples as four columns:
+# url ids, times, prices (NaN = not found) and availability (1 in stock,
+# 0 not, -1 unknown).
+BLOCK = struct.Struct("<cI")
+URL_LENGTH = struct.Struct("<H")
+SAMPLE_COLUMNS = (("I", 4), ("I", 4), ("d", 8), ("b", 1))
+SAMPLE_SIZE = sum(size for _, size in SAMPLE_COLUMNS)
+
+SAMPLE_EVERY = 6 * 3600
+SAMPLE_WORKERS = 8
+FETCH_TIMEOUT = 15
+MAX_PAGE_BYTES = 2 << 20
+USER_AGENT = "Mozilla/5.0 (compatible; OneCart price tracker)"
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# Where shops put the price: JSON-LD / microdata, then Open Graph tags.
+PRICE_PATTERNS = [
+    re.compile(r'"price"\s*:\s*"?\s*([0-9][0-9.,]*)'),
+    re.compile(r'itemprop=["\']price["\'][^>]*?content=["\']\s*([0-9][0-9.,]*)'),
+    re.compile(r'content=["\']\s*([0-9][0-9.,]*)["\'][^>]*?itemprop=["\']price["\']'),
+    re.compile(r'property=["\'](?:product|og):price:amount["\'][^>]*?content=["\']\s*([0-9][0-9.,]*)'),
+]
+AVAILABILITY_RE = re.compile(r"schema\.org/(InStock|OutOfStock|SoldOut|Discontinued|PreOrder|BackOrder|"
+                             r"LimitedAvailability|InStoreOnly|OnlineOnly)")
+IN_STOCK = {"InStock", "LimitedAvailability", "InStoreOnly", "OnlineOnly"}
+
+
+def parse_amount(text):
+    # "1,299.00", "1.299,00", "1,299", "1299" -> 1299.0, "19.9" -> 19.9: the
+    # last separator is the decimal one unless exactly three digits follow
+    # it, and every other separator groups thousands.
+    text = text.strip(".,")
+    last = max(text.rfind("."), text.rfind(","))
+    if last != -1 and len(text) - last - 1 != 3:
+        whole, cents = text[:last], text[last + 1:]
+    else:
+        whole, cents = text, "0"
+    whole = whole.replace(",", "").replace(".", "")
+    try:
+        return float(f"{whole or 0}.{cents}")
+    except ValueError:
+        return None
+
+
+def extract_price(page):
+    # (price or None, True / False / None for in stock / not / unknown)
+    price = None
+    for pattern in PRICE_PATTERNS:
+        match = pattern.search(page)
+        if match:
+            price = parse_amount(match.group(1))
+            if price is not None:
+                break
+    match = AVAILABILITY_RE.search(page)
+    available = None if match is None else match.group(1) in IN_STOCK
+    return price, available
+
+
+def fetch_page(url, timeout=FETCH_TIMEOUT):
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        raw = response.read(MAX_PAGE_BYTES)
+        charset = response.headers.get_content_charset() or "utf-8"
+    return raw.decode(charset, "replace")
+
+
+def sample_prices(urls, fetch=fetch_page, workers=SAMPLE_WORKERS, progress=None):
+    # Fetches the pages `workers` at a time. Returns ([(url, time, price,
+    # available)], [(url, error)]); `progress` is called after each url.
+    samples, failed = [], []
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        futures = {pool.submit(fetch, url): url for url in dict.fromkeys(urls)}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                price, available = extract_price(future.result())
+                samples.append((url, int(time.time()), price, available))
+            except Exception as e:
+                failed.append((url, e))
+            if progress:
+                progress()
+    return samples, failed
+
+
+def sparkline(values, width):
+    # One block character per bucket of samples, scaled between the lowest
+    # and highest value; gaps (NaN) are left out.
+    values = [value for value in values if value == value]
+    if not values:
+        return ""
+    if len(values) > width:
+        step = len(values) / width
+        values = [sum(chunk) / len(chunk) for chunk in
+                  (values[int(i * step):max(int(i * step) + 1, int((i + 1) * step))] for i in range(width))]
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARS[len(SPARK_CHARS) // 2 - 1] * len(values)
+    top = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[round((value - low) / (high - low) * top)] for value in values)
+
+
+def _column(code, raw, start, count):
+    values = array(code)
+    values.frombytes(raw[start:start + count * values.itemsize])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _column_bytes(code, values):
+    column = array(code, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+class PriceSeries:
+    # The samples of one url as parallel arrays, plus running aggregates
+    # so `drops` never has to look at the samples.
+
+    __slots__ = ("times", "prices", "available", "low", "high", "last", "last_time", "spark")
+
+    def __init__(self):
+        self.times = array("I")
+        self.prices = array("d")
+        self.available = array("b")
+        self.low = self.high = self.last = None
+        self.last_time = 0
+        # (sample count, width, text) of the last sparkline drawn
+        self.spark = None
+
+    def add(self, when, price, available):
+        self.times.append(when)
+        self.available.append(available)
+        self.last_time = max(self.last_time, when)
+        if price != price:
+            self.prices.append(math.nan)
+            return
+        self.prices.append(price)
+        self.last = price
+        if self.low is None or price < self.low:
+            self.low = price
+        if self.high is None or price > self.high:
+            self.high = price
+
+    def range(self, start=None, end=None):
+        # [(time, price or None, available or None)] with start <= time < end.
+        first = 0 if start is None else bisect.bisect_left(self.times, start)
+        stop = len(self.times) if end is None else bisect.bisect_left(self.times, end)
+        return [(self.times[i], self.prices[i] if self.prices[i] == self.prices[i] else None,
+                 None if self.available[i] < 0 else bool(self.available[i])) for i in range(first, stop)]
+
+    def sparkline(self, width):
+        if self.spark is None or self.spark[:2] != (len(self.times), width):
+            self.spark = (len(self.times), width, sparkline(self.prices, width))
+        return self.spark[2]
+
+
+class PriceHistory:
+    # Observed prices per link url, kept in memory as columns and in an
+    # append-only binary file (see MAGIC and BLOCK): each sampling round
+    # appends one block, and loading reads the columns with
+    # array.frombytes instead of parsing record by record.
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.ids = {}
+        self.urls = []
+        self.series = []
+        self.last_round = 0
+        # Bytes of the file that hold complete blocks; anything after was
+        # cut off by a crash and is overwritten by the next append.
+        self.valid_size = 0
+        self._load()
+
+    def _define(self, url):
+        self.ids[url] = len(self.urls)
+        self.urls.append(url)
+        self.series.append(PriceSeries())
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, "rb") as f:
+            raw = f.read()
+        if not raw.startswith(MAGIC):
+            raise ValueError(f"{self.filename} is not a price history file")
+        pos = self.valid_size = len(MAGIC)
+        while pos + BLOCK.size <= len(raw):
+            kind, count = BLOCK.unpack_from(raw, pos)
+            pos += BLOCK.size
+            if kind == b"U":
+                urls = []
+                while len(urls) < count and pos + URL_LENGTH.size <= len(raw):
+                    (length,) = URL_LENGTH.unpack_from(raw, pos)
+                    pos += URL_LENGTH.size
+                    if pos + length > len(raw):
+                        break
+                    urls.append(raw[pos:pos + length].decode("utf-8"))
+                    pos += length
+                if len(urls) < count:
+                    break
+                for url in urls:
+                    self._define(url)
+            elif kind == b"S":
+                if pos + count * SAMPLE_SIZE > len(raw):
+                    break
+                columns = []
+                for code, size in SAMPLE_COLUMNS:
+                    columns.append(_column(code, raw, pos, count))
+                    pos += count * size
+                for url_id, when, price, available in zip(*columns):
+                    self.series[url_id].add(when, price, available)
+                if count:
+                    self.last_round = max(self.last_round, max(columns[1]))
+            else:
+                break
+            self.valid_size = pos
+
+    def record(self, samples):
+        # Appends [(url, time, price or None, available or None)] as one
+        # block (plus one naming urls seen for the first time).
+        if not samples:
+            return
+        new_urls = [url for url in dict.fromkeys(sample[0] for sample in samples) if url not in self.ids]
+        for url in new_urls:
+            self._define(url)
+        rows = [(self.ids[url], int(when), math.nan if price is None else float(price),
+                 -1 if available is None else int(bool(available))) for url, when, price, available in samples]
+        for url_id, when, price, available in rows:
+            self.series[url_id].add(when, price, available)
+            self.last_round = max(self.last_round, when)
+
+        parts = []
+        if new_urls:
+            parts.append(BLOCK.pack(b"U", len(new_urls)))
+            for url in new_urls:
+                encoded = url.encode("utf-8")[:0xFFFF]
+                parts.append(URL_LENGTH.pack(len(encoded)) + encoded)
+        parts.append(BLOCK.pack(b"S", len(rows)))
+        for i, (code, _) in enumerate(SAMPLE_COLUMNS):
+            parts.append(_column_bytes(code, [row[i] for row in rows]))
+        data = b"".join(parts)
+
+        exists = os.path.exists(self.filename)
+        with open(self.filename, "r+b" if exists else "wb") as f:
+            if exists:
+                f.truncate(self.valid_size)
+                f.seek(self.valid_size)
+            else:
+                f.write(MAGIC)
+                self.valid_size = len(MAGIC)
+            f.write(data)
+        self.valid_size += len(data)
+
+    def get(self, url):
+        url_id = self.ids.get(url)
+        return None if url_id is None else self.series[url_id]
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return bool(self.urls) and now - self.last_round >= SAMPLE_EVERY
+
+    def drops(self, percent):
+        # [(url, series, fall in %)] for urls whose last price is more than
+        # `percent` below the highest price seen (the high-water mark, not
+        # the previous sample), biggest fall first. `low` only tells the
+        # caller whether the last price is the lowest yet.
+        result = []
+        for url, series in zip(self.urls, self.series):
+            if series.last is None or not series.high:
+                continue
+            fall = (series.high - series.last) / series.high * 100
+            if fall > percent and fall > 0:
+                result.append((url, series, fall))
+        result.sort(key=lambda row: -row[2])
+        return result
+
+
+def format_price(price):
+    return "?" if price is None else f"{price:,.2f}"
+
+
+def prices_file(json_file):
+    return os.path.splitext(json_file)[0] + ".prices"
@@ -0,0 +1,342 @@
+import hashlib
+import html
+import itertools
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import LINKS_KEY, is_packed, link_desc, link_domain, link_url, subcategories, unpack_subtree
+from subtree_stats import build_stats, format_stats
+from tags import link_tags
+
+FORMAT = 1
+SITE_TITLE = "Product Links"
+# The search index is split into this many script files; an edit only
+# rewrites the one its category falls into.
+SEARCH_BUCKETS = 16
+# Below this many links to render, starting worker processes costs more
+# than it saves.
+POOL_MIN_LINKS = 50000
+CHUNK_LINKS = 20000
+STATE_DIR = ".publish"
+# Same result as catalog.link_domain for web links, without urlparse, which
+# took half of the rendering time.
+HOST_RE = re.compile(r"https?://(?:[^@/?#]*@)?(?:www\.)?([^/?#:]*)", re.IGNORECASE)
+
+STYLE = """\
+body { font: 15px/1.5 system-ui, sans-serif; margin: 0 auto; max-width: 60rem; padding: 0 1rem 3rem; color: #222; }
+header { display: flex; gap: 1rem; align-items: center; justify-content: space-between; padding: 1rem 0; border-bottom: 1px solid #ddd; }
+.crumbs a { color: #555; }
+#search { padding: .4rem .6rem; min-width: 16rem; font: inherit; }
+h1 { margin: 1.2rem 0 .2rem; }
+.summary, .count, .domain, .where { color: #777; font-size: .9em; }
+.tag { background: #eef; border-radius: 3px; padding: 0 .3rem; font-size: .85em; }
+ul { padding-left: 1.2rem; }
+li { margin: .15rem 0; }
+"""
+
+SEARCH_JS = """\
+// Client-side search over every link in the catalog. The index lives in
+// search/<n>.js, loaded the first time something is typed, so it also works
+// when the pages are opened straight from disk.
+var catalogSearch = {
+  entries: [],
+  add: function (shards) {
+    shards.forEach(function (shard) {
+      shard[2].forEach(function (link) {
+        catalogSearch.entries.push({
+          text: (link[0] + " " + link[1] + " " + link[2].join(" ") + " " + shard[0]).toLowerCase(),
+          desc: link[0] || link[1], url: link[1], where: shard[0] || "root", page: shard[1]
+        });
+      });
+    });
+  }
+};
+(function () {
+  var BUCKETS = %d, LIMIT = 200;
+  var box = document.getElementById("search");
+  var results = document.getElementById("results");
+  var page = document.getElementById("page");
+  var state = "new", waiting = 0;
+  function load() {
+    state = "loading";
+    waiting = BUCKETS;
+    for (var i = 0; i < BUCKETS; i++) {
+      var script = document.createElement("script");
+      script.src = "search/" + i + ".js";
+      script.onload = script.onerror = function () {
+        if (--waiting === 0) { state = "ready"; show(); }
+      };
+      document.body.appendChild(script);
+    }
+  }
+  function show() {
+    var terms = box.value.toLowerCase().split(/\\s+/).filter(Boolean);
+    results.textContent = "";
+    results.hidden = !terms.length;
+    page.hidden = !!terms.length;
+    if (!terms.length || state !== "ready") return;
+    var shown = 0;
+    for (var i = 0; i < catalogSearch.entries.length && shown < LIMIT; i++) {
+      var entry = catalogSearch.entries[i];
+      if (!terms.every(function (term) { return entry.text.indexOf(term) !== -1; })) continue;
+      var item = document.createElement("li");
+      var link = document.createElement("a");
+      // Only web links become clickable, as on the pages (_href).
+      if (/^https?:\\/\\//.test(entry.url)) link.href = entry.url;
+      link.rel = "noopener";
+      link.textContent = entry.desc;
+      var where = document.createElement("a");
+      where.href = entry.page;
+      where.className = "where";
+      where.textContent = entry.where;
+      item.append(link, " ", where);
+      results.appendChild(item);
+      shown++;
+    }
+    if (!shown) results.textContent = "No matching links.";
+  }
+  box.addEventListener("input", function () {
+    if (state === "new") load();
+    show();
+  });
+})();
+""" % SEARCH_BUCKETS
+
+
+def page_id(path):
+    return hashlib.sha1("/".join(path).encode("utf-8")).hexdigest()[:10]
+
+
+def page_file(path):
+    # Pages sit side by side in the site folder: a readable slug of the
+    # category name plus the path hash, since names repeat across the tree.
+    if not path:
+        return "index.html"
+    slug = re.sub(r"[^a-z0-9]+", "-", path[-1].lower()).strip("-")[:40] or "category"
+    return f"{slug}-{page_id(path)}.html"
+
+
+def bucket(pid):
+    return int(pid, 16) % SEARCH_BUCKETS
+
+
+def _write(filename, text):
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, filename)
+
+
+def _href(url):
+    # Only web links become clickable.
+    return html.escape(url) if url.startswith(("http://", "https://")) else None
+
+
+def _domain(url):
+    match = HOST_RE.match(url)
+    if match is None or match.group(1).startswith("["):
+        return link_domain(url)
+    return match.group(1).lower()
+
+
+def render_page(path, links, children, summary):
+    e = html.escape
+    crumbs = [f'<a href="index.html">🛒 {e(SITE_TITLE)}</a>']
+    for depth in range(1, len(path)):
+        crumbs.append(f'<a href="{page_file(path[:depth])}">{e(path[depth - 1])}</a>')
+    if path:
+        crumbs.append(f"<span>{e(path[-1])}</span>")
+    parts = [
+        "<!DOCTYPE html>",
+        '<html lang="en"><head><meta charset="utf-8">',
+        '<meta name="viewport" content="width=device-width, initial-scale=1">',
+        f"<title>{e(path[-1] if path else SITE_TITLE)}</title>",
+        '<link rel="stylesheet" href="site.css"></head><body>',
+        f'<header><nav class="crumbs">{" › ".join(crumbs)}</nav>',
+        '<input id="search" type="search" placeholder="Search all links…" autocomplete="off"></header>',
+        '<main><ol id="results" hidden></ol><div id="page">',
+        f"<h1>{e(path[-1] if path else SITE_TITLE)}</h1>",
+        f'<p class="summary">{e(summary)}</p>',
+    ]
+    if children:
+        parts.append('<h2>Categories</h2><ul class="categories">')
+        for name, filename, counts in children:
+            parts.append(f'<li>📁 <a href="{filename}">{e(name)}</a> <span class="count">({e(counts)})</span></li>')
+        parts.append("</ul>")
+    if links:
+        parts.append('<h2>Links</h2><ul class="links">')
+        for link in links:
+            url = link_url(link)
+            text = e(link_desc(link).strip() or url)
+            href = _href(url)
+            item = f'<a href="{href}" rel="noopener">{text}</a>' if href else text
+            domain = _domain(url) if href else ""
+            if domain:
+                item += f' <span class="domain">{e(domain)}</span>'
+            item += "".join(f' <span class="tag">#{e(tag)}</span>' for tag in link_tags(link))
+            parts.append(f"<li>{item}</li>")
+        parts.append("</ul>")
+    if not children and not links:
+        parts.append("<p>📭 Nothing here yet.</p>")
+    parts.append('</div></main><script src="search.js"></script></body></html>')
+    return "\n".join(parts) + "\n"
+
+
+def render_pages(out_dir, jobs):
+    # Writes the page and the search shard of each job; runs in worker
+    # processes for big builds.
+    shards = os.path.join(out_dir, STATE_DIR, "shards")
+    for path, pid, links, children, summary in jobs:
+        _write(os.path.join(out_dir, page_file(path)), render_page(path, links, children, summary))
+        entries = [[link_desc(link), link_url(link), link_tags(link)] for link in links]
+        shard = [" / ".join(path), page_file(path), entries]
+        _write(os.path.join(shards, pid + ".json"), json.dumps(shard, ensure_ascii=False, separators=(",", ":")))
+    return len(jobs)
+
+
+def _chunks(jobs):
+    # Groups of about CHUNK_LINKS links, so workers get even shares.
+    chunk, size = [], 0
+    for job in jobs:
+        chunk.append(job)
+        size += len(job[2]) + 1
+        if size >= CHUNK_LINKS:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+class SiteBuilder:
+    # Renders the catalog as a static site: one page per category with
+    # breadcrumbs, plus a search index split into SEARCH_BUCKETS scripts.
+    # Pages are keyed by the category's snapshot hash (see snapshots.py),
+    # which covers everything below it, so a category whose hash matches
+    # the last build is skipped together with its whole subtree: after one
+    # edit only the pages along the edited path are rendered again.
+
+    def __init__(self, catalog, stats, store, out_dir):
+        self.catalog = catalog
+        self.stats = stats
+        self.store = store
+        self.out_dir = out_dir
+        self.state_file = os.path.join(out_dir, STATE_DIR, "manifest.json")
+        # "a/b" -> [hash, file, page id, subcategory names]
+        self.pages = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("format") == FORMAT and state.get("buckets") == SEARCH_BUCKETS:
+            self.pages = state["pages"]
+
+    def _save(self):
+        _write(self.state_file, json.dumps({"format": FORMAT, "buckets": SEARCH_BUCKETS, "pages": self.pages},
+                                           ensure_ascii=False, separators=(",", ":")))
+
+    def _drop(self, key, dirty):
+        # Removes the pages of a category that is gone and of everything
+        # below it.
+        prefix = key + "/"
+        gone = [name for name in self.pages if name == key or name.startswith(prefix)]
+        for name in gone:
+            _, filename, pid, _ = self.pages.pop(name)
+            for target in (os.path.join(self.out_dir, filename),
+                           os.path.join(self.out_dir, STATE_DIR, "shards", pid + ".json")):
+                if os.path.exists(target):
+                    os.remove(target)
+            dirty.add(bucket(pid))
+        return len(gone)
+
+    def _collect(self, dirty):
+        jobs = []
+        removed = 0
+        stack = [((), self.catalog.data, self.store.root, self.stats.root)]
+        while stack:
+            path, node, mirror, node_stats = stack.pop()
+            key = "/".join(path)
+            old = self.pages.get(key)
+            if old is not None and old[0] == mirror.digest and os.path.exists(os.path.join(self.out_dir, old[1])):
+                continue
+            if is_packed(node):
+                # Rendered from a private copy; the catalog stays packed.
+                node = unpack_subtree(node)
+                mirror = self.store.hash_tree(node, persist=False)
+                node_stats = build_stats(node)
+            names = subcategories(node)
+            if any(name not in mirror.children for name in names):
+                mirror = self.store.hash_tree(node, persist=False)
+            if old is not None:
+                for name in set(old[3]) - set(names):
+                    removed += self._drop(key + "/" + name if key else name, dirty)
+            children = []
+            for name in names:
+                child_stats = node_stats.children.get(name) or build_stats(node[name])
+                children.append((name, page_file(path + (name,)), format_stats(child_stats)))
+                stack.append((path + (name,), node[name], mirror.children[name], child_stats))
+            pid = page_id(path)
+            jobs.append((path, pid, node.get(LINKS_KEY, []), children, format_stats(node_stats)))
+            self.pages[key] = [mirror.digest, page_file(path), pid, names]
+            dirty.add(bucket(pid))
+        return jobs, removed
+
+    def _write_buckets(self, dirty):
+        members = {number: [] for number in dirty}
+        for key, (_, _, pid, _) in self.pages.items():
+            number = bucket(pid)
+            if number in members:
+                members[number].append((key, pid))
+        shards = os.path.join(self.out_dir, STATE_DIR, "shards")
+        for number, pages in members.items():
+            texts = []
+            for _, pid in sorted(pages):
+                with open(os.path.join(shards, pid + ".json"), encoding="utf-8") as f:
+                    texts.append(f.read())
+            _write(os.path.join(self.out_dir, "search", f"{number}.js"), "catalogSearch.add([" + ",".join(texts) + "]);\n")
+
+    def _write_assets(self):
+        for name, text in (("site.css", STYLE), ("search.js", SEARCH_JS)):
+            filename = os.path.join(self.out_dir, name)
+            if os.path.exists(filename):
+                with open(filename, encoding="utf-8") as f:
+                    if f.read() == text:
+                        continue
+            _write(filename, text)
+
+    def build(self, workers=None, full=False):
+        # Returns {"rendered", "pages", "removed", "workers", "seconds"}.
+        start = time.perf_counter()
+        if full:
+            self.pages = {}
+        for folder in ("search", os.path.join(STATE_DIR, "shards")):
+            os.makedirs(os.path.join(self.out_dir, folder), exist_ok=True)
+        # Hashes only: publishing leaves the snapshot store as it was.
+        self.store.current_hash(persist=False)
+        dirty = set()
+        jobs, removed = self._collect(dirty)
+        used = 1
+        if workers != 1 and len(jobs) > 1 and sum(len(job[2]) for job in jobs) >= POOL_MIN_LINKS:
+            chunks = list(_chunks(jobs))
+            used = min(workers or os.cpu_count() or 1, len(chunks))
+        if used > 1:
+            with ProcessPoolExecutor(used) as pool:
+                for _ in pool.map(render_pages, itertools.repeat(self.out_dir), chunks):
+                    pass
+        else:
+            render_pages(self.out_dir, jobs)
+        self._write_buckets(dirty)
+        self._write_assets()
+        if jobs or removed:
+            self._save()
+        return {"rendered": len(jobs), "pages": len(self.pages), "removed": removed,
+                "workers": used, "seconds": time.perf_counter() - start}
+
+
+def site_dir(json_file):
+    return os.path.splitext(json_file)[0] + ".site"
@@ -0,0 +1,370 @@
+import bisect
+import heapq
+import re
+import time
+from datetime import datetime
+
+from catalog import link_desc, link_domain, link_meta, link_url
+from tags import PostingIndex, link_tags, normalize_tag
+
+WORD_RE = re.compile(r"\w+")
+HOST_RE = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*://(?:[^@/?#]*@)?([^:/?#]*)")
+TOKEN_RE = re.compile(r'\(|\)|(?:[^\s()"]|"[^"]*")+')
+TERM_RE = re.compile(r"^(domain|under|tag|desc|url|added|opened)(>=|<=|:|~|>|<)(.*)$", re.IGNORECASE)
+FIELD_OPS = {
+    "domain": (":",),
+    "under": (":",),
+    "tag": (":",),
+    "desc": ("~", ":"),
+    "url": ("~", ":"),
+    "added": (">", "<", ">=", "<="),
+    "opened": (">", "<", ">=", "<="),
+}
+UNITS = {"d": 86400, "w": 7 * 86400, "m": 30 * 86400, "y": 365 * 86400}
+
+
+def desc_words(link):
+    return sorted(set(WORD_RE.findall(link_desc(link).casefold())))
+
+
+def domain_keys(url):
+    # A host is indexed under itself and every parent domain, so
+    # domain:amazon.com also finds smile.amazon.com.
+    match = HOST_RE.match(url)
+    # urlparse is several times slower and this runs for every link.
+    host = match.group(1).lower().removeprefix("www.") if match else link_domain(url).lower()
+    parts = host.split(".")
+    return [".".join(parts[i:]) for i in range(len(parts) - 1)] or ([host] if host else [])
+
+
+def parse_time(text):
+    # 2026-10-19, 2026-10, 2026, today, or an age such as 7d / 2w / 3m / 1y.
+    text = text.strip().lower()
+    now = time.time()
+    if text == "today":
+        return time.mktime(time.localtime(now)[:3] + (0, 0, 0, 0, 0, -1))
+    match = re.fullmatch(r"(\d+)([dwmy])", text)
+    if match:
+        return now - int(match.group(1)) * UNITS[match.group(2)]
+    for fmt in ("%Y-%m-%d", "%Y-%m", "%Y"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown date '{text}' (use YYYY-MM-DD, YYYY-MM, today or 7d)")
+
+
+def parse_term(token):
+    match = TERM_RE.match(token)
+    if not match:
+        # A bare word searches the descriptions.
+        return ("term", "desc", "~", token)
+    field, op, value = match.group(1).lower(), match.group(2), match.group(3)
+    if op not in FIELD_OPS[field]:
+        raise ValueError(f"'{field}' takes {' or '.join(FIELD_OPS[field])}, not '{op}'")
+    if not value:
+        raise ValueError(f"Missing value after '{field}{op}'")
+    if field in ("added", "opened"):
+        value = parse_time(value)
+    elif field == "under":
+        value = tuple(part for part in value.split("/") if part)
+    elif field == "tag":
+        value = normalize_tag(value)
+    elif field == "domain":
+        value = value.lower().removeprefix("www.")
+    else:
+        value = value.casefold()
+    return ("term", field, op, value)
+
+
+def parse_query(text):
+    # expr := and ("or" and)* ; and := unary (["and"] unary)* ;
+    # unary := ("not" | "-") unary | "(" expr ")" | term
+    tokens = [token.replace('"', "") for token in TOKEN_RE.findall(text)]
+    pos = 0
+
+    def peek():
+        return tokens[pos].lower() if pos < len(tokens) else None
+
+    def parse_or():
+        nonlocal pos
+        children = [parse_and()]
+        while peek() in ("or", "|"):
+            pos += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and():
+        nonlocal pos
+        children = [parse_unary()]
+        while peek() not in (None, "or", "|", ")"):
+            if peek() == "and":
+                pos += 1
+            children.append(parse_unary())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_unary():
+        nonlocal pos
+        token = peek()
+        if token is None:
+            raise ValueError("Query ended too early")
+        if token == "not":
+            pos += 1
+            return ("not", parse_unary())
+        if token == "(":
+            pos += 1
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError("Missing ')'")
+            pos += 1
+            return node
+        if token == ")":
+            raise ValueError("Unexpected ')'")
+        pos += 1
+        raw = tokens[pos - 1]
+        if raw.startswith("-") and len(raw) > 1:
+            return ("not", parse_term(raw[1:]))
+        return parse_term(raw)
+
+    if not tokens:
+        raise ValueError("Empty query")
+    node = parse_or()
+    if pos != len(tokens):
+        raise ValueError(f"Unexpected '{tokens[pos]}'")
+    return node
+
+
+def format_query(node):
+    kind = node[0]
+    if kind == "term":
+        _, field, op, value = node
+        if field in ("added", "opened"):
+            value = time.strftime("%Y-%m-%d %H:%M", time.localtime(value))
+        elif field == "under":
+            value = "/" + "/".join(value)
+        return f"{field}{op}{value}"
+    if kind == "not":
+        return f"not {format_query(node[1])}"
+    joiner = " and " if kind == "and" else " or "
+    return "(" + joiner.join(format_query(child) for child in node[1]) + ")"
+
+
+def matches(node, link, path):
+    kind = node[0]
+    if kind == "and":
+        return all(matches(child, link, path) for child in node[1])
+    if kind == "or":
+        return any(matches(child, link, path) for child in node[1])
+    if kind == "not":
+        return not matches(node[1], link, path)
+    _, field, op, value = node
+    if field == "domain":
+        return value in domain_keys(link_url(link))
+    if field == "under":
+        return tuple(path()[:len(value)]) == value
+    if field == "tag":
+        return value in link_tags(link)
+    if field == "desc":
+        return value in link_desc(link).casefold()
+    if field == "url":
+        return value in link_url(link).casefold()
+    stamp = link_meta(link).get(field, 0)
+    if op == ">":
+        return stamp > value
+    if op == ">=":
+        return stamp >= value
+    if op == "<":
+        return stamp < value
+    return stamp <= value
+
+
+def link_keys(link):
+    keys = ["*"]
+    keys.extend("d:" + domain for domain in domain_keys(link_url(link)))
+    keys.extend("w:" + word for word in desc_words(link))
+    keys.extend("t:" + tag for tag in link_tags(link))
+    return keys
+
+
+class LinkIndex(PostingIndex):
+    # Every link, keyed by host ("d:"), description word ("w:") and tag
+    # ("t:"), plus a list of (added, id) sorted by time for range queries.
+
+    def __init__(self, catalog):
+        self.added = []
+        self.added_at = {}
+        self._vocabulary = None
+        self._loading = True
+        super().__init__(catalog, link_keys)
+        self._loading = False
+        self.added.sort()
+
+    def keys_before(self, event, info):
+        if event == "link_tagged":
+            keys = [key for key in self.keys(info["link"]) if not key.startswith("t:")]
+            return keys + ["t:" + tag for tag in info["before"]]
+        return self.keys(info["before"])
+
+    def _register(self, link, ref, keys=None, position=None):
+        size = len(self.postings)
+        link_id = super()._register(link, ref, keys, position)
+        if len(self.postings) != size:
+            self._vocabulary = None
+        entry = (link_meta(link).get("added", 0), link_id)
+        self.added_at[link_id] = entry[0]
+        if self._loading:
+            self.added.append(entry)
+        else:
+            bisect.insort(self.added, entry)
+        return link_id
+
+    def _unregister(self, link_id, keys=None, link=None):
+        size = len(self.postings)
+        super()._unregister(link_id, keys, link)
+        if len(self.postings) != size:
+            self._vocabulary = None
+        entry = (self.added_at.pop(link_id), link_id)
+        i = bisect.bisect_left(self.added, entry)
+        if i < len(self.added) and self.added[i] == entry:
+            del self.added[i]
+
+    def word_postings(self, text):
+        # Posting lists of every word containing `text`. A run of word
+        # characters only ever matches inside one word, and there are far
+        # fewer words than links to look through.
+        if self._vocabulary is None:
+            self._vocabulary = [key[2:] for key in self.postings if key.startswith("w:")]
+        return [self.postings["w:" + word] for word in self._vocabulary if text in word]
+
+    def find_ref(self, path):
+        ref = self.root
+        for name in path:
+            ref = ref.children.get(name)
+            if ref is None:
+                return None
+        return ref
+
+
+def _merge_ids(lists):
+    last = None
+    for link_id in heapq.merge(*lists):
+        if link_id != last:
+            yield link_id
+            last = link_id
+
+
+class Plan:
+    # How to get candidate ids: `ids()` yields them, `estimate` is how many
+    # it will yield at most and `label` says which index is used.
+
+    def __init__(self, estimate, ids, label, alternatives=()):
+        self.estimate = estimate
+        self.ids = ids
+        self.label = label
+        self.alternatives = alternatives
+
+
+class QueryEngine:
+    # Parses a query, picks the most selective index to produce candidates
+    # and checks each candidate against the whole query while streaming.
+    # The link index is only built the first time a query runs.
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.index = None
+
+    def _index(self):
+        if self.index is None:
+            self.index = LinkIndex(self.catalog)
+        return self.index
+
+    def _plan(self, node):
+        index = self.index
+        kind = node[0]
+        if kind == "and":
+            plans = [plan for plan in (self._plan(child) for child in node[1]) if plan]
+            if not plans:
+                return None
+            plans.sort(key=lambda plan: plan.estimate)
+            best = plans[0]
+            return Plan(best.estimate, best.ids, best.label, plans[1:])
+        if kind == "or":
+            plans = [self._plan(child) for child in node[1]]
+            if not all(plans):
+                return None
+
+            def union_ids():
+                seen = set()
+                for plan in plans:
+                    for link_id in plan.ids():
+                        if link_id not in seen:
+                            seen.add(link_id)
+                            yield link_id
+            return Plan(sum(plan.estimate for plan in plans), union_ids, " + ".join(plan.label for plan in plans))
+        if kind == "not":
+            return None
+
+        _, field, op, value = node
+        text = format_query(node)
+        if field in ("domain", "tag"):
+            posting = index.postings.get(("d:" if field == "domain" else "t:") + value, [])
+            name = "host index" if field == "domain" else "tag index"
+            return Plan(len(posting), lambda: iter(posting), f"{name} [{text}]")
+        if field == "desc" and WORD_RE.fullmatch(value):
+            lists = index.word_postings(value)
+            return Plan(sum(len(ids) for ids in lists), lambda: _merge_ids(lists), f"word index [{text}]")
+        if field == "under":
+            ref = index.find_ref(value)
+            if ref is None:
+                return Plan(0, lambda: iter(()), f"path prefix [{text}]")
+            refs = list(ref.walk())
+            return Plan(sum(len(r.link_ids) for r in refs), lambda: (i for r in refs for i in r.link_ids), f"path prefix [{text}]")
+        if field == "added":
+            if op in (">", "<="):
+                split = bisect.bisect_right(index.added, (value, float("inf")))
+            else:
+                split = bisect.bisect_left(index.added, (value,))
+            lo, hi = (split, len(index.added)) if op in (">", ">=") else (0, split)
+            entries = index.added
+            return Plan(hi - lo, lambda: (entries[i][1] for i in range(lo, hi)), f"date range [{text}]")
+        return None
+
+    def prepare(self, text):
+        # Returns (parsed query, plan); raises ValueError for bad queries.
+        node = parse_query(text)
+        index = self._index()
+        plan = self._plan(node)
+        if plan is None:
+            everything = index.postings.get("*", [])
+            plan = Plan(len(everything), lambda: iter(everything), "full scan")
+        return node, plan
+
+    def run(self, text):
+        node, plan = self.prepare(text)
+        return self._stream(node, plan)
+
+    def _stream(self, node, plan):
+        index = self.index
+        # Candidates in packed categories are read from the packed data.
+        cache = {}
+        for link_id in plan.ids():
+            entry = index.entries.get(link_id)
+            if entry is None:
+                continue
+            link, ref = entry
+            if link is None:
+                link = index.resolve(link_id, cache)[1]
+            if matches(node, link, ref.path):
+                yield ref.path(), link
+
+    def explain(self, text):
+        node, plan = self.prepare(text)
+        total = len(self.index.postings.get("*", []))
+        lines = [
+            f"query: {format_query(node)}",
+            f"plan:  {plan.label} → ~{plan.estimate} of {total} links",
+        ]
+        for other in plan.alternatives:
+            lines.append(f"       (skipped {other.label}, ~{other.estimate})")
+        lines.append("then:  every candidate is checked against the whole query")
+        return lines
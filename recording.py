@@ -0,0 +1,330 @@
+import asyncio
+import curses
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+
+from catalog import Catalog
+from codec import JsonCodec, load_file
+from snapshots import SnapshotStore
+
+MAGIC = b"OCTR\x01"
+# The file starts with MAGIC and a length-prefixed JSON header, then one
+# record per command or key batch: its kind ("C" a main.py command, "K" TUI
+# keys), seconds since the recording started, seconds it took (handling
+# plus the redraw or listing refresh after it) and the payload length,
+# followed by the payload: the command as UTF-8 or the key codes as int32.
+HEADER_LENGTH = struct.Struct("<I")
+RECORD = struct.Struct("<cdfI")
+FLUSH_EVERY = 1.0
+KEY_NAMES = {
+    curses.KEY_UP: "↑", curses.KEY_DOWN: "↓", curses.KEY_LEFT: "←", curses.KEY_RIGHT: "→",
+    curses.KEY_HOME: "Home", curses.KEY_END: "End", curses.KEY_BACKSPACE: "Backspace", curses.KEY_DC: "Del",
+    curses.KEY_ENTER: "Enter", curses.KEY_RESIZE: "Resize", 9: "Tab", 10: "Enter", 13: "Enter", 27: "Esc",
+    32: "Space", 127: "Backspace",
+}
+
+
+def record_arg(argv):
+    # The trace file asked for with `--record [file]`, or None.
+    if "--record" not in argv:
+        return None
+    i = argv.index("--record")
+    if i + 1 < len(argv) and not argv[i + 1].startswith("--"):
+        return argv[i + 1]
+    return time.strftime("session-%Y%m%d-%H%M%S.trace")
+
+
+class Recorder:
+    # Writes what the user does to a trace file: begin a command or key
+    # batch, then end() once it has been handled and the screen is up to
+    # date, so the recorded time is what the user waited.
+
+    def __init__(self, filename, source, root=None, snapshots=None, catalog=None):
+        self.filename = filename
+        self.file = open(filename, "wb")
+        header = json.dumps({
+            "source": source,
+            "started": time.time(),
+            "root": root,
+            "snapshots": snapshots and os.path.abspath(snapshots),
+            "catalog": catalog and os.path.abspath(catalog),
+        }).encode("utf-8")
+        self.file.write(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+        self.started = time.perf_counter()
+        self.last_flush = self.started
+        self.pending = None
+        self.count = 0
+
+    def command(self, text):
+        self.end()
+        self.pending = (b"C", time.perf_counter(), text.encode("utf-8"))
+
+    def keys(self, keys):
+        self.end()
+        codes = array("i", keys)
+        if sys.byteorder == "big":
+            codes.byteswap()
+        self.pending = (b"K", time.perf_counter(), codes.tobytes())
+
+    def end(self):
+        if self.pending is None:
+            return
+        kind, began, payload = self.pending
+        self.pending = None
+        now = time.perf_counter()
+        count = len(payload) // 4 if kind == b"K" else len(payload)
+        self.file.write(RECORD.pack(kind, began - self.started, now - began, count) + payload)
+        self.count += 1
+        if now - self.last_flush >= FLUSH_EVERY:
+            self.file.flush()
+            self.last_flush = now
+
+    def close(self):
+        self.end()
+        self.file.close()
+
+
+def read_trace(filename):
+    # (header, [(kind, time, seconds, command text or key list)]); a record
+    # cut off at the end of the file is dropped.
+    with open(filename, "rb") as f:
+        raw = f.read()
+    if not raw.startswith(MAGIC):
+        raise ValueError(f"{filename} is not a session trace")
+    pos = len(MAGIC)
+    (length,) = HEADER_LENGTH.unpack_from(raw, pos)
+    pos += HEADER_LENGTH.size
+    header = json.loads(raw[pos:pos + length].decode("utf-8"))
+    pos += length
+    events = []
+    while pos + RECORD.size <= len(raw):
+        kind, when, seconds, count = RECORD.unpack_from(raw, pos)
+        pos += RECORD.size
+        size = count * 4 if kind == b"K" else count
+        if pos + size > len(raw):
+            break
+        if kind == b"K":
+            payload = array("i")
+            payload.frombytes(raw[pos:pos + size])
+            if sys.byteorder == "big":
+                payload.byteswap()
+            payload = payload.tolist()
+        else:
+            payload = raw[pos:pos + size].decode("utf-8")
+        pos += size
+        events.append((kind.decode("ascii"), when, seconds, payload))
+    return header, events
+
+
+def load_start(header, json_file=None):
+    # The catalog as it was when recording started: read back from the
+    # snapshot store (both front ends snapshot on start), or from
+    # `json_file` if given.
+    if json_file:
+        return load_file(json_file)
+    if not header.get("root") or not header.get("snapshots"):
+        raise ValueError("the trace does not name a snapshot; give the catalog file")
+    store = SnapshotStore(Catalog({}), header["snapshots"])
+    try:
+        return store.load_tree(header["root"]), JsonCodec()
+    except OSError:
+        raise ValueError("the starting snapshot is gone (gc?); give the catalog file")
+
+
+def key_label(tui, mode, keys):
+    # Groups key batches into operations: "browse ↓", "adding type", ...
+    if keys[:len(tui.PASTE_START)] == list(tui.PASTE_START):
+        label = "paste"
+    elif all(key in tui.NAV_KEYS for key in keys):
+        label = "↑↓" if len(set(keys)) > 1 else KEY_NAMES[keys[0]]
+    elif mode in tui.TEXT_MODES and all(32 <= key < 127 or key > 255 for key in keys):
+        label = "type"
+    elif keys[0] in KEY_NAMES:
+        label = KEY_NAMES[keys[0]]
+    elif 32 < keys[0] < 0x110000:
+        label = chr(keys[0])
+    else:
+        label = f"key {keys[0]}"
+    return f"{mode} {label}"
+
+
+class NoBrowser:
+    # Stands in for webbrowser while replaying, so no tabs are opened.
+
+    @staticmethod
+    def open_new_tab(url):
+        return True
+
+
+def fetch_kind(command):
+    # "prices" or "archive" for main.py commands that go out to the shops,
+    # which a replay skips; None for everything else.
+    args = command.split()
+    if args[:1] == ["prices"] and args[1:2] in (["sample"], ["refresh"]):
+        return "prices"
+    if args[:1] == ["archive"] and args[1:2] not in (["open"], ["versions"]):
+        return "archive"
+    return None
+
+
+def _pace(speed, started, when):
+    if speed == "original":
+        delay = started + when - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def replay_commands(events, data, codec, speed="max"):
+    # Runs main_loop on `data` with the recorded commands as input, minus
+    # price checks and page archiving (see fetch_kind). Returns
+    # ([(operation, recorded seconds, replayed seconds)], {kind: skipped}).
+    import main as cli
+
+    commands = [event for event in events if event[0] == "C"]
+    results = []
+    skipped = {"prices": 0, "archive": 0}
+    state = {"next": 0, "current": None}
+    started = time.perf_counter()
+
+    def replay_input(prompt=""):
+        now = time.perf_counter()
+        if state["current"] is not None:
+            operation, recorded, began = state["current"]
+            results.append((operation, recorded, now - began))
+            state["current"] = None
+        while state["next"] < len(commands) and fetch_kind(commands[state["next"]][3]):
+            skipped[fetch_kind(commands[state["next"]][3])] += 1
+            state["next"] += 1
+        if state["next"] >= len(commands):
+            raise KeyboardInterrupt
+        _, when, recorded, text = commands[state["next"]]
+        state["next"] += 1
+        _pace(speed, started, when)
+        state["current"] = (text.split(" ", 1)[0] or "(empty)", recorded, time.perf_counter())
+        return text
+
+    # main_loop's input() finds this module global before the builtin;
+    # readline is left out so completion does not hook the terminal.
+    saved = cli.webbrowser, cli.readline
+    cli.input, cli.webbrowser, cli.readline = replay_input, NoBrowser, None
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    try:
+        cli.main_loop(data, codec)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        del cli.input
+        cli.webbrowser, cli.readline = saved
+    # `exit` ends main_loop without asking for another command.
+    if state["current"] is not None:
+        operation, recorded, began = state["current"]
+        results.append((operation, recorded, time.perf_counter() - began))
+    return results, skipped
+
+
+def replay_keys(events, data, speed="max", codec=None):
+    # Feeds the recorded key batches to a headless TUI on `data`, each
+    # followed by a redraw, as run() does. The TUI saves and snapshots to
+    # its scratch directory in the background; those jobs finish before
+    # the next batch is timed. Price checks and page archiving are skipped.
+    # Returns the same as replay_commands.
+    from headless import FakeScreen, headless_class, load_tui, make_app
+
+    tui = load_tui()
+    tui.webbrowser = NoBrowser
+    skipped = {"prices": 0, "archive": 0}
+
+    class ReplayTUI(headless_class(tui, data, saving=True)):
+        def sample_prices(self, urls, label=None):
+            skipped["prices"] += 1
+            self.show_status("⏭️ Price check skipped in replay")
+
+        def handle_archive(self):
+            skipped["archive"] += 1
+            self.show_status("⏭️ Archiving skipped in replay")
+
+    results = []
+
+    async def run():
+        app = make_app(tui, data, FakeScreen(), cls=ReplayTUI)
+        if codec is not None:
+            app.codec = codec
+        app.clipboard.disable("replay")
+        started = time.perf_counter()
+        try:
+            app.draw_display()
+            for kind, when, recorded, keys in events:
+                if kind != "K" or not keys:
+                    continue
+                _pace(speed, started, when)
+                operation = key_label(tui, app.mode, keys)
+                began = time.perf_counter()
+                app.dispatch_batch(keys)
+                app.draw_display()
+                results.append((operation, recorded, time.perf_counter() - began))
+                while app.jobs:
+                    await asyncio.sleep(0.001)
+                if not app.running:
+                    break
+        finally:
+            app.clipboard.stop()
+
+    asyncio.run(run())
+    return results, skipped
+
+
+def replay(filename, json_file=None, speed="max"):
+    # Replays a trace in a scratch directory, so nothing the session
+    # writes (products.json, snapshots, history) touches the real files.
+    header, events = read_trace(filename)
+    data, codec = load_start(header, json_file)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            started = time.perf_counter()
+            if header["source"] == "tui":
+                results, skipped = replay_keys(events, data, speed, codec)
+            else:
+                results, skipped = replay_commands(events, data, codec, speed)
+            wall = time.perf_counter() - started
+        finally:
+            os.chdir(cwd)
+    return summarize(header, results, wall, skipped)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def latency(values):
+    values = sorted(values)
+    return {"p50": percentile(values, 0.5), "p90": percentile(values, 0.9),
+            "p99": percentile(values, 0.99), "max": values[-1], "total": sum(values)}
+
+
+def summarize(header, results, wall, skipped=None):
+    operations = {}
+    for operation, recorded, replayed in results:
+        operations.setdefault(operation, ([], []))
+        operations[operation][0].append(recorded)
+        operations[operation][1].append(replayed)
+    busy = sum(replayed for _, _, replayed in results)
+    return {
+        "source": header["source"],
+        "operations": len(results),
+        "wall_s": wall,
+        "busy_s": busy,
+        "ops_per_s": len(results) / busy if busy else 0.0,
+        "skipped": skipped or {},
+        "by_operation": {
+            name: {"count": len(replayed), "recorded": latency(recorded), "replayed": latency(replayed)}
+            for name, (recorded, replayed) in sorted(operations.items(), key=lambda item: -sum(item[1][1]))
+        },
+    }
@@ -0,0 +1,403 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+
+from catalog import ARCHIVE_KEY, LINKS_KEY, iter_links, link_desc, link_meta, link_url, unpack_subtree
+
+# Link metadata that changes when a link is used rather than edited. It is
+# left out of the stored objects, so opening links neither changes hashes
+# nor makes new versions.
+VOLATILE = ("opened",)
+
+
+def stable_link(link):
+    meta = link_meta(link)
+    if not any(key in meta for key in VOLATILE):
+        return link
+    return link[:2] + [{key: value for key, value in meta.items() if key not in VOLATILE}] + link[3:]
+
+
+def link_content(link):
+    # What an edit can change; links with equal content are the same link.
+    if link is None:
+        return None
+    return link_url(link), link_desc(link), tuple(link_meta(link).get("tags", []))
+
+
+def pair_links(old_links, new_links):
+    # Yields (index, before, after) with before or after None for added and
+    # removed links. Links are keyed by url and occurrence, since a category
+    # can hold the same url more than once; index is the occurrence in
+    # new_links (old_links for removals). Identical links pair up first,
+    # then ones with the same content, so dropping one copy of a duplicate
+    # is not seen as editing the next.
+    old_groups, new_groups = {}, {}
+    for groups, links in ((old_groups, old_links), (new_groups, new_links)):
+        for link in links:
+            groups.setdefault(link_url(link), []).append(link)
+    for url in dict.fromkeys(list(new_groups) + list(old_groups)):
+        old, new = old_groups.get(url, []), new_groups.get(url, [])
+        old_left, new_left, pairs = list(range(len(old))), list(range(len(new))), []
+        for same in (lambda x, y: x == y, lambda x, y: link_content(x) == link_content(y)):
+            for j in list(new_left):
+                match = next((i for i in old_left if same(old[i], new[j])), None)
+                if match is not None:
+                    old_left.remove(match)
+                    new_left.remove(j)
+                    pairs.append((match, j))
+        pairs.extend(zip(old_left, new_left))
+        for i, j in pairs:
+            yield j, old[i], new[j]
+        for j in new_left[len(old_left):]:
+            yield j, None, new[j]
+        for i in old_left[len(new_left):]:
+            yield i, old[i], None
+
+
+def encode_object(links, children):
+    # Canonical form of one category: its links (without VOLATILE metadata)
+    # plus (name, hash) for each child in order. Equal subtrees therefore
+    # always get equal hashes.
+    obj = {"l": [stable_link(link) for link in links], "c": [[name, digest] for name, digest in children]}
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+class HashNode:
+    # Cached hash of one category; None means something below changed.
+
+    __slots__ = ("digest", "children")
+
+    def __init__(self):
+        self.digest = None
+        self.children = {}
+
+
+def copy_hashes(node):
+    copy = HashNode()
+    copy.digest = node.digest
+    copy.children = {name: copy_hashes(child) for name, child in node.children.items()}
+    return copy
+
+
+class SnapshotStore:
+    # Content-addressed object store: every category is written as one
+    # object named after its Merkle hash, so a snapshot only writes the
+    # categories whose hash changed since the last one, i.e. the edited
+    # node and its ancestors. versions.jsonl lists the root hash of each
+    # snapshot.
+
+    def __init__(self, catalog, directory):
+        self.catalog = catalog
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.log_file = os.path.join(directory, "versions.jsonl")
+        self.root = HashNode()
+        self.known = set()
+        self.versions = self._load_versions()
+        catalog.subscribe(self)
+
+    def _load_versions(self):
+        versions = []
+        if os.path.exists(self.log_file):
+            with open(self.log_file, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        versions.append(json.loads(line))
+        return versions
+
+    def _mirror(self, path, create=True):
+        node = self.root
+        for name in path:
+            child = node.children.get(name)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[name] = HashNode()
+            node = child
+        return node
+
+    def _invalidate(self, path):
+        node = self.root
+        node.digest = None
+        for name in path:
+            node = node.children.setdefault(name, HashNode())
+            node.digest = None
+
+    def catalog_changed(self, event, path, info):
+        if event in ("node_replaced", "link_opened"):
+            # Copy-on-write clone, or only VOLATILE metadata changed: the
+            # hash stays.
+            return
+        if event == "category_swapped":
+            # Packed or unpacked: the hash stays, the hashes below it are
+            # only needed again once something inside changes.
+            parent = self._mirror(path, create=False)
+            child = parent.children.get(info["name"]) if parent else None
+            if child is not None and ARCHIVE_KEY in info["subtree"]:
+                child.children = {}
+            return
+        if event in ("category_deleted", "category_moved", "category_replaced"):
+            parent = self._mirror(path, create=False)
+            moved = parent.children.pop(info["name"], None) if parent else None
+            if event == "category_moved" and moved is not None:
+                self._invalidate(info["dest"])
+                self._mirror(info["dest"]).children[info["new_name"]] = moved
+        elif event == "category_renamed":
+            parent = self._mirror(path, create=False)
+            if parent and info["name"] in parent.children:
+                parent.children[info["new_name"]] = parent.children.pop(info["name"])
+        elif event == "category_copied":
+            # The copy has the same content, so its cached hashes still hold.
+            self._invalidate(info["dest"])
+            source = self._mirror(path + (info["name"],), create=False)
+            if source is not None:
+                self._mirror(info["dest"]).children[info["new_name"]] = copy_hashes(source)
+            return
+        self._invalidate(path)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _write_object(self, digest, data):
+        if digest in self.known:
+            return False
+        target = self._object_path(digest)
+        self.known.add(digest)
+        if os.path.exists(target):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(data))
+        os.replace(tmp, target)
+        return True
+
+    def put_object(self, obj):
+        data = encode_object(obj["l"], obj["c"])
+        digest = hashlib.sha256(data).hexdigest()
+        self._write_object(digest, data)
+        return digest
+
+    def put_tree(self, node):
+        return self._hash(node, HashNode(), [])
+
+    def update(self, digest, path, change):
+        # Writes a copy of the tree rooted at `digest` in which `change` has
+        # been applied to the object at `path`; only the objects along the
+        # path are rewritten. `change` gets and returns {"l": ..., "c": ...}.
+        obj = self.read_object(digest)
+        if not path:
+            return self.put_object(change(obj))
+        children = dict(obj["c"])
+        if path[0] not in children:
+            obj["c"].append([path[0], self.put_object({"l": [], "c": []})])
+            children = dict(obj["c"])
+        updated = self.update(children[path[0]], path[1:], change)
+        obj["c"] = [[name, updated if name == path[0] else child] for name, child in obj["c"]]
+        return self.put_object(obj)
+
+    def hash_tree(self, node, persist=True):
+        # Hashes of a detached tree (e.g. an unpacked copy of a packed
+        # category) and every category below it, as HashNodes. With
+        # persist=False nothing is written to the store.
+        mirror = HashNode()
+        self._hash(node, mirror, [], persist)
+        return mirror
+
+    def node_hash(self, path):
+        # Hash of the current category at `path`, from the cached hashes.
+        node = self.catalog.node(path)
+        return self._hash(node, self._mirror(path), [])
+
+    def read_object(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+
+    def _hash(self, node, mirror, written, persist=True):
+        # A cached hash that was only computed (persist=False) and never
+        # written is worked out again when the objects are wanted.
+        if mirror.digest is not None and (mirror.digest in self.known or not persist):
+            return mirror.digest
+        if ARCHIVE_KEY in node:
+            # A packed category remembers its hash; if it has none, or its
+            # objects are gone from the store, hash the unpacked copy.
+            digest = node[ARCHIVE_KEY][0]
+            if digest is None or not os.path.exists(self._object_path(digest)):
+                digest = self._hash(unpack_subtree(node), mirror, written, persist)
+            else:
+                self.known.add(digest)
+            mirror.digest = digest
+            mirror.children = {}
+            return digest
+        children = []
+        names = set()
+        for name, child in node.items():
+            if name == LINKS_KEY or not isinstance(child, dict):
+                continue
+            names.add(name)
+            child_mirror = mirror.children.get(name)
+            if child_mirror is None:
+                child_mirror = mirror.children[name] = HashNode()
+            children.append((name, self._hash(child, child_mirror, written, persist)))
+        for name in [name for name in mirror.children if name not in names]:
+            del mirror.children[name]
+        data = encode_object(node.get(LINKS_KEY, []), children)
+        mirror.digest = hashlib.sha256(data).hexdigest()
+        if persist and self._write_object(mirror.digest, data):
+            written.append(mirror.digest)
+        return mirror.digest
+
+    def snapshot(self, links=None):
+        # Returns the new version, or None if nothing changed since the last.
+        written = []
+        root = self._hash(self.catalog.data, self.root, written)
+        if self.versions and self.versions[-1]["root"] == root:
+            return None
+        version = {
+            "id": self.versions[-1]["id"] + 1 if self.versions else 1,
+            "time": int(time.time()),
+            "root": root,
+            "objects": len(written),
+        }
+        if links is not None:
+            version["links"] = links
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(version) + "\n")
+        self.versions.append(version)
+        return version
+
+    def get_version(self, version_id):
+        for version in self.versions:
+            if version["id"] == version_id:
+                return version
+        raise KeyError(f"No version #{version_id}")
+
+    def current_hash(self, persist=True):
+        # Root hash of the catalog as it is now. This writes the objects of
+        # categories changed since the last snapshot, as snapshot() would,
+        # unless persist=False.
+        return self._hash(self.catalog.data, self.root, [], persist)
+
+    def find(self, digest, path):
+        # Hash of the category at `path` inside the tree rooted at `digest`.
+        for name in path:
+            children = dict(self.read_object(digest)["c"])
+            if name not in children:
+                return None
+            digest = children[name]
+        return digest
+
+    def load_tree(self, digest):
+        obj = self.read_object(digest)
+        node = {}
+        if obj["l"]:
+            node[LINKS_KEY] = obj["l"]
+        for name, child in obj["c"]:
+            node[name] = self.load_tree(child)
+        return node
+
+    def diff(self, old, new, path=()):
+        # Yields (change, path, detail). Subtrees whose hashes match are
+        # skipped without being read, so the cost follows the changes.
+        if old == new:
+            return
+        old_obj, new_obj = self.read_object(old), self.read_object(new)
+        for _, before, after in pair_links(old_obj["l"], new_obj["l"]):
+            if before is None:
+                yield "+", path, link_url(after)
+            elif after is None:
+                yield "-", path, link_url(before)
+            elif link_content(before) != link_content(after):
+                yield "~", path, link_url(after)
+        old_children, new_children = dict(old_obj["c"]), dict(new_obj["c"])
+        for name, digest in new_children.items():
+            if name not in old_children:
+                yield "+", path + (name,), None
+            else:
+                yield from self.diff(old_children[name], digest, path + (name,))
+        for name in old_children:
+            if name not in new_children:
+                yield "-", path + (name,), None
+
+    def restore(self, version_id, path):
+        # Puts the category at `path` back the way it was in a version.
+        version = self.get_version(version_id)
+        digest = self.find(version["root"], path)
+        if digest is None:
+            raise KeyError(f"'{'/'.join(path)}' did not exist in version #{version_id}")
+        tree = self.load_tree(digest)
+        _keep_opened(tree, self.catalog.node(path) if self.catalog.has_category(path) else {})
+        if path:
+            self.catalog.replace_category(path[:-1], path[-1], tree)
+            self._mirror(path).digest = digest
+            self.known.add(digest)
+            return
+        # Clear first so the categories come back in their original order.
+        current = self.catalog.data
+        for name in [name for name in current if name != LINKS_KEY]:
+            self.catalog.delete_category((), name)
+        for name, child in tree.items():
+            if name != LINKS_KEY:
+                self.catalog.replace_category((), name, child)
+        self.catalog.remove_links((), list(current.get(LINKS_KEY, [])))
+        if tree.get(LINKS_KEY):
+            self.catalog.copy_links(None, tree[LINKS_KEY], ())
+
+    def gc(self, keep=None):
+        # Drops all but the newest `keep` versions, then deletes every
+        # object no remaining version can reach. Returns (versions, objects)
+        # removed.
+        dropped = 0
+        if keep is not None and len(self.versions) > keep:
+            dropped = len(self.versions) - keep
+            self.versions = self.versions[dropped:]
+            tmp = self.log_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for version in self.versions:
+                    f.write(json.dumps(version) + "\n")
+            os.replace(tmp, self.log_file)
+
+        live = set()
+        stack = [version["root"] for version in self.versions]
+        stack.append(self.current_hash())
+        while stack:
+            digest = stack.pop()
+            if digest in live:
+                continue
+            live.add(digest)
+            if os.path.exists(self._object_path(digest)):
+                stack.extend(child for _, child in self.read_object(digest)["c"])
+
+        removed = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                folder = os.path.join(self.objects_dir, prefix)
+                for rest in os.listdir(folder):
+                    if prefix + rest not in live:
+                        os.remove(os.path.join(folder, rest))
+                        self.known.discard(prefix + rest)
+                        removed += 1
+        return dropped, removed
+
+
+def _keep_opened(tree, current):
+    # Stored links have no VOLATILE metadata; a restored link takes it from
+    # the current link with the same url, if there is one.
+    stamps = {}
+    for _, link in iter_links(current):
+        meta = link_meta(link)
+        if any(key in meta for key in VOLATILE):
+            stamps[link_url(link)] = {key: meta[key] for key in VOLATILE if key in meta}
+    for _, link in iter_links(tree):
+        if link_url(link) in stamps:
+            if len(link) < 3 or not isinstance(link[2], dict):
+                link[2:] = [{}]
+            link[2].update(stamps[link_url(link)])
+
+
+def snapshot_dir(json_file):
+    return os.path.splitext(json_file)[0] + ".snapshots"
@@ -0,0 +1,134 @@
+import bisect
+
+from catalog import LINKS_KEY, link_display, link_domain, link_meta, link_url
+
+SORT_MODES = ["insertion", "desc", "url", "added", "opened"]
+
+SORT_LABELS = {
+    "insertion": "as added",
+    "desc": "description",
+    "url": "domain / URL",
+    "added": "date added",
+    "opened": "last opened",
+}
+
+
+def sort_key(mode, link):
+    if mode == "desc":
+        return link_display(link).casefold()
+    if mode == "url":
+        url = link_url(link)
+        return (link_domain(url), url.casefold())
+    if mode == "added":
+        return link_meta(link).get("added", 0)
+    if mode == "opened":
+        # Most recently opened first; never-opened links sink to the bottom.
+        return -link_meta(link).get("opened", 0)
+    raise ValueError(f"Unknown sort mode: {mode}")
+
+
+class SortedView:
+    # Entries are (key, seq, link). seq is unique, so tuple comparison never
+    # reaches the link itself and equal keys keep their insertion order.
+
+    def __init__(self, mode, links):
+        self.mode = mode
+        self.entries = sorted((sort_key(mode, link), i, link) for i, link in enumerate(links))
+        self.next_seq = len(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [entry[2] for entry in self.entries[index]]
+        return self.entries[index][2]
+
+    def __iter__(self):
+        return (entry[2] for entry in self.entries)
+
+    def insert(self, link):
+        bisect.insort(self.entries, (sort_key(self.mode, link), self.next_seq, link))
+        self.next_seq += 1
+
+    def insert_many(self, links):
+        if len(links) <= 32:
+            for link in links:
+                self.insert(link)
+            return
+        for link in links:
+            self.entries.append((sort_key(self.mode, link), self.next_seq, link))
+            self.next_seq += 1
+        # The existing entries are already sorted, so this is mostly a merge.
+        self.entries.sort()
+
+    def remove_many(self, links):
+        doomed = {id(link) for link in links}
+        self.entries = [entry for entry in self.entries if id(entry[2]) not in doomed]
+
+    def remove(self, link, key=None):
+        if key is None:
+            key = sort_key(self.mode, link)
+        i = bisect.bisect_left(self.entries, (key,))
+        while i < len(self.entries) and self.entries[i][0] == key:
+            if self.entries[i][2] is link:
+                del self.entries[i]
+                return True
+            i += 1
+        return False
+
+    def update(self, link, before):
+        old_key = sort_key(self.mode, before)
+        if old_key == sort_key(self.mode, link):
+            return
+        self.remove(link, old_key)
+        self.insert(link)
+
+
+class SortIndex:
+    # Lazily builds one SortedView per (category, mode) the first time it is
+    # asked for, then keeps it current from catalog events.
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.views = {}
+        catalog.subscribe(self)
+
+    def view(self, path, mode):
+        if mode == "insertion":
+            return self.catalog.node(path).get(LINKS_KEY, [])
+        path = tuple(path)
+        by_mode = self.views.setdefault(path, {})
+        if mode not in by_mode:
+            by_mode[mode] = SortedView(mode, self.catalog.node(path).get(LINKS_KEY, []))
+        return by_mode[mode]
+
+    def catalog_changed(self, event, path, info):
+        if event == "link_added":
+            for view in self.views.get(path, {}).values():
+                view.insert(info["link"])
+        elif event == "link_removed":
+            for view in self.views.get(path, {}).values():
+                view.remove(info["link"])
+        elif event == "links_added":
+            for view in self.views.get(path, {}).values():
+                view.insert_many(info["links"])
+        elif event == "links_removed":
+            for view in self.views.get(path, {}).values():
+                view.remove_many(info["links"])
+        elif event == "node_replaced":
+            # The node was cloned for copy-on-write and holds new link
+            # objects; rebuild its views lazily.
+            self.views.pop(path, None)
+        elif event in ("link_edited", "link_opened"):
+            for view in self.views.get(path, {}).values():
+                view.update(info["link"], info["before"])
+        elif event in ("category_deleted", "category_replaced", "category_swapped"):
+            prefix = path + (info["name"],)
+            for key in [k for k in self.views if k[:len(prefix)] == prefix]:
+                del self.views[key]
+        elif event in ("category_renamed", "category_moved"):
+            prefix = path + (info["name"],)
+            new_prefix = info.get("dest", path) + (info["new_name"],)
+            for key in [k for k in self.views if k[:len(prefix)] == prefix]:
+                self.views[new_prefix + key[len(prefix):]] = self.views.pop(key)
@@ -0,0 +1,161 @@
+import time
+
+from catalog import ARCHIVE_KEY, LINKS_KEY, link_meta
+
+
+class NodeStats:
+    # Aggregates for one category and everything below it. `children`
+    # mirrors the category tree so renames and deletes are a single dict
+    # operation instead of a walk.
+
+    __slots__ = ("links", "subcategories", "modified", "children")
+
+    def __init__(self):
+        self.links = 0
+        self.subcategories = 0
+        self.modified = 0
+        self.children = {}
+
+
+def build_stats(node):
+    stats = NodeStats()
+    if ARCHIVE_KEY in node:
+        # Packed categories carry their totals; the per-subcategory stats
+        # are filled in when the category is unpacked.
+        _, stats.links, stats.subcategories, stats.modified, _ = node[ARCHIVE_KEY]
+        return stats
+    links = node.get(LINKS_KEY, [])
+    stats.links = len(links)
+    for link in links:
+        added = link_meta(link).get("added", 0)
+        if added > stats.modified:
+            stats.modified = added
+    for name, child in node.items():
+        if name == LINKS_KEY or not isinstance(child, dict):
+            continue
+        child_stats = build_stats(child)
+        stats.children[name] = child_stats
+        stats.links += child_stats.links
+        stats.subcategories += child_stats.subcategories + 1
+        stats.modified = max(stats.modified, child_stats.modified)
+    return stats
+
+
+def copy_stats(stats):
+    copy = NodeStats()
+    copy.links = stats.links
+    copy.subcategories = stats.subcategories
+    copy.modified = stats.modified
+    copy.children = {name: copy_stats(child) for name, child in stats.children.items()}
+    return copy
+
+
+class SubtreeStats:
+    # Recursive link/subcategory counts and last-modified times for every
+    # node, built once at load and then updated along the ancestor chain on
+    # each mutation, so reading a count is O(depth) at worst.
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.root = build_stats(catalog.data)
+        catalog.subscribe(self)
+
+    def get(self, path):
+        stats = self.root
+        for key in path:
+            stats = stats.children.get(key)
+            if stats is None:
+                return NodeStats()
+        return stats
+
+    def _ancestors(self, path):
+        stats = self.root
+        chain = [stats]
+        for key in path:
+            stats = stats.children.get(key)
+            if stats is None:
+                break
+            chain.append(stats)
+        return chain
+
+    def _apply(self, path, links=0, subcategories=0):
+        now = int(time.time())
+        chain = self._ancestors(path)
+        for stats in chain:
+            stats.links += links
+            stats.subcategories += subcategories
+            stats.modified = now
+        return chain[-1]
+
+    def catalog_changed(self, event, path, info):
+        if event == "link_added":
+            self._apply(path, links=1)
+        elif event == "link_removed":
+            self._apply(path, links=-1)
+        elif event == "links_added":
+            self._apply(path, links=len(info["links"]))
+        elif event == "links_removed":
+            self._apply(path, links=-len(info["links"]))
+        elif event == "link_edited":
+            self._apply(path)
+        elif event == "category_added":
+            parent = self._apply(path, subcategories=1)
+            child = NodeStats()
+            child.modified = parent.modified
+            parent.children[info["name"]] = child
+        elif event == "category_deleted":
+            parent = self.get(path)
+            removed = parent.children.pop(info["name"], None)
+            if removed is not None:
+                self._apply(path, links=-removed.links, subcategories=-(removed.subcategories + 1))
+        elif event == "category_moved":
+            moved = self.get(path).children.pop(info["name"], None)
+            if moved is not None:
+                self._apply(path, links=-moved.links, subcategories=-(moved.subcategories + 1))
+                parent = self._apply(info["dest"], links=moved.links, subcategories=moved.subcategories + 1)
+                parent.children[info["new_name"]] = moved
+        elif event == "category_copied":
+            source = self.get(path).children.get(info["name"])
+            if source is not None:
+                # Stats are per location, so unlike the nodes themselves they
+                # cannot be shared; this costs one object per category.
+                copied = copy_stats(source)
+                parent = self._apply(info["dest"], links=copied.links, subcategories=copied.subcategories + 1)
+                parent.children[info["new_name"]] = copied
+        elif event == "category_replaced":
+            parent = self.get(path)
+            removed = parent.children.pop(info["name"], None)
+            if removed is not None:
+                self._apply(path, links=-removed.links, subcategories=-(removed.subcategories + 1))
+            added = build_stats(info["subtree"])
+            parent = self._apply(path, links=added.links, subcategories=added.subcategories + 1)
+            parent.children[info["name"]] = added
+        elif event == "category_swapped":
+            stats = self.get(path).children.get(info["name"])
+            if stats is not None and ARCHIVE_KEY not in info["subtree"]:
+                stats.children = build_stats(info["subtree"]).children
+        elif event == "category_renamed":
+            parent = self._apply(path)
+            if info["name"] in parent.children:
+                parent.children[info["new_name"]] = parent.children.pop(info["name"])
+
+
+def format_stats(stats):
+    parts = [f"{stats.links} link{'s' if stats.links != 1 else ''}"]
+    if stats.subcategories:
+        parts.append(f"{stats.subcategories} sub{'s' if stats.subcategories != 1 else ''}")
+    return ", ".join(parts)
+
+
+def format_modified(stats):
+    if not stats.modified:
+        return "unknown"
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(stats.modified))
+
+
+def iter_tree(stats, max_depth=None, depth=0):
+    # Yields (depth, name, stats) for every category below `stats`.
+    for name, child in stats.children.items():
+        yield depth, name, child
+        if max_depth is None or depth + 1 < max_depth:
+            yield from iter_tree(child, max_depth, depth + 1)
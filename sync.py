@@ -0,0 +1,333 @@
+import json
+import os
+import time
+
+from catalog import LINKS_KEY, copy_link, link_meta, link_url
+from snapshots import link_content, pair_links
+
+DELTA_FORMAT = "onecart-delta/1"
+# Metadata stamped by use rather than by editing: it never makes two links
+# differ, and merging keeps the latest open and the earliest add.
+STAMPS = (("opened", max), ("added", min))
+
+
+def empty_tree(store):
+    return store.put_object({"l": [], "c": []})
+
+
+def load_base(store):
+    # Root hash of the state the other replicas are known to have.
+    state_file = os.path.join(store.directory, "sync.json")
+    if os.path.exists(state_file):
+        with open(state_file, encoding="utf-8") as f:
+            return json.load(f)["base"]
+    return empty_tree(store)
+
+
+def save_base(store, digest):
+    os.makedirs(store.directory, exist_ok=True)
+    state_file = os.path.join(store.directory, "sync.json")
+    with open(state_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"base": digest, "time": int(time.time())}, f)
+    os.replace(state_file + ".tmp", state_file)
+
+
+def _walk_changes(store, old, new, path, links, added, removed):
+    # Like SnapshotStore.diff, but keeps the link data and the hashes of
+    # whole categories that appeared or disappeared.
+    if old == new:
+        return
+    old_obj, new_obj = store.read_object(old), store.read_object(new)
+    for index, before, after in pair_links(old_obj["l"], new_obj["l"]):
+        if before is None:
+            links.append({"op": "add_link", "path": list(path), "index": index, "link": after})
+        elif after is None:
+            links.append({"op": "remove_link", "path": list(path), "index": index, "before": before})
+        elif link_content(before) != link_content(after):
+            links.append({"op": "edit_link", "path": list(path), "index": index, "before": before, "after": after})
+    old_children, new_children = dict(old_obj["c"]), dict(new_obj["c"])
+    for name, digest in new_children.items():
+        if name in old_children:
+            _walk_changes(store, old_children[name], digest, path + (name,), links, added, removed)
+        else:
+            added.append((path + (name,), digest))
+    for name, digest in old_children.items():
+        if name not in new_children:
+            removed.append((path + (name,), digest))
+
+
+def _related(store, old, new):
+    # Do two categories share at least one link or subcategory name?
+    old_obj, new_obj = store.read_object(old), store.read_object(new)
+    if {link_url(link) for link in old_obj["l"]} & {link_url(link) for link in new_obj["l"]}:
+        return True
+    return bool({name for name, _ in old_obj["c"]} & {name for name, _ in new_obj["c"]})
+
+
+def _pair_moves(store, added, removed):
+    # Pairs categories that disappeared with ones that appeared: identical
+    # contents first, then a rename within the same parent, then a move
+    # that kept the name. Unpaired entries stay in `added` / `removed`.
+    moves = []
+    by_hash = {}
+    for entry in removed:
+        by_hash.setdefault(entry[1], []).append(entry)
+    rest = []
+    for entry in added:
+        sources = by_hash.get(entry[1])
+        if sources:
+            source = sources.pop()
+            removed.remove(source)
+            moves.append((source, entry, True))
+        else:
+            rest.append(entry)
+    for key in (lambda path: path[:-1], lambda path: path[-1]):
+        unpaired = []
+        for entry in rest:
+            candidates = [source for source in removed if key(source[0]) == key(entry[0])]
+            if len(candidates) == 1 and _related(store, candidates[0][1], entry[1]):
+                removed.remove(candidates[0])
+                moves.append((candidates[0], entry, False))
+            else:
+                unpaired.append(entry)
+        rest = unpaired
+    added[:] = rest
+    return moves
+
+
+def compute_delta(store, base, head):
+    # Only subtrees whose hashes differ are read, so the work follows the
+    # number of changes. Moved or renamed categories become a single move
+    # plus whatever changed inside them.
+    links, added, removed = [], [], []
+    _walk_changes(store, base, head, (), links, added, removed)
+    ops = []
+    while added or removed:
+        nested_added, nested_removed = [], []
+        for (source, old_digest), (path, digest), same in _pair_moves(store, added, removed):
+            ops.append({"op": "move_category", "path": list(source), "to": list(path)})
+            if not same:
+                _walk_changes(store, old_digest, digest, path, links, nested_added, nested_removed)
+        for path, digest in added:
+            ops.append({"op": "add_category", "path": list(path), "hash": digest, "tree": store.load_tree(digest)})
+        for path, digest in removed:
+            ops.append({"op": "remove_category", "path": list(path), "hash": digest})
+        added, removed = nested_added, nested_removed
+    # Moves first (outer ones before nested ones) so that everything else
+    # refers to categories that already exist.
+    ops.sort(key=lambda op: op["op"] != "move_category")
+    return ops + links
+
+
+def write_delta(filename, base, target, ops):
+    delta = {"format": DELTA_FORMAT, "base": base, "target": target, "created": int(time.time()), "ops": ops}
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(delta, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def read_delta(filename):
+    with open(filename, encoding="utf-8") as f:
+        delta = json.load(f)
+    if delta.get("format") != DELTA_FORMAT:
+        raise ValueError(f"{filename} is not a catalog delta")
+    return delta
+
+
+def _find_link(links, op):
+    # Position in `links` of the link a link op refers to, or None: the same
+    # occurrence of its url, or for edits and removals any occurrence that
+    # still has the content the op expects (earlier ops may have shifted
+    # the duplicates).
+    after, before = op.get("after", op.get("link")), op.get("before")
+    url = link_url(after or before)
+    positions = [i for i, link in enumerate(links) if link_url(link) == url]
+    index = op.get("index", 0)
+    at_index = positions[index] if index < len(positions) else None
+    if op["op"] == "add_link":
+        return at_index
+    expected = {link_content(before), link_content(after)}
+    if at_index is not None and link_content(links[at_index]) in expected:
+        return at_index
+    for i in positions:
+        if link_content(links[i]) in expected:
+            return i
+    return at_index
+
+
+def _merged(local, remote):
+    # The remote link with the stamps of both sides combined.
+    link = copy_link(remote)
+    for key, pick in STAMPS:
+        values = [link_meta(side)[key] for side in (local, remote) if key in link_meta(side)]
+        if values:
+            if len(link) < 3 or not isinstance(link[2], dict):
+                link[2:] = [{}]
+            link[2][key] = pick(values)
+    return link
+
+
+def _exists(catalog, path):
+    return catalog.has_category(path)
+
+
+def _expand(op):
+    tree = op["tree"]
+    ops = [{"op": "add_link", "path": op["path"], "link": link} for link in tree.get(LINKS_KEY, [])]
+    for name, child in tree.items():
+        if name != LINKS_KEY:
+            ops.append({"op": "add_category", "path": op["path"] + [name], "hash": None, "tree": child})
+    return ops
+
+
+def merge_delta(catalog, store, ops):
+    # Three-way merge, one op at a time: every op carries the base value it
+    # was computed from, so it applies cleanly when the local value still
+    # matches the base, is skipped when the local side already made the
+    # same change, and is a conflict otherwise. Returns (applied, skipped,
+    # conflicts) where conflicts are (op, reason).
+    applied = skipped = 0
+    conflicts = []
+    for op in ops:
+        kind = op["op"]
+        path = tuple(op["path"])
+        if kind in ("add_link", "edit_link", "remove_link"):
+            if not _exists(catalog, path):
+                conflicts.append((op, "category no longer exists here"))
+                continue
+            links = catalog.node(path).get(LINKS_KEY, [])
+            after = op.get("after", op.get("link"))
+            before = op.get("before")
+            position = _find_link(links, op)
+            local = None if position is None else links[position]
+            if link_content(local) == link_content(after):
+                skipped += 1
+                if local is not None and _merged(local, after) != local:
+                    catalog.replace_link(path, local, _merged(local, after))
+            elif link_content(local) == link_content(before):
+                if kind == "add_link":
+                    catalog.copy_links(None, [after], path)
+                elif kind == "edit_link":
+                    catalog.replace_link(path, local, _merged(local, after))
+                else:
+                    catalog.remove_link(path, local)
+                applied += 1
+            elif kind == "add_link":
+                conflicts.append((op, "link was also added here with different details"))
+            elif kind == "edit_link":
+                conflicts.append((op, "link was edited or removed here too"))
+            else:
+                conflicts.append((op, "link was edited here but removed remotely"))
+
+        elif kind == "add_category":
+            if not _exists(catalog, path[:-1]):
+                conflicts.append((op, "parent category no longer exists here"))
+            elif not _exists(catalog, path):
+                try:
+                    catalog.replace_category(path[:-1], path[-1], json.loads(json.dumps(op["tree"])))
+                except ValueError as e:
+                    conflicts.append((op, str(e)))
+                else:
+                    applied += 1
+            elif store.node_hash(path) == op["hash"]:
+                skipped += 1
+            else:
+                # Both sides created it: merge the contents instead.
+                counts = merge_delta(catalog, store, _expand(op))
+                applied += counts[0]
+                skipped += counts[1]
+                conflicts.extend(counts[2])
+
+        elif kind == "remove_category":
+            if not _exists(catalog, path):
+                skipped += 1
+            elif store.node_hash(path) == op["hash"]:
+                catalog.delete_category(path[:-1], path[-1])
+                applied += 1
+            else:
+                conflicts.append((op, "category was changed here but removed remotely"))
+
+        elif kind == "move_category":
+            to = tuple(op["to"])
+            if not _exists(catalog, path):
+                if _exists(catalog, to):
+                    skipped += 1
+                else:
+                    conflicts.append((op, "category no longer exists here"))
+            elif not _exists(catalog, to[:-1]):
+                conflicts.append((op, "destination no longer exists here"))
+            elif _exists(catalog, to):
+                conflicts.append((op, "destination name is taken here"))
+            elif to[:len(path)] == path:
+                conflicts.append((op, "cannot move a category into itself"))
+            else:
+                catalog.move_category(path[:-1], path[-1], to[:-1], to[-1])
+                applied += 1
+    return applied, skipped, conflicts
+
+
+def _apply_to_object(store, digest, op):
+    # The same op applied blindly to a stored tree; used to advance the
+    # sync base to "what the sender has" without touching the catalog.
+    path = op["path"]
+    kind = op["op"]
+    if kind in ("add_link", "edit_link", "remove_link"):
+        after = op.get("after", op.get("link"))
+
+        def change(obj):
+            links = list(obj["l"])
+            position = _find_link(links, op)
+            if kind == "remove_link":
+                if position is not None:
+                    del links[position]
+            elif position is not None:
+                links[position] = after
+            elif kind == "add_link":
+                links.append(after)
+            return {"l": links, "c": obj["c"]}
+        return store.update(digest, path, change)
+
+    if kind == "add_category":
+        child = store.put_tree(op["tree"])
+        return _set_child(store, digest, path, child)
+    if kind == "remove_category":
+        return _set_child(store, digest, path, None)
+    if kind == "move_category":
+        child = store.find(digest, path)
+        if child is None:
+            return digest
+        digest = _set_child(store, digest, path, None)
+        return _set_child(store, digest, op["to"], child)
+    return digest
+
+
+def _set_child(store, digest, path, child):
+    name = path[-1]
+
+    def change(obj):
+        children = [[n, d] for n, d in obj["c"] if n != name]
+        if child is not None:
+            children.append([name, child])
+        return {"l": obj["l"], "c": children}
+    return store.update(digest, path[:-1], change)
+
+
+def advance_base(store, base, ops):
+    for op in ops:
+        base = _apply_to_object(store, base, op)
+    return base
+
+
+def describe_op(op):
+    where = "/".join(op["path"]) or "root"
+    kind = op["op"]
+    if kind == "add_link":
+        return f"+ 🔗 {where}: {link_url(op['link'])}"
+    if kind == "remove_link":
+        return f"- 🔗 {where}: {link_url(op['before'])}"
+    if kind == "edit_link":
+        return f"~ 🔗 {where}: {link_url(op['after'])}"
+    if kind == "add_category":
+        return f"+ 📂 {where}"
+    if kind == "remove_category":
+        return f"- 📂 {where}"
+    return f"→ 📂 {where} → {'/'.join(op['to'])}"
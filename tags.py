@@ -0,0 +1,388 @@
+import bisect
+import heapq
+import re
+
+from catalog import LINKS_KEY, is_packed, link_meta, read_node, unpack_subtree
+
+
+def normalize_tag(tag):
+    return re.sub(r"\s+", "-", tag.strip().lstrip("#").lower())
+
+
+def link_tags(link):
+    return link_meta(link).get("tags", [])
+
+
+class CategoryRef:
+    # Mirror of a category that owns indexed links. Moves and renames only
+    # touch the ref itself, so each posting keeps a valid location for free.
+
+    __slots__ = ("name", "parent", "children", "link_ids")
+
+    def __init__(self, name=None, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = {}
+        self.link_ids = set()
+
+    def path(self):
+        parts = []
+        ref = self
+        while ref.parent is not None:
+            parts.append(ref.name)
+            ref = ref.parent
+        return parts[::-1]
+
+    def walk(self):
+        stack = [self]
+        while stack:
+            ref = stack.pop()
+            yield ref
+            stack.extend(ref.children.values())
+
+
+def intersect(a, b):
+    # Both lists are sorted; step through the longer one with bisect so
+    # the cost follows the shorter list.
+    if len(a) > len(b):
+        a, b = b, a
+    result = []
+    lo = 0
+    for value in a:
+        lo = bisect.bisect_left(b, value, lo)
+        if lo == len(b):
+            break
+        if b[lo] == value:
+            result.append(value)
+    return result
+
+
+def union(lists):
+    result = []
+    for value in heapq.merge(*lists):
+        if not result or result[-1] != value:
+            result.append(value)
+    return result
+
+
+def difference(a, b):
+    result = []
+    j = 0
+    for value in a:
+        while j < len(b) and b[j] < value:
+            j += 1
+        if j == len(b) or b[j] != value:
+            result.append(value)
+    return result
+
+
+def parse_tag_query(text):
+    # "a b" is AND, "or" / "|" separate alternatives, "not x" or "-x"
+    # excludes. Returns [(include, exclude), ...] in disjunctive form.
+    groups = []
+    include, exclude = [], []
+    negate = False
+    for token in text.replace("|", " or ").split():
+        word = token.lower()
+        if word == "or":
+            if include or exclude:
+                groups.append((include, exclude))
+            include, exclude = [], []
+        elif word == "and":
+            continue
+        elif word == "not":
+            negate = True
+        else:
+            if token.startswith("-") and len(token) > 1:
+                negate = True
+                token = token[1:]
+            tag = normalize_tag(token)
+            if tag:
+                (exclude if negate else include).append(tag)
+            negate = False
+    if include or exclude:
+        groups.append((include, exclude))
+    return groups
+
+
+class PostingIndex:
+    # key -> sorted list of link ids, for whatever keys(link) returns. Ids
+    # are handed out in increasing order, so registering a link is an
+    # append, and links without keys are not stored at all.
+    #
+    # Links inside packed categories (Catalog.pack) stay indexed, but
+    # their entries hold no link: `packed` has each one's position in its
+    # category instead, and the link is read from the packed data when a
+    # query needs it (see resolve).
+
+    def __init__(self, catalog, keys):
+        self.catalog = catalog
+        self.keys = keys
+        self.root = CategoryRef()
+        self.postings = {}
+        self.entries = {}
+        self.by_object = {}
+        # link id -> position in its category's links, while packed
+        self.packed = {}
+        self.next_id = 0
+        self._index_subtree(catalog.data, self.root)
+        catalog.subscribe(self)
+
+    def _index_subtree(self, node, ref):
+        stack = [(node, ref, False)]
+        while stack:
+            current, current_ref, packed = stack.pop()
+            if is_packed(current):
+                current, packed = unpack_subtree(current), True
+            for i, link in enumerate(current.get(LINKS_KEY, [])):
+                keys = self.keys(link)
+                if keys:
+                    self._register(link, current_ref, keys, i if packed else None)
+            for name, child in current.items():
+                if name != LINKS_KEY and isinstance(child, dict):
+                    stack.append((child, self._child_ref(current_ref, name), packed))
+
+    def _child_ref(self, ref, name):
+        child = ref.children.get(name)
+        if child is None:
+            child = ref.children[name] = CategoryRef(name, ref)
+        return child
+
+    def _ref(self, path):
+        ref = self.root
+        for name in path:
+            ref = self._child_ref(ref, name)
+        return ref
+
+    def _register(self, link, ref, keys=None, position=None):
+        link_id = self.next_id
+        self.next_id += 1
+        if position is None:
+            self.entries[link_id] = (link, ref)
+            self.by_object.setdefault(id(link), []).append(link_id)
+        else:
+            self.entries[link_id] = (None, ref)
+            self.packed[link_id] = position
+        ref.link_ids.add(link_id)
+        for key in self.keys(link) if keys is None else keys:
+            self.postings.setdefault(key, []).append(link_id)
+        return link_id
+
+    def _unregister(self, link_id, keys=None, link=None):
+        # A packed entry has no link of its own; without the `link` read
+        # from the packed data, every posting is searched for it.
+        own, ref = self.entries.pop(link_id)
+        self.packed.pop(link_id, None)
+        ref.link_ids.discard(link_id)
+        if own is not None:
+            link = own
+            self._forget_object(link_id, own)
+        if keys is None:
+            keys = self.keys(link) if link is not None else list(self.postings)
+        for key in keys:
+            self._remove_posting(key, link_id)
+
+    def _forget_object(self, link_id, link):
+        ids = self.by_object.get(id(link), [])
+        if link_id in ids:
+            ids.remove(link_id)
+        if not ids:
+            self.by_object.pop(id(link), None)
+
+    def _remove_posting(self, key, link_id):
+        posting = self.postings.get(key)
+        if not posting:
+            return
+        i = bisect.bisect_left(posting, link_id)
+        if i < len(posting) and posting[i] == link_id:
+            del posting[i]
+        if not posting:
+            del self.postings[key]
+
+    def _find(self, link, path):
+        path = list(path)
+        for link_id in self.by_object.get(id(link), []):
+            if self.entries[link_id][1].path() == path:
+                return link_id
+        return None
+
+    def _pairs(self, ref, node):
+        # (ref, node) for `ref` and every ref below it, with packed nodes
+        # unpacked privately, so packed entries can be read by position.
+        stack = [(ref, node)]
+        while stack:
+            current_ref, current = stack.pop()
+            if is_packed(current):
+                current = unpack_subtree(current)
+            if not isinstance(current, dict):
+                current = {}
+            yield current_ref, current
+            stack.extend((child_ref, current.get(name)) for name, child_ref in current_ref.children.items())
+
+    def _link(self, link_id, node):
+        link = self.entries[link_id][0]
+        if link is None:
+            links = node.get(LINKS_KEY, [])
+            i = self.packed[link_id]
+            link = links[i] if i < len(links) else None
+        return link
+
+    def _drop_ref(self, ref, node):
+        for current_ref, current in self._pairs(ref, node):
+            for link_id in list(current_ref.link_ids):
+                self._unregister(link_id, link=self._link(link_id, current))
+
+    def _copy_ref(self, source, target, node):
+        for current, current_node in self._pairs(source, node):
+            mirror = self._ref(target.path() + current.path()[len(source.path()):])
+            for link_id in list(current.link_ids):
+                link = self._link(link_id, current_node)
+                if link is not None:
+                    self._register(link, mirror, None, self.packed.get(link_id))
+
+    def _swap_ref(self, ref, before, after):
+        # A category was packed or unpacked: same links, other objects.
+        # Walks the unpacked representation and drops the entries' links
+        # (packing) or points them at the new objects (unpacking); ids and
+        # postings stay as they are. Categories packed on their own below
+        # are left alone.
+        packing = is_packed(after)
+        stack = [(ref, before if packing else after)]
+        while stack:
+            current_ref, node = stack.pop()
+            if is_packed(node):
+                continue
+            links = node.get(LINKS_KEY, [])
+            if packing:
+                positions = {id(link): i for i, link in enumerate(links)}
+            for link_id in list(current_ref.link_ids):
+                link = self.entries[link_id][0]
+                if packing and link is not None:
+                    i = positions.get(id(link))
+                    if i is not None:
+                        self._forget_object(link_id, link)
+                        self.entries[link_id] = (None, current_ref)
+                        self.packed[link_id] = i
+                elif not packing and link is None:
+                    i = self.packed.pop(link_id)
+                    self.entries[link_id] = (links[i], current_ref)
+                    self.by_object.setdefault(id(links[i]), []).append(link_id)
+            for name, child_ref in current_ref.children.items():
+                child = node.get(name)
+                if isinstance(child, dict):
+                    stack.append((child_ref, child))
+
+    def resolve(self, link_id, cache=None):
+        # (path, link) of an indexed link. One inside a packed category is
+        # read from the packed data, which stays packed; the catalog takes
+        # such a copy for the equal link when it is acted on. `cache` is
+        # passed on to read_node.
+        link, ref = self.entries[link_id]
+        path = ref.path()
+        if link is None:
+            link = read_node(self.catalog.data, path, cache)[LINKS_KEY][self.packed[link_id]]
+        return path, link
+
+    def catalog_changed(self, event, path, info):
+        if event in ("link_added", "links_added"):
+            links = [info["link"]] if event == "link_added" else info["links"]
+            ref = None
+            for link in links:
+                if self.keys(link):
+                    ref = ref or self._ref(path)
+                    self._register(link, ref)
+        elif event in ("link_removed", "links_removed"):
+            links = [info["link"]] if event == "link_removed" else info["links"]
+            for link in links:
+                link_id = self._find(link, path)
+                if link_id is not None:
+                    self._unregister(link_id)
+        elif event in ("link_tagged", "link_edited", "link_opened"):
+            before = self.keys_before(event, info)
+            if before == self.keys(info["link"]):
+                return
+            link_id = self._find(info["link"], path)
+            if link_id is not None:
+                self._unregister(link_id, before)
+            if self.keys(info["link"]):
+                self._register(info["link"], self._ref(path))
+        elif event == "node_replaced":
+            # Copy-on-write gave this node fresh link objects.
+            ref = self._ref(path)
+            for link_id in list(ref.link_ids):
+                self._unregister(link_id)
+            for link in self.catalog.node(path).get(LINKS_KEY, []):
+                if self.keys(link):
+                    self._register(link, ref)
+        elif event == "category_swapped":
+            ref = self._ref(path).children.get(info["name"])
+            if ref is None:
+                self._index_subtree(info["subtree"], self._ref(path + (info["name"],)))
+            else:
+                self._swap_ref(ref, info["before"], info["subtree"])
+        elif event in ("category_deleted", "category_replaced"):
+            ref = self._ref(path).children.pop(info["name"], None)
+            if ref is not None:
+                self._drop_ref(ref, info["subtree" if event == "category_deleted" else "before"])
+            if event != "category_deleted":
+                self._index_subtree(info["subtree"], self._ref(path + (info["name"],)))
+        elif event in ("category_renamed", "category_moved"):
+            parent = self._ref(path)
+            ref = parent.children.pop(info["name"], None)
+            if ref is not None:
+                target = self._ref(info.get("dest", path))
+                ref.name = info["new_name"]
+                ref.parent = target
+                target.children[info["new_name"]] = ref
+        elif event == "category_copied":
+            ref = self._ref(path).children.get(info["name"])
+            if ref is not None:
+                self._copy_ref(ref, self._ref(info["dest"] + (info["new_name"],)), info["subtree"])
+
+    def keys_before(self, event, info):
+        # Keys the link had before an edit; "before" is the old link.
+        return self.keys(info["before"])
+
+
+class TagIndex(PostingIndex):
+    # tag -> link ids; queries are merges over the posting lists and never
+    # look at untagged links.
+
+    def __init__(self, catalog):
+        super().__init__(catalog, link_tags)
+
+    def keys_before(self, event, info):
+        if event == "link_tagged":
+            return info["before"]
+        return link_tags(info["before"])
+
+    def tag_counts(self):
+        return sorted(((tag, len(ids)) for tag, ids in self.postings.items()), key=lambda pair: (-pair[1], pair[0]))
+
+    def query_ids(self, text):
+        groups = parse_tag_query(text)
+        results = []
+        for include, exclude in groups:
+            if include:
+                lists = sorted((self.postings.get(tag, []) for tag in include), key=len)
+                ids = lists[0]
+                for posting in lists[1:]:
+                    if not ids:
+                        break
+                    ids = intersect(ids, posting)
+            else:
+                # A purely negative term is relative to all tagged links.
+                ids = sorted(self.entries)
+            for tag in exclude:
+                if not ids:
+                    break
+                ids = difference(ids, self.postings.get(tag, []))
+            results.append(ids)
+        return union(results) if len(results) > 1 else (results[0] if results else [])
+
+    def query(self, text):
+        # Yields (path, link) for every match, in tagging order.
+        cache = {}
+        for link_id in self.query_ids(text):
+            if link_id in self.entries:
+                yield self.resolve(link_id, cache)
@@ -0,0 +1,42 @@
+from catalog import Catalog
+
+
+class Events:
+    def __init__(self):
+        self.events = []
+
+    def catalog_changed(self, event, path, info):
+        self.events.append((event, path))
+
+
+def make_catalog():
+    return Catalog({"A": {"B": {"_links": [["https://example.com/b", "B"]]}, "C": {"D": {}}}, "E": {}})
+
+
+def test_release_undoes_sharing_from_clones():
+    catalog = make_catalog()
+    frozen = catalog.freeze()
+    catalog.add_link(("A", "C"), "https://example.com/c", "C")
+    catalog.add_link(("A", "C", "D"), "https://example.com/d", "D")
+    catalog.delete_category((), "E")
+    catalog.release(frozen)
+    assert catalog.shared == {}
+
+    events = Events()
+    catalog.subscribe(events)
+    catalog.add_link(("A", "B"), "https://example.com/b2", "B2")
+    assert ("node_replaced", ("A", "B")) not in events.events
+    assert "E" in frozen and catalog.node(("A", "C", "D"))["_links"][0][0] == "https://example.com/d"
+
+
+def test_release_keeps_sharing_from_copies():
+    catalog = make_catalog()
+    catalog.copy_category((), "A", (), "A2")
+    first, second = catalog.freeze(), catalog.freeze()
+    catalog.add_link(("A", "C"), "https://example.com/c", "C")
+    catalog.release(first)
+    catalog.release(second)
+    # A2 is the original A now; it still shares B and D with the clone.
+    assert catalog.data["A2"]["B"] is catalog.data["A"]["B"]
+    assert sorted((id(node), count) for node, count in catalog.shared.values()) == sorted(
+        [(id(catalog.data["A"]["B"]), 2), (id(catalog.data["A"]["C"]["D"]), 2)])
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from clipboard import ClipboardService
+
+
+class FakeClipboard:
+    def __init__(self, text="https://example.com/", delay=0):
+        self.text = text
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.text
+
+
+def wait_idle(service, seconds=2):
+    deadline = time.monotonic() + seconds
+    while service.thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return service.thread is None
+
+
+def test_reads_on_demand_and_stops_when_idle():
+    paste = FakeClipboard()
+    service = ClipboardService(ttl=0.02, timeout=1, paste=paste, linger=0.1)
+    assert service.thread is None and paste.calls == 0
+    assert service.get() == "https://example.com/"
+    assert wait_idle(service)
+    calls = paste.calls
+    time.sleep(0.1)
+    assert paste.calls == calls
+    assert not any(thread.name == "clipboard-watcher" for thread in threading.enumerate())
+
+    paste.text = "changed"
+    assert service.get() == "changed"
+    assert wait_idle(service)
+
+
+def test_refreshes_while_in_use():
+    paste = FakeClipboard()
+    service = ClipboardService(ttl=0.02, timeout=1, paste=paste, linger=0.2)
+    service.get()
+    time.sleep(0.1)
+    assert paste.calls >= 3
+    paste.text = "new"
+    time.sleep(0.05)
+    assert service.content == "new"
+    service.stop()
+    assert wait_idle(service)
+
+
+def test_slow_backend_does_not_block():
+    paste = FakeClipboard(delay=0.3)
+    service = ClipboardService(ttl=0.02, timeout=0.01, paste=paste, linger=0)
+    began = time.monotonic()
+    assert service.get() is None
+    assert time.monotonic() - began < 0.2
+    assert service.get(timeout=1) == "https://example.com/"
+    assert wait_idle(service)
+
+
+def test_failing_backend_disables_the_service():
+    def paste():
+        raise RuntimeError("no clipboard backend")
+
+    service = ClipboardService(timeout=1, paste=paste)
+    assert service.get() is None
+    assert not service.available and service.reason == "no clipboard backend"
+    assert wait_idle(service)
+
+
+def test_stale_content_is_not_returned():
+    paste = FakeClipboard()
+    service = ClipboardService(ttl=0.02, timeout=1, paste=paste, linger=0)
+    assert service.get() == "https://example.com/"
+    assert wait_idle(service)
+    paste.text, paste.delay = "copied later", 0.3
+    time.sleep(0.05)
+    assert service.get(timeout=0.01) is None
+    assert service.get(timeout=1) == "copied later"
+    assert wait_idle(service)
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from codec import JsonCodec, load_file, orjson
+
+BACKENDS = ["json"] + (["orjson"] if orjson is not None else [])
+
+
+def reference(data, mode):
+    if mode == "pretty":
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def catalog(links):
+    return {
+        "Gifts": {
+            "_links": [[f"https://example.com/p/{i}?q=\"{i}\"&x=\\", f"Größe {i} – “quoted” \t  😀",
+                        {"added": 1760000000 + i, "opened": i * 7, "tags": ["deal", "gift"] if i % 3 else []}]
+                       for i in range(links)],
+            "Empty": {},
+            "No links": {"_links": [], "Deeper": {"_links": [["https://example.com/", ""]]}},
+        },
+        "Home": {"_links": [["https://example.com/lamp", "Lamp", {"price": 12.5, "ok": True, "note": None}]]},
+        "Ünïcode / ключ": {"_links": [["https://example.com/é", "\x7f\x1f", {}]]},
+    }
+
+
+CASES = [
+    {},
+    {"_links": []},
+    {"_links": [["https://example.com/", "Root link"]]},
+    {"A": {}, "B": {"C": {}}},
+    catalog(3),
+    catalog(1000),
+    catalog(2501),
+]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("mode", ["pretty", "compact"])
+@pytest.mark.parametrize("data", CASES, ids=lambda data: f"{len(json.dumps(data))}B")
+def test_streaming_matches_json_dumps(backend, mode, data):
+    codec = JsonCodec(mode, backend)
+    expected = reference(data, mode)
+    assert b"".join(codec.iter_encode(data)) == expected
+    assert codec.dumps(data) == expected
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("mode", ["pretty", "compact"])
+def test_write_round_trips_and_keeps_the_format(backend, mode, tmp_path):
+    filename = str(tmp_path / "products.json")
+    data = catalog(1500)
+    JsonCodec(mode, backend).write(filename, data)
+    with open(filename, "rb") as f:
+        assert f.read() == reference(data, mode)
+    loaded, codec = load_file(filename)
+    assert loaded == data and codec.mode == mode
@@ -0,0 +1,55 @@
+from catalog import Catalog
+from frecency import FrecencyStore
+
+URL = "https://example.com/"
+
+
+def make_store(tmp_path):
+    catalog = Catalog({
+        "Gifts": {"_links": [[URL + f"gift/{i}", f"Gift {i}"] for i in range(20)],
+                  "Toys": {"_links": [[URL + f"toy/{i}", f"Toy {i}"] for i in range(20)]}},
+        "Home": {"_links": [[URL + "lamp", "Lamp"]]},
+    })
+    store = FrecencyStore(catalog, str(tmp_path / "products.frecency"))
+    for path in (("Gifts",), ("Gifts", "Toys"), ("Home",)):
+        for link in catalog.node(path)["_links"][:3]:
+            catalog.mark_opened(path, link)
+    return catalog, store
+
+
+def check(catalog, store):
+    # Every ranked link is the catalog's own object, found without a scan.
+    top = store.top(100)
+    for path, link, _ in top:
+        assert any(item is link for item in catalog.node(path)["_links"])
+    return sorted((path, link[0]) for path, link, _ in top)
+
+
+def test_cache_follows_catalog_changes(tmp_path, monkeypatch):
+    catalog, store = make_store(tmp_path)
+    assert len(check(catalog, store)) == 7
+
+    catalog.copy_category((), "Gifts", ("Home",))
+    catalog.edit_link(("Gifts",), catalog.node(("Gifts",))["_links"][5], URL + "gift/5", "Copy-on-write")
+    catalog.edit_link(("Gifts",), catalog.node(("Gifts",))["_links"][0], URL + "gift/renamed", "Gift 0")
+    catalog.move_category(("Gifts",), "Toys", (), "Toys")
+    catalog.rename_category((), "Toys", "Games")
+    catalog.move_links(("Home",), catalog.node(("Home",))["_links"], ("Games",))
+    catalog.remove_link(("Gifts",), catalog.node(("Gifts",))["_links"][1])
+
+    scans = []
+    has_category = catalog.has_category
+    monkeypatch.setattr(catalog, "has_category", lambda path: scans.append(path) or has_category(path))
+    assert check(catalog, store) == [
+        (("Games",), URL + "lamp"), (("Games",), URL + "toy/0"), (("Games",), URL + "toy/1"),
+        (("Games",), URL + "toy/2"), (("Gifts",), URL + "gift/2"), (("Gifts",), URL + "gift/renamed")]
+    assert scans == []
+
+
+def test_packed_category_is_looked_up_again(tmp_path):
+    catalog, store = make_store(tmp_path)
+    check(catalog, store)
+    catalog.pack(("Gifts",), "Toys")
+    catalog.delete_category((), "Home")
+    assert check(catalog, store) == [(("Gifts",), URL + f"gift/{i}") for i in range(3)] + [
+        (("Gifts", "Toys"), URL + f"toy/{i}") for i in range(3)]
@@ -0,0 +1,23 @@
+import json
+import os
+
+from frecency import frecency_file
+from headless import FakeScreen, load_tui, make_app
+
+
+def test_side_files_follow_the_catalog_file(tmp_path, monkeypatch):
+    # A products.frecency in the working directory belongs to the user.
+    monkeypatch.chdir(tmp_path)
+    with open("products.frecency", "w", encoding="utf-8") as f:
+        json.dump({"half_life": 1, "links": [["https://example.com/", 1.0, 1, 1, "A"]]}, f)
+    tui = load_tui()
+
+    app = make_app(tui, {"A": {"_links": [["https://example.com/", "Example"]]}}, FakeScreen())
+    assert not app.frecency.entries
+    for filename in (app.frecency.filename, app.prices.filename, app.snapshots.directory):
+        assert os.path.dirname(filename) == app.scratch.name
+
+    copy = str(tmp_path / "copy" / "products.json")
+    app = make_app(tui, {}, FakeScreen(), copy)
+    assert app.frecency.filename == frecency_file(copy)
+    assert app.prices.filename == str(tmp_path / "copy" / "products.prices")
@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from page_archive import HttpClient, PageArchive
+
+
+class Shop(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 1 << 16
+    revisions = {}
+    requests = []
+    lock = threading.Lock()
+
+    def body(self):
+        name = self.path.rsplit("/", 1)[-1]
+        if name == "style.css":
+            # Slow enough that workers asking for it together overlap.
+            time.sleep(0.05)
+            return b"body { color: black; }", "text/css"
+        page = int(name)
+        text = (f'<html><head><link rel="stylesheet" href="/static/style.css"></head>'
+                f'<body>Product {page}, revision {self.revisions.get(page, 0)}</body></html>')
+        return text.encode(), "text/html"
+
+    def do_GET(self):
+        with self.lock:
+            self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path.startswith("/moved/"):
+            self.send_response(301)
+            self.send_header("Location", "/p/" + self.path.rsplit("/", 1)[-1])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, content_type = self.body()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def shop():
+    Shop.revisions, Shop.requests = {}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Shop)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_unchanged_pages_are_not_fetched_again(shop, tmp_path):
+    urls = [f"{shop}/p/{page}" for page in range(20)]
+    archive = PageArchive(str(tmp_path))
+    first = archive.archive(urls, workers=8)
+    assert (first["new"], first["failed"]) == (20, [])
+    # The stylesheet all pages share is fetched once, however many workers
+    # want it at the same time.
+    assert sum(path == "/static/style.css" for path, _ in Shop.requests) == 1
+
+    Shop.requests = []
+    again = PageArchive(str(tmp_path)).archive(urls, workers=8)
+    assert (again["unchanged"], again["new"], again["stored_bytes"]) == (20, 0, 0)
+    assert all(etag is not None for path, etag in Shop.requests)
+
+    Shop.revisions = {3: 1}
+    archive = PageArchive(str(tmp_path))
+    changed = archive.archive(urls, workers=8)
+    assert (changed["new"], changed["unchanged"]) == (1, 19)
+    assert len(archive.versions(urls[3])) == 2 and len(archive.versions(urls[4])) == 1
+    assert b"revision 1" in archive.get(archive.versions(urls[3])[-1]["sha"])
+
+
+def test_validators_are_not_sent_after_a_redirect(shop):
+    client = HttpClient()
+    status, _, body, final = client.get(f"{shop}/moved/7", {"If-None-Match": '"stale"'})
+    client.close()
+    assert status == 200 and b"Product 7" in body and final == f"{shop}/p/7"
+    assert Shop.requests == [("/moved/7", '"stale"'), ("/p/7", None)]
+
+
+def test_redirected_pages_are_revalidated_where_they_ended_up(shop, tmp_path):
+    url = f"{shop}/moved/7"
+    archive = PageArchive(str(tmp_path))
+    assert archive.archive([url])["new"] == 1
+    assert archive.latest(url)["final"] == f"{shop}/p/7"
+    Shop.requests = []
+    assert PageArchive(str(tmp_path)).archive([url])["unchanged"] == 1
+    assert Shop.requests[0] == ("/moved/7", None)
+    assert Shop.requests[1][0] == "/p/7" and Shop.requests[1][1] is not None
+
+
+def test_viewed_copies_run_no_scripts(shop, tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.archive([f"{shop}/p/1"])
+    with open(archive.view(archive.versions(f"{shop}/p/1")[-1])[len("file://"):], encoding="utf-8") as f:
+        page = f.read()
+    assert page.startswith("<html><head><meta http-equiv=\"Content-Security-Policy\" content=\"script-src 'none';")
+    assert f'<base href="{shop}/p/1">' in page
@@ -0,0 +1,105 @@
+from catalog import Catalog, is_packed
+from cold import Archiver
+from completion import PathIndex
+from query import QueryEngine
+from subtree_stats import SubtreeStats
+from tags import TagIndex
+
+
+def make_catalog():
+    def links(prefix, count):
+        return [[f"https://www.amazon.com/{prefix}/{i}", f"{prefix} item {i}", {"added": i, "tags": ["x"] if i % 60 == 0 else []}]
+                for i in range(count)]
+
+    return Catalog({
+        "Gifts": {"_links": links("gift", 200), "Toys": {"_links": links("toy", 100)}},
+        "Home": {"_links": [["https://example.com/lamp", "Lamp", {"added": 1, "tags": ["x"]}]]},
+    })
+
+
+def results(catalog, tags, engine):
+    return (sorted((tuple(path), link[0]) for path, link in tags.query("x")),
+            sorted((tuple(path), link[0]) for path, link in engine.run("domain:amazon.com")))
+
+
+def test_pack_keeps_links_indexed():
+    catalog = make_catalog()
+    tags, engine, stats = TagIndex(catalog), QueryEngine(catalog), SubtreeStats(catalog)
+    engine.run("x")
+    before = results(catalog, tags, engine)
+    assert len(before[0]) == 7 and len(before[1]) == 300
+
+    Archiver(catalog, stats).pack(("Gifts", "Toys"))
+    Archiver(catalog, stats).pack(("Gifts",))
+    assert is_packed(catalog.data["Gifts"])
+    assert len(list(tags.query_ids("x"))) == 7
+    assert len(engine.index.postings["d:amazon.com"]) == 300
+    assert stats.get(("Gifts",)).links == 300
+
+
+def test_hits_stay_packed_and_can_be_acted_on():
+    catalog = make_catalog()
+    tags, engine = TagIndex(catalog), QueryEngine(catalog)
+    engine.run("x")
+    before = results(catalog, tags, engine)
+    catalog.pack(("Gifts",), "Toys")
+    catalog.pack((), "Gifts")
+
+    assert results(catalog, tags, engine) == before
+    assert is_packed(catalog.data["Gifts"])
+    # Packed entries keep no link of their own.
+    for index in (tags, engine.index):
+        assert index.packed and all(index.entries[i][0] is None for i in index.packed)
+    # The links handed out are copies; acting on one changes the catalog's.
+    path, link = [hit for hit in tags.query("x") if hit[0] == ["Gifts", "Toys"]][0]
+    assert catalog.mark_opened(path, link) is not None
+    assert any(item[0] == link[0] and "opened" in item[2] for item in catalog.node(path)["_links"])
+    catalog.pack((), "Gifts")
+    path, link = [hit for hit in tags.query("x") if hit[0] == ["Gifts", "Toys"]][0]
+    assert catalog.remove_links(path, [link]) == 1
+    assert len(tags.query_ids("x")) == 6
+
+
+def test_deleting_and_copying_packed_categories():
+    catalog = make_catalog()
+    tags, engine = TagIndex(catalog), QueryEngine(catalog)
+    engine.run("x")
+    catalog.pack((), "Gifts")
+    catalog.copy_category((), "Gifts", ("Home",))
+    assert len(tags.query_ids("x")) == 13
+    assert len(engine.index.postings["d:amazon.com"]) == 600
+    catalog.delete_category((), "Gifts")
+    assert len(tags.query_ids("x")) == 7
+    assert len(list(engine.run("domain:amazon.com"))) == 300
+    assert is_packed(catalog.data["Home"]["Gifts"])
+
+
+def test_completion_does_not_unpack():
+    catalog = make_catalog()
+    catalog.pack((), "Gifts")
+    paths = PathIndex(catalog)
+    assert paths.resolve([], "gif/to") == ["Gifts", "Toys"]
+    assert paths.complete([], "Gifts/T") == ["Gifts/Toys/"]
+    assert is_packed(catalog.data["Gifts"])
+
+
+def test_index_stays_consistent_across_repacking():
+    catalog = make_catalog()
+    tags = TagIndex(catalog)
+    for _ in range(3):
+        catalog.pack((), "Gifts")
+        catalog.node(("Gifts", "Toys"))
+    catalog.add_link(("Gifts",), "https://example.com/new", "New")
+    path, link = [hit for hit in tags.query("x") if hit[0] == ["Gifts"]][0]
+    catalog.set_tags(path, link, ["y"])
+    assert len(tags.query_ids("x")) == 6
+    assert [l[0] for _, l in tags.query("y")] == [link[0]]
+    fresh = TagIndex(catalog)
+    assert sorted(l[0] for _, l in fresh.query("x")) == sorted(l[0] for _, l in tags.query("x"))
+
+
+def test_packed_categories_are_indexed_on_load():
+    catalog = make_catalog()
+    catalog.pack((), "Gifts")
+    tags = TagIndex(Catalog(catalog.data))
+    assert len(tags.query_ids("x")) == 7
@@ -0,0 +1,85 @@
+import math
+import os
+
+import pytest
+
+from prices import PriceHistory, extract_price, parse_amount
+
+URL = "https://example.com/"
+
+
+def fill(filename):
+    history = PriceHistory(filename)
+    history.record([(URL + "a", 100, 10.0, True), (URL + "b", 100, 20.0, None)])
+    history.record([(URL + "a", 200, 8.0, False), (URL + "c", 200, None, True)])
+    return history
+
+
+def samples(history, url):
+    return history.get(url).range()
+
+
+def test_history_survives_reload(tmp_path):
+    filename = str(tmp_path / "products.prices")
+    written = fill(filename)
+    loaded = PriceHistory(filename)
+    assert loaded.urls == written.urls
+    assert samples(loaded, URL + "a") == [(100, 10.0, True), (200, 8.0, False)]
+    assert samples(loaded, URL + "c") == [(200, None, True)]
+    series = loaded.get(URL + "a")
+    assert (series.low, series.high, series.last, loaded.last_round) == (8.0, 10.0, 8.0, 200)
+    assert math.isnan(loaded.get(URL + "c").prices[0])
+
+
+def test_cut_off_block_is_dropped_and_overwritten(tmp_path):
+    filename = str(tmp_path / "products.prices")
+    fill(filename)
+    complete = os.path.getsize(filename)
+    history = PriceHistory(filename)
+    history.record([(URL + "a", 300, 6.0, True), (URL + "d", 300, 1.0, True)])
+    # A crash in the middle of the last append leaves part of it behind.
+    for cut in range(complete + 1, os.path.getsize(filename)):
+        with open(filename, "rb") as f:
+            raw = f.read()
+        broken = str(tmp_path / f"broken-{cut}.prices")
+        with open(broken, "wb") as f:
+            f.write(raw[:cut])
+        recovered = PriceHistory(broken)
+        # The block naming "d" may have made it; the samples did not.
+        assert complete <= recovered.valid_size < len(raw)
+        assert samples(recovered, URL + "a") == [(100, 10.0, True), (200, 8.0, False)]
+        recovered.record([(URL + "b", 400, 18.0, True)])
+        assert os.path.getsize(broken) == recovered.valid_size
+        reloaded = PriceHistory(broken)
+        assert samples(reloaded, URL + "b") == [(100, 20.0, None), (400, 18.0, True)]
+        assert samples(reloaded, URL + "a") == [(100, 10.0, True), (200, 8.0, False)]
+        assert reloaded.urls == recovered.urls
+
+
+def test_not_a_price_file(tmp_path):
+    filename = tmp_path / "products.prices"
+    filename.write_bytes(b"{}")
+    with pytest.raises(ValueError):
+        PriceHistory(str(filename))
+
+
+def test_drops_fall_from_the_highest_price(tmp_path):
+    history = PriceHistory(str(tmp_path / "products.prices"))
+    history.record([(URL + "a", 100, 100.0, True), (URL + "b", 100, 100.0, True), (URL + "c", 100, 100.0, True)])
+    history.record([(URL + "a", 200, 95.0, True), (URL + "b", 200, 120.0, True), (URL + "c", 200, 100.0, True)])
+    history.record([(URL + "a", 300, 90.0, True), (URL + "b", 300, 96.0, True), (URL + "c", 300, 89.0, True)])
+    # a fell 5% twice and is 10% below its high: not more than 10%.
+    assert [(url, round(fall)) for url, _, fall in history.drops(10)] == [(URL + "b", 20), (URL + "c", 11)]
+    assert [url for url, _, _ in history.drops(9.9)] == [URL + "b", URL + "c", URL + "a"]
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("19.9", 19.9), ("0.5", 0.5), ("19,99", 19.99), ("1299", 1299.0), ("1,299", 1299.0), ("1.299", 1299.0),
+    ("1,299.00", 1299.0), ("1.299,00", 1299.0), ("1,299,000.5", 1299000.5), ("12.", 12.0), ("abc", None),
+])
+def test_parse_amount(text, amount):
+    assert parse_amount(text) == amount
+
+
+def test_json_ld_decimal_price():
+    assert extract_price('{"price": 19.9, "availability": "https://schema.org/InStock"}') == (19.9, True)
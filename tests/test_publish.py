@@ -0,0 +1,20 @@
+import os
+
+from catalog import Catalog
+from publish import SiteBuilder, page_file
+from snapshots import SnapshotStore
+from subtree_stats import SubtreeStats
+
+
+def test_only_web_links_get_an_href(tmp_path):
+    catalog = Catalog({"Shop": {"_links": [["javascript:alert(1)", "Bad"], ["data:text/html,x", "Data"],
+                                           ["https://example.com/", "Good"]]}})
+    site = str(tmp_path / "site")
+    SiteBuilder(catalog, SubtreeStats(catalog), SnapshotStore(catalog, str(tmp_path / "snapshots")), site).build(workers=1)
+    with open(os.path.join(site, page_file(["Shop"])), encoding="utf-8") as f:
+        page = f.read()
+    assert 'href="https://example.com/"' in page
+    assert 'href="javascript:' not in page and 'href="data:' not in page
+    with open(os.path.join(site, "search.js"), encoding="utf-8") as f:
+        script = f.read()
+    assert "if (/^https?:\\/\\//.test(entry.url)) link.href = entry.url;" in script
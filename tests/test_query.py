@@ -0,0 +1,17 @@
+from catalog import Catalog
+from query import QueryEngine
+
+
+def test_desc_matches_anywhere_like_url():
+    catalog = Catalog({"Tech": {"_links": [
+        ["https://example.com/phone", "Phone case"], ["https://example.com/smartphone", "Smartphone X"],
+        ["https://example.com/headphones", "Bluetooth headphones"], ["https://example.com/lamp", "Desk lamp"],
+    ]}})
+    engine = QueryEngine(catalog)
+    for text in ("desc~phone", "phone", "desc~HONE"):
+        assert sorted(link[1] for _, link in engine.run(text)) == ["Bluetooth headphones", "Phone case", "Smartphone X"]
+    assert engine.explain("desc~phone")[1].startswith("plan:  word index")
+    assert [link[1] for _, link in engine.run('desc~"k la"')] == ["Desk lamp"]
+    # The word index keeps up with edits.
+    catalog.add_link(("Tech",), "https://example.com/mic", "Microphone")
+    assert len(list(engine.run("desc~phone"))) == 4
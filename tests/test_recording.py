@@ -0,0 +1,39 @@
+import json
+
+from codec import JsonCodec
+from headless import keys
+from recording import fetch_kind, replay_commands, replay_keys
+
+
+class SavingCodec(JsonCodec):
+    def __init__(self):
+        super().__init__()
+        self.saved = []
+
+    def write(self, filename, data):
+        super().write(filename, data)
+        with open(filename, encoding="utf-8") as f:
+            self.saved.append(json.load(f))
+
+
+def test_replayed_tui_session_saves_and_skips_fetching():
+    data = {"A": {"_links": [["https://example.com/a", "A"]]}}
+    events = [("K", 0.0, 0.0, batch) for batch in (
+        [10], keys("a", "https://example.com/b"), [9], keys("$"), keys("k"), keys("q"))]
+    codec = SavingCodec()
+    results, skipped = replay_keys(events, data, codec=codec)
+    assert len(results) == 6
+    assert skipped == {"prices": 1, "archive": 1}
+    assert [link[0] for link in codec.saved[-1]["A"]["_links"]] == ["https://example.com/a", "https://example.com/b"]
+
+
+def test_fetching_commands_are_skipped(tmp_path, monkeypatch):
+    # main.py keeps its files in the working directory.
+    monkeypatch.chdir(tmp_path)
+    assert [fetch_kind(text) for text in ("prices sample", "prices refresh", "prices 2", "archive", "archive A/B",
+                                          "archive open 1", "tags")] == [
+        "prices", "prices", None, "archive", "archive", None, None]
+    events = [("C", 0.0, 0.0, text) for text in ("prices sample", "list", "archive", "exit")]
+    results, skipped = replay_commands(events, {"A": {}}, JsonCodec())
+    assert [operation for operation, _, _ in results] == ["list", "exit"]
+    assert skipped == {"prices": 1, "archive": 1}
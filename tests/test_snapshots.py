@@ -0,0 +1,70 @@
+import os
+
+from catalog import Catalog
+from snapshots import SnapshotStore
+
+URL = "https://example.com/"
+
+
+def make_store(tmp_path):
+    catalog = Catalog({
+        "Gifts": {"_links": [[URL + "a", "A", {"added": 1}], [URL + "dup", "Dup", {"added": 2}],
+                             [URL + "dup", "Dup", {"added": 3}]]},
+        "Home": {"_links": [[URL + "lamp", "Lamp", {"added": 4}]]},
+    })
+    return catalog, SnapshotStore(catalog, str(tmp_path / "snapshots"))
+
+
+def object_count(store):
+    return sum(len(files) for _, _, files in os.walk(store.objects_dir))
+
+
+def test_opening_links_makes_no_version(tmp_path):
+    catalog, store = make_store(tmp_path)
+    first = store.snapshot()
+    objects = object_count(store)
+    for link in catalog.node(("Gifts",))["_links"]:
+        catalog.mark_opened(("Gifts",), link)
+    assert store.snapshot() is None
+    assert object_count(store) == objects
+    assert store.current_hash() == first["root"]
+
+
+def test_diff_reports_each_duplicate(tmp_path):
+    catalog, store = make_store(tmp_path)
+    old = store.snapshot()["root"]
+    links = catalog.node(("Gifts",))["_links"]
+    catalog.remove_link(("Gifts",), links[1])
+    catalog.edit_link(("Gifts",), links[1], URL + "dup", "Dup renamed")
+    catalog.copy_links(None, [[URL + "a", "A", {"added": 5}]], ("Gifts",))
+    changes = sorted(store.diff(old, store.snapshot()["root"]))
+    assert changes == [("+", ("Gifts",), URL + "a"), ("-", ("Gifts",), URL + "dup"), ("~", ("Gifts",), URL + "dup")]
+
+
+def test_restore_keeps_when_links_were_opened(tmp_path):
+    catalog, store = make_store(tmp_path)
+    version = store.snapshot()
+    lamp = catalog.node(("Home",))["_links"][0]
+    catalog.mark_opened(("Home",), lamp)
+    opened = catalog.node(("Home",))["_links"][0][2]["opened"]
+    catalog.edit_link(("Home",), catalog.node(("Home",))["_links"][0], URL + "lamp", "Desk lamp")
+    store.restore(version["id"], ("Home",))
+    assert catalog.node(("Home",))["_links"] == [[URL + "lamp", "Lamp", {"added": 4, "opened": opened}]]
+
+
+def test_publishing_writes_no_objects(tmp_path):
+    from publish import SiteBuilder
+    from subtree_stats import SubtreeStats
+
+    catalog, store = make_store(tmp_path)
+    stats = SubtreeStats(catalog)
+    builder = SiteBuilder(catalog, stats, store, str(tmp_path / "site"))
+    builder.build(workers=1)
+    catalog.edit_link(("Home",), catalog.node(("Home",))["_links"][0], URL + "lamp", "Desk lamp")
+    builder.build(workers=1)
+    assert object_count(store) == 0
+
+    # Hashes that were only computed are written by the next snapshot.
+    version = store.snapshot()
+    assert version["objects"] == object_count(store) == 3
+    assert store.load_tree(version["root"]) == catalog.data
@@ -0,0 +1,124 @@
+import copy
+
+from catalog import Catalog
+from snapshots import SnapshotStore
+from sync import advance_base, compute_delta, empty_tree, load_base, merge_delta, save_base
+
+URL = "https://example.com/"
+
+START = {
+    "Gifts": {
+        "_links": [[URL + "a", "A", {"added": 1}], [URL + "dup", "Dup", {"added": 2}],
+                   [URL + "dup", "Dup", {"added": 3}], [URL + "b", "B", {"added": 4, "tags": ["x"]}]],
+        "Toys": {"_links": [[URL + "toy", "Toy", {"added": 5}]]},
+    },
+}
+
+
+def replica(tmp_path, name, data=START):
+    catalog = Catalog(copy.deepcopy(data))
+    store = SnapshotStore(catalog, str(tmp_path / name))
+    save_base(store, store.current_hash())
+    return catalog, store
+
+
+def send(sender, receiver):
+    # One "sync export" on the sender followed by "sync import" on the receiver.
+    _, store = sender
+    catalog, receiving_store = receiver
+    head = store.current_hash()
+    ops = compute_delta(store, load_base(store), head)
+    save_base(store, head)
+    result = merge_delta(catalog, receiving_store, ops)
+    save_base(receiving_store, advance_base(receiving_store, load_base(receiving_store), ops))
+    return ops, result
+
+
+def links(catalog, path=("Gifts",)):
+    return catalog.node(path)["_links"]
+
+
+def test_full_export_rebuilds_the_tree(tmp_path):
+    a = replica(tmp_path, "a")
+    b = replica(tmp_path, "b", {})
+    save_base(a[1], empty_tree(a[1]))
+    _, (applied, skipped, conflicts) = send(a, b)
+    assert not conflicts and not skipped
+    assert b[0].data == a[0].data
+    assert [link[0] for link in links(b[0])].count(URL + "dup") == 2
+
+
+def test_opening_on_both_sides_is_not_a_change(tmp_path):
+    a, b = replica(tmp_path, "a"), replica(tmp_path, "b")
+    a[0].mark_opened(("Gifts",), links(a[0])[0])
+    b[0].mark_opened(("Gifts",), links(b[0])[0])
+    assert send(a, b)[0] == []
+    assert send(b, a)[0] == []
+
+
+def test_edit_keeps_the_latest_open(tmp_path):
+    a, b = replica(tmp_path, "a"), replica(tmp_path, "b")
+    links(a[0])[0][2]["opened"] = 100
+    links(b[0])[0][2]["opened"] = 200
+    a[0].edit_link(("Gifts",), links(a[0])[0], URL + "a", "A renamed")
+    ops, (applied, _, conflicts) = send(a, b)
+    assert [op["op"] for op in ops] == ["edit_link"]
+    assert applied == 1 and not conflicts
+    assert links(b[0])[0] == [URL + "a", "A renamed", {"added": 1, "opened": 200}]
+
+
+def test_duplicate_urls_sync_one_by_one(tmp_path):
+    a, b = replica(tmp_path, "a"), replica(tmp_path, "b")
+    a[0].remove_link(("Gifts",), links(a[0])[1])
+    ops, (applied, _, conflicts) = send(a, b)
+    assert [(op["op"], op["index"]) for op in ops] == [("remove_link", 0)]
+    assert applied == 1 and not conflicts
+    assert [link[0] for link in links(b[0])] == [URL + "a", URL + "dup", URL + "b"]
+
+    a[0].copy_links(None, [[URL + "dup", "Dup again", {"added": 6}]], ("Gifts",))
+    a[0].copy_links(None, [[URL + "dup", "Dup again", {"added": 6}]], ("Gifts",))
+    ops, (applied, _, conflicts) = send(a, b)
+    assert [(op["op"], op["index"]) for op in ops] == [("add_link", 1), ("add_link", 2)]
+    assert applied == 2 and not conflicts
+    assert b[0].data == a[0].data
+
+
+def test_same_change_on_both_sides_is_skipped(tmp_path):
+    a, b = replica(tmp_path, "a"), replica(tmp_path, "b")
+    for catalog in (a[0], b[0]):
+        catalog.set_tags(("Gifts",), links(catalog)[0], ["y"])
+        catalog.copy_links(None, [[URL + "new", "New", {"added": 7}]], ("Gifts", "Toys"))
+    _, (applied, skipped, conflicts) = send(a, b)
+    assert (applied, skipped, conflicts) == (0, 2, [])
+    assert send(b, a)[0] == []
+
+
+def test_conflicting_edits_are_reported(tmp_path):
+    a, b = replica(tmp_path, "a"), replica(tmp_path, "b")
+    a[0].edit_link(("Gifts",), links(a[0])[3], URL + "b", "From A")
+    b[0].edit_link(("Gifts",), links(b[0])[3], URL + "b", "From B")
+    _, (applied, _, conflicts) = send(a, b)
+    assert applied == 0 and len(conflicts) == 1
+    assert links(b[0])[3][1] == "From B"
+
+
+def test_moved_category_keeps_later_edits(tmp_path):
+    a, b = replica(tmp_path, "a"), replica(tmp_path, "b")
+    a[0].move_category(("Gifts",), "Toys", (), "Toys")
+    a[0].edit_link(("Toys",), links(a[0], ("Toys",))[0], URL + "toy", "Toy car")
+    _, (applied, _, conflicts) = send(a, b)
+    assert not conflicts
+    assert "Toys" not in b[0].data["Gifts"]
+    assert links(b[0], ("Toys",))[0][1] == "Toy car"
+
+
+def test_reserved_category_names_are_not_imported(tmp_path):
+    catalog, store = replica(tmp_path, "b")
+    ops = [
+        {"op": "add_category", "path": ["Gifts", "_archived"], "hash": None, "tree": {}},
+        {"op": "add_category", "path": ["Gifts", "New"], "hash": None, "tree": {"_archived": {"_links": []}}},
+        {"op": "add_category", "path": ["Gifts", "Fine"], "hash": None, "tree": {}},
+    ]
+    applied, _, conflicts = merge_delta(catalog, store, ops)
+    assert applied == 1 and len(conflicts) == 2
+    assert sorted(catalog.node(("Gifts",))) == ["Fine", "Toys", "_links"]
@@ -0,0 +1,50 @@
+import pytest
+
+from headless import FakeScreen, load_tui, make_app
+
+
+@pytest.fixture
+def app():
+    data = {"Shop": {"_links": [[f"https://example.com/{i}", f"Item {i:03}", {"added": 100 - i}] for i in range(100)],
+                     "Sale": {}}}
+    app = make_app(load_tui(), data, FakeScreen())
+    app.clipboard.disable("test")
+    app.path = ["Shop"]
+    return app
+
+
+def rows(app):
+    return [item[:2] for item in app.get_current_items()]
+
+
+def test_rows_follow_catalog_changes_without_rebuilding(app):
+    app.sort_mode = "added"
+    items = app.get_current_items()
+    assert len(items) == 101 and items[0] == ("category", "Sale") and items[1][1] == "Item 099"
+    view = items.links
+
+    app.catalog.copy_links(None, [["https://example.com/new", "New", {"added": 50}]], ("Shop",))
+    app.catalog.remove_link(("Shop",), app.catalog.node(("Shop",))["_links"][0])
+    items = app.get_current_items()
+    assert items.links is view
+    names = [f"Item {i:03}" for i in range(99, 49, -1)] + ["New"] + [f"Item {i:03}" for i in range(49, 0, -1)]
+    assert rows(app) == [("category", "Sale")] + [("link", name) for name in names]
+    assert items[-1][1] == "Item 001" and items[1:3] == [("link", "Item 099", view[0]), ("link", "Item 098", view[1])]
+
+
+def test_delete_keeps_selection_in_range(app):
+    app.current_selection = 100
+    app.delete_items([app.get_current_items()[100]])
+    assert app.current_selection == 99
+    assert len(app.get_current_items()) == 100
+
+
+def test_delete_counts_links_still_there(app):
+    saves = []
+    app.save_data = lambda: saves.append(True)
+    items = app.get_current_items()
+    gone = items[1]
+    app.catalog.remove_link(("Shop",), gone[2])
+    app.delete_items([gone, items[2], items[3]])
+    assert saves and app.status_message == "🗑️ Deleted 2 items (1 not found)"
+    assert len(app.get_current_items()) == 98